@@ -0,0 +1,165 @@
+import numpy as np
+from base.protocol import Protocol
+from pandas import DataFrame
+from util.bitvector import BitVector
+
+from attacks.engines import NumpyEngine, complements, negate_parts
+from attacks.linear import LinearAttack
+from attacks.summary import Summary
+
+
+class BiasSummary(Summary):
+  """Number of iterations each bit of each combination matched the target.
+
+  Matches are kept in a (combinations, bits) array of counters, updated with
+  the whole match matrix of an iteration at once.
+  """
+
+  def __init__(self):
+    Summary.__init__(self)
+
+    self.matches = None
+
+  def grow(self, size: int):
+    Summary.grow(self, size)
+
+    # Matches follow the capacity of the other accumulators
+    extra = len(self.count) - len(self.matches)
+
+    if extra > 0:
+      self.matches = np.concatenate([self.matches, np.zeros((extra, self.matches.shape[1]), dtype = np.uint32)])
+
+  def fold(self, descriptions: list, matches: np.ndarray):
+    """Folds the bit matches of a chunk of combinations into the counters.
+
+    Args:
+        descriptions (list): The (unique) description of each combination
+        matches (np.ndarray): A (combinations, bits) matrix of bit matches
+    """
+    if self.matches is None:
+      self.matches = np.zeros((0, matches.shape[1]), dtype = np.uint32)
+
+    rows = self.rows(descriptions)
+
+    self.matches[rows] += matches
+    self.count[rows] += 1
+
+  def merge(self, other: 'BiasSummary'):
+    if other.matches is None:
+      self.iterations += other.iterations
+      return
+
+    if self.matches is None:
+      self.matches = np.zeros((0, other.matches.shape[1]), dtype = np.uint32)
+
+    size = len(other.descriptions)
+    rows = self.rows(other.descriptions)
+
+    self.matches[rows] += other.matches[:size]
+    self.count[rows] += other.count[:size]
+    self.iterations += other.iterations
+
+    if other.length is not None:
+      self.length = other.length
+
+  def to_frame(self, top: int = None) -> DataFrame:
+    """Returns the most biased (combination, bit) pairs, present in every iteration.
+
+    The bias of a pair is how far its match rate is from 1/2, in [0, 1/2].
+    Pairs are ordered by bias, then by combination (as first seen) and bit.
+    """
+    columns = ['combination', 'bit', 'matches', 'rate', 'bias']
+
+    if self.matches is None or self.iterations == 0:
+      return DataFrame([], columns=columns)
+
+    size = len(self.descriptions)
+    keep = np.flatnonzero(self.count[:size] == self.iterations)
+
+    matches = self.matches[keep].ravel()
+    bits = self.matches.shape[1]
+
+    # Matches of the most frequent value of every bit, which orders pairs as their bias
+    score = np.maximum(matches, self.iterations - matches)
+    k = min(top, len(score)) if top is not None else len(score)
+
+    if k < len(score):
+      # Pairs above the k-th best score, and the first ones tied with it
+      threshold = score[np.argpartition(score, len(score) - k)[len(score) - k]]
+      above = np.flatnonzero(score > threshold)
+      tied = np.flatnonzero(score == threshold)[:k - len(above)]
+
+      pairs = np.sort(np.concatenate([above, tied]))
+    else:
+      pairs = np.arange(len(score))
+
+    # Best first, ties by index
+    pairs = pairs[np.argsort(-score[pairs].astype(np.int64), kind = 'stable')]
+
+    rate = matches[pairs] / self.iterations
+
+    return DataFrame({
+      'combination': [self.descriptions[keep[i // bits]] for i in pairs.tolist()],
+      'bit': pairs % bits,
+      'matches': matches[pairs],
+      'rate': rate,
+      'bias': np.abs(rate - 0.5)
+    }, columns=columns)
+
+class BiasAttack(LinearAttack):
+  """Finds combinations that predict some bits of the target, even if not all.
+
+  Instead of the Hamming similarity of each combination, it counts, for every
+  bit position, how many iterations the bit of the combination equals the bit
+  of the target, and reports the most biased (combination, bit) pairs. A
+  combination and its negation are equally biased, so only one is counted.
+  """
+
+  # Pairs reported when no --top is given
+  DEFAULT_TOP = 1000
+
+  def __init__(self, protocol: Protocol, iterations = 1, max_combinations = 2, **options):
+    """Takes the options of `LinearAttack` but the engine, as bit matches are
+    always counted over packed arrays, and pruning.
+    """
+    LinearAttack.__init__(self, protocol, iterations, max_combinations, **options)
+
+    self.id = f'bias->{protocol.id}'
+
+    if options.get('engine') is not None or self.prune is not None:
+      self.error('The bias attack takes neither an engine nor pruning', exception = ValueError(options))
+
+    self.engine = NumpyEngine()
+    self.top = self.top if self.top is not None else BiasAttack.DEFAULT_TOP
+
+    # Negations of other combinations, by keys of the parts and maximum number of combinations
+    self.complements = {}
+
+  def run_analysis(self, parts: dict, target: BitVector, iteration: int, max_combinations: int):
+    count = 0
+    operations = self.engine.operations
+
+    # A combination and its negation are equally biased, so only the first one is counted
+    keys = list(negate_parts(parts).keys())
+    exclude = self.complements.get((tuple(keys), max_combinations))
+
+    if exclude is None:
+      exclude = self.complements[(tuple(keys), max_combinations)] = complements(keys, max_combinations)
+
+    for descriptions, matches in self.engine.match_chunks(parts, target, max_combinations, exclude):
+      count += len(descriptions)
+      yield descriptions, matches
+
+    self.warn('(iter {:4d}) Counted bit matches of {} combinations', iteration, count)
+    self.profile.count(iteration, combinations = count, operations = self.engine.operations - operations)
+
+  def create_summary(self) -> BiasSummary:
+    return BiasSummary()
+
+  def summarize_results(self, summary: BiasSummary) -> DataFrame:
+    self.log('Summarizing results')
+
+    df = summary.to_frame(self.top)
+    self.warn(f'Summarized {len(df)} biased bits for {summary.iterations} iterations')
+
+    return df
@@ -0,0 +1,498 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+from base.operators import OperatorKind
+from util.bits import popcount
+from util.bitvector import BitVector, bit_count
+
+
+def negate_parts(parts: dict) -> dict:
+  """Extends the parts with their negations (`not_<key>`).
+  """
+  _parts = parts.copy()
+
+  for part_key, part_value in parts.items():
+    _parts[f'not_{part_key}'] = ~ part_value
+
+  return _parts
+
+def combinations(keys: list, max_combinations: int):
+  """Generates the combinations of parts and operators to be evaluated.
+
+  Each combination is a tuple `(elements, operators)` where the operators are
+  given in the order they are applied, left to right, to the elements. Every
+  ordering of the elements and every sequence of operators (with repetition)
+  is considered, but only one canonical form of each group of equivalent
+  expressions is generated:
+
+  - A part and its negation are never combined, nor a part with itself.
+  - Consecutive elements joined by the same operator (a run, which includes
+    the first element when the first operator starts it) commute, so they
+    follow the order of the keys. For `^` runs the order is that of the
+    parts regardless of negation.
+  - Negations in a `^` run cancel out in pairs and move freely within it
+    (`not_a ^ not_b` is `a ^ b`, `not_a ^ b` is `a ^ not_b`), so a `^` run
+    has at most one negated element, its last one.
+  - Negating every element in a trailing run of `&` and `|` (back to the
+    last `^` run or the start) and swapping those operators negates the
+    whole expression, which a following `^` absorbs, so only the form with
+    fewer negations (or starting with `&`, on ties) is followed by `^`.
+
+  The combinations form a tree, where the prefix of a combination (without
+  its last element and operator) is its parent, and they are generated depth
+  first: every combination comes right before its extensions.
+
+  Args:
+      keys (list): The keys of the parts, as returned by `negate_parts`
+      max_combinations (int): Maximum number of parts in a combination
+
+  Yields:
+      tuple: The elements and the operators of the combination
+  """
+  operator_kinds = [kind.value for kind in OperatorKind.all()]
+  xor = OperatorKind.XOR.value
+
+  # Part (without negation) of every key, and whether it is negated
+  index = {key: i for i, key in enumerate(keys)}
+  negated = [key.startswith('not_') and key[4:] in index for key in keys]
+  bases = [index[key[4:]] if negated[k] else k for k, key in enumerate(keys)]
+
+  def canonical_negation(elements: tuple, operators: tuple) -> bool:
+    # Trailing elements joined by & and |, back to the last ^ run (or the start)
+    start = len(operators)
+    while start > 0 and operators[start - 1] != xor:
+      start -= 1
+
+    segment = elements[start:]
+    n_negated = sum(negated[index[element]] for element in segment)
+
+    # Negating the segment (and swapping & and |) negates the whole expression
+    # which the ^ absorbs, so keep the form with the fewest negations
+    if 2 * n_negated != len(segment):
+      return 2 * n_negated < len(segment)
+
+    return operators[start] == OperatorKind.AND.value
+
+  def extend(elements: tuple, operators: tuple, last: int, used: set):
+    yield (elements, operators)
+
+    if len(elements) >= max_combinations:
+      return
+
+    for operator in operator_kinds:
+      # The first operator always continues the run of the first element
+      continues_run = len(operators) == 0 or operator == operators[-1]
+
+      for k in range(len(keys)):
+        if bases[k] in used:
+          continue
+
+        if continues_run:
+          if operator == xor and (negated[last] or bases[k] < bases[last]):
+            continue
+          if operator != xor and k < last:
+            continue
+        elif operator == xor and not canonical_negation(elements, operators):
+          continue
+
+        yield from extend(elements + (keys[k],), operators + (operator,), k, used | {bases[k]})
+
+  # Without parts to combine there is nothing to evaluate
+  if max_combinations < 1:
+    return
+
+  for k in range(len(keys)):
+    yield from extend((keys[k],), (), k, {bases[k]})
+
+def complements(keys: list, max_combinations: int) -> set:
+  """Returns the descriptions of the combinations that negate an earlier one.
+
+  Combinations are compared by their truth tables over the parts they use,
+  so the negation of a combination is found whatever its canonical form
+  (e.g. `not_a | not_b` for `a & b`, or `a ^ not_b` for `a ^ b`).
+
+  Args:
+      keys (list): The keys of the parts, as returned by `negate_parts`
+      max_combinations (int): Maximum number of parts in a combination
+  """
+  index = set(keys)
+  operators_by_value = {kind.value: kind.operator for kind in OperatorKind.all()}
+
+  # Truth tables of k variables, over their 2^k assignments
+  tables = [[sum(1 << x for x in range(1 << k) if (x >> i) & 1) for i in range(k)] for k in range(max(max_combinations, 0) + 1)]
+
+  seen = set()
+  found = set()
+
+  for elements, operators in combinations(keys, max_combinations):
+    bases = [element[4:] if element.startswith('not_') and element[4:] in index else element for element in elements]
+    variables = sorted(set(bases))
+    full = (1 << (1 << len(variables))) - 1
+
+    values = [tables[len(variables)][variables.index(base)] ^ (full if base != element else 0) for base, element in zip(bases, elements)]
+
+    value = values[0]
+    for operator, other in zip(operators, values[1:]):
+      value = operators_by_value[operator].apply(value, other)
+
+    key = (tuple(variables), min(value, full ^ value))
+
+    if key in seen:
+      found.add(describe(elements, operators))
+    else:
+      seen.add(key)
+
+  return found
+
+def describe(elements: tuple, operators: tuple) -> str:
+  description = elements[0]
+
+  for operator, element in zip(operators, elements[1:]):
+    description += f' {operator} {element}'
+
+  return description
+
+class Engine(ABC):
+
+  # Operator applications of every evaluation so far (prefixes reused are only counted once)
+  operations = 0
+
+  @abstractmethod
+  def chunks(self, parts: dict, target: BitVector, max_combinations: int, exclude: set = None):
+    """Evaluates every combination of the parts against the target, lazily.
+
+    Combinations are enumerated and evaluated as the chunks are consumed, so
+    memory does not grow with the number of combinations.
+
+    Args:
+        parts (dict): The parts of the messages (without negations)
+        target (BitVector): The value to compare the combinations with
+        max_combinations (int): Maximum number of parts in a combination
+        exclude (set, optional): Descriptions of combinations not to evaluate
+
+    Yields:
+        tuple: The descriptions and the similarities (np.ndarray) of a chunk
+          of (at most `chunk_size`) combinations
+    """
+    raise NotImplementedError
+
+class PrefixCache(object):
+  """A bounded cache of combination values, evicting the least recently used.
+  """
+
+  def __init__(self, max_size: int):
+    self.max_size = max_size
+    self.values = OrderedDict()
+    self.misses = 0
+
+  def get(self, key: tuple):
+    value = self.values.get(key)
+
+    if value is not None:
+      self.values.move_to_end(key)
+    else:
+      self.misses += 1
+
+    return value
+
+  def put(self, key: tuple, value):
+    self.values[key] = value
+
+    if len(self.values) > self.max_size:
+      self.values.popitem(last = False)
+
+class PythonEngine(Engine):
+  """Evaluates combinations one at a time with native integer operations.
+
+  The value of each combination is its prefix's value with one more operator
+  applied. Values are memoized in a bounded `PrefixCache` so every prefix is
+  computed once per iteration and reused by all of its extensions.
+
+  Whatever the backend of the parts, values are packed into Python integers,
+  whose operators and popcount are the fastest for a few hundred bits.
+  """
+
+  def __init__(self, cache_size: int = 4096, chunk_size: int = 4096):
+    self.cache_size = cache_size
+    self.chunk_size = chunk_size
+
+  _OPERATORS = {kind.value: kind.operator for kind in OperatorKind.all()}
+
+  def chunks(self, parts: dict, target: BitVector, max_combinations: int, exclude: set = None):
+    n_bits = len(target)
+    target = target.to_int()
+    parts = {key: part.to_int() for key, part in negate_parts(parts).items()}
+    cache = PrefixCache(self.cache_size)
+
+    def value_of(elements: tuple, operators: tuple) -> int:
+      if len(elements) == 1:
+        return parts[elements[0]]
+
+      value = cache.get((elements, operators))
+
+      if value is None:
+        # Apply the last operator to the value of the prefix with the last element
+        prefix = value_of(elements[:-1], operators[:-1])
+        operator = PythonEngine._OPERATORS[operators[-1]]
+
+        value = operator.apply(prefix, parts[elements[-1]])
+        cache.put((elements, operators), value)
+
+      return value
+
+    descriptions = []
+    similarities = np.empty(self.chunk_size, dtype = np.int64)
+
+    for elements, operators in combinations(list(parts.keys()), max_combinations):
+      description = describe(elements, operators)
+
+      # Prefixes are still computed when needed by an extension
+      if exclude is not None and description in exclude:
+        continue
+
+      # Number of equal bits is count of 0s in XOR
+      similarities[len(descriptions)] = n_bits - bit_count(value_of(elements, operators) ^ target)
+      descriptions.append(description)
+
+      if len(descriptions) == self.chunk_size:
+        yield descriptions, similarities
+
+        descriptions = []
+        similarities = np.empty(self.chunk_size, dtype = np.int64)
+
+    if len(descriptions) > 0:
+      yield descriptions, similarities[:len(descriptions)]
+
+    # Every value that was not cached took one operator
+    self.operations += cache.misses
+
+class NumpyEngine(Engine):
+  """Evaluates combinations in bulk over a packed matrix of parts.
+
+  All the parts (and their negations) are packed as rows of a single uint8
+  matrix. Combinations are evaluated level by level (by number of parts):
+  the values of a level are computed at once from the values of their
+  prefixes in the previous level, with broadcast bitwise operators, so each
+  prefix is computed only once. Similarities come from a lookup-table
+  popcount against the target.
+
+  The last level, usually the largest one, is not a prefix of any other, so
+  it is computed and compared chunk by chunk instead of all at once.
+  """
+
+  _UFUNCS = {
+    OperatorKind.AND.value: np.bitwise_and,
+    OperatorKind.OR.value:  np.bitwise_or,
+    OperatorKind.XOR.value: np.bitwise_xor
+  }
+
+  def __init__(self, chunk_size: int = 4096):
+    self.chunk_size = chunk_size
+
+    self._plans = {}
+    self._restricted = {}
+
+  def plan(self, keys: list, max_combinations: int) -> tuple:
+    """Splits the combinations in levels and returns them along with their
+    descriptions in evaluation order, and split in the chunks `outputs` yields.
+
+    Each level is a tuple (size, steps, outputs), where every step (ufunc,
+    rows, prefixes, elements) computes `rows` of the level applying `ufunc`
+    to the `prefixes` rows of the previous level and the `elements` rows of
+    the parts, and `outputs` are the rows of the level to be compared with
+    the target. The plan only depends on the keys of the parts, so it is
+    computed once and reused for every iteration.
+    """
+    plan_key = (tuple(keys), max_combinations)
+
+    if plan_key in self._plans:
+      return self._plans[plan_key]
+
+    index = {key: i for i, key in enumerate(keys)}
+
+    # Group the combinations of each level by their last operator
+    groups = [{} for _ in range(max_combinations)]
+
+    for elements, operators in combinations(keys, max_combinations):
+      last_operator = operators[-1] if len(operators) > 0 else None
+      groups[len(elements) - 1].setdefault(last_operator, []).append((elements, operators))
+
+    levels = []
+    descriptions = []
+    previous = {}
+
+    for level_groups in groups:
+      current = {}
+      steps = []
+
+      for last_operator, group in level_groups.items():
+        start = len(current)
+
+        for combination in group:
+          current[combination] = len(current)
+
+        rows = slice(start, len(current))
+        elements = np.array([index[elements[-1]] for elements, operators in group], dtype = np.intp)
+
+        if last_operator is None:
+          steps.append((None, rows, None, elements))
+        else:
+          prefixes = np.array([previous[(elements[:-1], operators[:-1])] for elements, operators in group], dtype = np.intp)
+          steps.append((NumpyEngine._UFUNCS[last_operator], rows, prefixes, elements))
+
+        descriptions.extend([describe(elements, operators) for elements, operators in group])
+
+      levels.append((len(current), steps, slice(None)))
+      previous = current
+
+    self._plans[plan_key] = (levels, descriptions, self.split(levels, descriptions))
+    return self._plans[plan_key]
+
+  def split(self, levels: list, descriptions: list) -> list:
+    """Splits the descriptions of a plan in the chunks `outputs` yields.
+
+    Chunks are tuples, reused for every iteration (see `Summary.rows`).
+    """
+    chunks = []
+    offset = 0
+
+    for depth, (size, steps, outputs) in enumerate(levels):
+      if depth < len(levels) - 1:
+        sizes = [len(range(size)[outputs]) if isinstance(outputs, slice) else len(outputs)]
+      else:
+        # The last level is split by step (all of its rows are outputs)
+        sizes = [len(elements) for ufunc, rows, prefixes, elements in steps]
+
+      for n in sizes:
+        for start in range(0, n, self.chunk_size):
+          chunks.append(tuple(descriptions[offset + start:offset + min(n, start + self.chunk_size)]))
+
+        offset += n
+
+    return chunks
+
+  def restrict(self, plan: tuple, exclude: set) -> tuple:
+    """Restricts a plan to the combinations not in `exclude` and their prefixes.
+    """
+    levels, descriptions, chunks = plan
+    keep = np.array([description not in exclude for description in descriptions], dtype = bool)
+
+    # Split by level, and mark the prefixes of needed rows from the deepest level up
+    bounds = np.cumsum([0] + [size for size, steps, outputs in levels])
+    kept = [keep[bounds[i]:bounds[i + 1]] for i in range(len(levels))]
+    needed = [rows.copy() for rows in kept]
+
+    for i in range(len(levels) - 1, 0, -1):
+      for ufunc, rows, prefixes, elements in levels[i][1]:
+        needed[i - 1][prefixes[needed[i][rows]]] = True
+
+    restricted = []
+
+    for i, (size, steps, outputs) in enumerate(levels):
+      restricted_steps = []
+
+      for ufunc, rows, prefixes, elements in steps:
+        selected = np.flatnonzero(needed[i][rows])
+
+        restricted_steps.append((
+          ufunc,
+          np.arange(size)[rows][selected],
+          prefixes[selected] if prefixes is not None else None,
+          elements[selected]
+        ))
+
+      restricted.append((size, restricted_steps, np.flatnonzero(kept[i])))
+
+    descriptions = [description for description, k in zip(descriptions, keep) if k]
+    return (restricted, descriptions, self.split(restricted, descriptions))
+
+  def outputs(self, parts: dict, max_combinations: int, exclude: set = None):
+    """Computes the values of the combinations, level by level, in chunks.
+
+    Yields:
+        tuple: The descriptions and the packed values of each chunk of
+          combinations
+    """
+    parts = negate_parts(parts)
+    keys = list(parts.keys())
+
+    matrix = np.stack([parts[key].pack() for key in keys])
+    levels, descriptions, chunks = self.active_plan(keys, max_combinations, exclude)
+    chunks = iter(chunks)
+
+    # Only the values of the previous level are kept
+    previous = None
+
+    for depth, (size, steps, outputs) in enumerate(levels):
+      if depth == len(levels) - 1:
+        # Values of the last level are only compared, so they are never stored as a whole
+        for ufunc, rows, prefixes, elements in steps:
+          for start in range(0, len(elements), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+
+            if ufunc is None:
+              yield next(chunks), matrix[elements[chunk]]
+            else:
+              self.operations += len(elements[chunk])
+              yield next(chunks), ufunc(previous[prefixes[chunk]], matrix[elements[chunk]])
+
+        break
+
+      values = np.empty((size, matrix.shape[1]), dtype = np.uint8)
+
+      for ufunc, rows, prefixes, elements in steps:
+        if ufunc is not None:
+          self.operations += len(elements)
+
+        if ufunc is None:
+          values[rows] = matrix[elements]
+        elif isinstance(rows, slice):
+          ufunc(previous[prefixes], matrix[elements], out = values[rows])
+        else:
+          values[rows] = ufunc(previous[prefixes], matrix[elements])
+
+      values_outputs = values[outputs]
+
+      for start in range(0, len(values_outputs), self.chunk_size):
+        yield next(chunks), values_outputs[start:start + self.chunk_size]
+
+      previous = values
+
+  def active_plan(self, keys: list, max_combinations: int, exclude: set = None) -> tuple:
+    plan_key = (tuple(keys), max_combinations)
+    plan = self.plan(keys, max_combinations)
+
+    if not exclude:
+      return plan
+
+    # Exclusions only grow during an attack, so the restriction is kept while the set does not change
+    cached = self._restricted.get(plan_key)
+
+    if cached is None or cached[0] is not exclude or cached[1] != len(exclude):
+      cached = (exclude, len(exclude), self.restrict(plan, exclude))
+      self._restricted[plan_key] = cached
+
+    return cached[2]
+
+  def chunks(self, parts: dict, target: BitVector, max_combinations: int, exclude: set = None):
+    packed_target = target.pack()
+    n_bits = len(target)
+
+    for descriptions, values in self.outputs(parts, max_combinations, exclude):
+      # Equal bits are the ones not set in the XOR (padding is always equal)
+      yield descriptions, n_bits - popcount(values ^ packed_target)
+
+  def match_chunks(self, parts: dict, target: BitVector, max_combinations: int, exclude: set = None):
+    """Compares every combination of the parts against the target, bit by bit.
+
+    Yields:
+        tuple: The descriptions of a chunk of combinations and a (combinations,
+          bits) uint8 matrix, set where the bit of the combination equals the
+          target's
+    """
+    packed_target = target.pack()
+    n_bits = len(target)
+
+    for descriptions, values in self.outputs(parts, max_combinations, exclude):
+      yield descriptions, np.unpackbits(~(values ^ packed_target), axis = 1)[:, :n_bits]
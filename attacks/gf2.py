@@ -0,0 +1,261 @@
+import numpy as np
+from base.protocol import Protocol
+from pandas import DataFrame
+from util.bits import POPCOUNT
+from util.bitvector import BitVector, cast, vector
+from util.rng import stream_generator
+
+from attacks.linear import LinearAttack
+
+
+def pack_words(bits: np.ndarray) -> np.ndarray:
+  """Packs a (rows, columns) matrix of 0/1 into (rows, words) of 64 bits.
+
+  Column `c` is stored in word `c // 64`, under `column_mask(c)`.
+  """
+  packed = np.packbits(bits, axis = 1)
+  packed = np.pad(packed, ((0, 0), (0, (-packed.shape[1]) % 8)))
+
+  return np.ascontiguousarray(packed).view('<u8')
+
+def column_mask(column: int) -> tuple:
+  """Returns the word and the mask of a column in a matrix from `pack_words`.
+  """
+  # Bytes are little endian within a word, bits are big endian within a byte
+  shift = 8 * ((column // 8) % 8) + 7 - (column % 8)
+  return column // 64, np.uint64(1) << np.uint64(shift)
+
+def parity(words: np.ndarray) -> np.ndarray:
+  """Returns the parity of the set bits of each row of words.
+  """
+  return POPCOUNT[words.view(np.uint8)].sum(axis = -1) % 2
+
+def eliminate(words: np.ndarray, n_columns: int) -> list:
+  """Reduces a packed matrix in place to reduced row echelon form over GF(2).
+
+  Only the first `n_columns` columns are used as pivots; the rest (e.g. the
+  right hand sides of the systems) are reduced along.
+
+  Returns:
+      list: The pivot column of each of the first rows
+  """
+  pivots = []
+
+  for column in range(n_columns):
+    row = len(pivots)
+    if row == len(words):
+      break
+
+    word, mask = column_mask(column)
+    candidates = np.flatnonzero(words[row:, word] & mask)
+
+    if len(candidates) == 0:
+      continue
+
+    # Move the pivot up and clear the column in every other row
+    pivot = row + candidates[0]
+    if pivot != row:
+      words[[row, pivot]] = words[[pivot, row]]
+
+    others = np.flatnonzero(words[:, word] & mask)
+    others = others[others != row]
+    words[others] ^= words[row]
+
+    pivots.append(column)
+
+  return pivots
+
+class GF2Summary(object):
+  """The parts and target of every session, as rows of bits.
+
+  Each row holds the bits of all the parts (in the order of `keys`), a
+  constant 1 bit, and the bits of the target.
+  """
+
+  # Sessions beyond the rank in the subsets of the trials, so random right hand sides are inconsistent
+  REDUNDANCY = 16
+
+  # Standard errors above 1/2 of the agreement of a relation that does not always hold
+  Z = 3.0
+
+  def __init__(self):
+    self.iterations = 0
+    self.length = None
+    self.keys = None
+    self.rows = []
+
+  def add(self, chunks):
+    for keys, row in chunks:
+      if self.keys is None:
+        self.keys = keys
+
+      self.rows.append(row)
+
+    self.iterations += 1
+
+  def merge(self, other: 'GF2Summary'):
+    if self.keys is None:
+      self.keys = other.keys
+
+    self.rows.extend(other.rows)
+    self.iterations += other.iterations
+
+    if other.length is not None:
+      self.length = other.length
+
+  def variables(self) -> list:
+    return [f'{key}[{bit}]' for key in self.keys for bit in range(self.length)] + ['1']
+
+  def matrix(self) -> np.ndarray:
+    n_columns = (len(self.keys) + 1) * self.length + 1
+    return np.unpackbits(np.stack(self.rows), axis = 1)[:, :n_columns]
+
+  def solve(self, words: np.ndarray, n_variables: int) -> tuple:
+    """Solves the systems of every target bit over the given rows.
+
+    Returns:
+        tuple: A (target bits, words) matrix with the solution of each
+          system, whether each system is consistent, and the rank of the rows
+    """
+    words = words.copy()
+    pivots = eliminate(words, n_variables)
+
+    solutions = np.zeros((self.length, words.shape[1]), dtype = words.dtype)
+    consistent = np.ones(self.length, dtype = bool)
+
+    for bit in range(self.length):
+      word, mask = column_mask(n_variables + bit)
+      column = (words[:, word] & mask) != 0
+
+      # Rows without pivot must be 0 = 0, and pivots take the right hand side (free variables are 0)
+      consistent[bit] = not column[len(pivots):].any()
+
+      for row, pivot in enumerate(pivots):
+        if column[row]:
+          pivot_word, pivot_mask = column_mask(pivot)
+          solutions[bit, pivot_word] |= pivot_mask
+
+    return solutions, consistent, len(pivots)
+
+  def to_frame(self, trials: int = 0, rng: np.random.Generator = None) -> DataFrame:
+    """Finds a linear relation between the bits of the parts and each target bit.
+
+    Exact relations come from solving each system over every session. For
+    the remaining bits, the systems are solved over `trials` random subsets
+    of `REDUNDANCY` sessions more than the rank, so they are only consistent
+    when the relation holds in the whole subset. The relation that holds in
+    the most of the remaining sessions is kept if its agreement is `Z`
+    standard errors above 1/2. Bits without a relation are left out.
+    """
+    columns = ['bit', 'relation', 'terms', 'agreement', 'exact']
+
+    if self.keys is None or len(self.rows) == 0:
+      return DataFrame([], columns=columns)
+
+    variables = self.variables()
+    n_variables = len(variables)
+
+    bits = self.matrix()
+    words = pack_words(bits)
+    targets = bits[:, n_variables:]
+
+    # Relations are evaluated with the variable columns only
+    coefficients = pack_words(np.pad(bits[:, :n_variables], ((0, 0), (0, bits.shape[1] - n_variables))))
+
+    def agreement(solution: np.ndarray, bit: int, rows: np.ndarray) -> float:
+      return float(np.mean(parity(coefficients[rows] & solution) == targets[rows, bit]))
+
+    solutions, exact, rank = self.solve(words, n_variables)
+    scores = np.where(exact, 1.0, 0.0)
+
+    # Relations found over a subset are scored on the other sessions, which
+    # must be enough to tell them apart from random (agreement 1/2)
+    rng = rng if rng is not None else np.random.default_rng()
+    subset = rank + GF2Summary.REDUNDANCY
+    held_out = len(words) - subset
+
+    if held_out < GF2Summary.Z ** 2:
+      trials = 0
+
+    for _ in range(trials if not exact.all() else 0):
+      rows = rng.permutation(len(words))
+      trial_solutions, trial_consistent, _ = self.solve(words[rows[:subset]], n_variables)
+
+      for bit in np.flatnonzero(~exact & trial_consistent):
+        score = agreement(trial_solutions[bit], bit, rows[subset:])
+
+        if score > scores[bit]:
+          scores[bit] = score
+          solutions[bit] = trial_solutions[bit]
+
+    # Agreement of random relations over the held out sessions is 1/2, with a standard error of 1/(2 sqrt(n))
+    significant = exact | ((scores - 0.5) * 2 * np.sqrt(max(held_out, 1)) >= GF2Summary.Z)
+
+    results = []
+
+    for bit in np.flatnonzero(significant).tolist():
+      terms = [variables[c] for c in range(n_variables) if solutions[bit][column_mask(c)[0]] & column_mask(c)[1]]
+
+      results.append({
+        'bit': bit,
+        'relation': ' ^ '.join(terms) if len(terms) > 0 else '0',
+        'terms': len(terms),
+        'agreement': scores[bit],
+        'exact': bool(exact[bit])
+      })
+
+    return DataFrame(results, columns=columns)
+
+class GF2Attack(LinearAttack):
+  """Finds XOR relations between the bits of the parts and each target bit.
+
+  Instead of enumerating combinations, every session adds one equation per
+  target bit, over GF(2), whose unknowns are the coefficients of every bit of
+  every part (and a constant). The systems are solved by Gaussian
+  elimination on 64-bit words, finding relations of any number of terms.
+  Sessions should outnumber the unknowns (bits of all the parts, plus one).
+  """
+
+  # Random subsets of sessions tried for bits without an exact relation
+  TRIALS = 16
+
+  def __init__(self, protocol: Protocol, iterations = 1, max_combinations = 2, **options):
+    """Takes the options of `LinearAttack` but the engine and pruning, as
+    combinations are not enumerated.
+    """
+    LinearAttack.__init__(self, protocol, iterations, max_combinations, **options)
+
+    self.id = f'gf2->{protocol.id}'
+
+    if options.get('engine') is not None or self.prune is not None:
+      self.error('The GF2 attack takes neither an engine nor pruning', exception = ValueError(options))
+
+  def run_analysis(self, parts: dict, target: BitVector, iteration: int, max_combinations: int):
+    row = vector(0, 0)
+    for part in parts.values():
+      row = row + cast(part)
+
+    row = row + vector(1, 1) + cast(target)
+
+    self.log('(iter {:4d}) Added equations with {} unknowns', iteration, len(row) - len(target))
+    yield list(parts.keys()), row.pack()
+
+  def create_summary(self) -> GF2Summary:
+    return GF2Summary()
+
+  def summarize_results(self, summary: GF2Summary) -> DataFrame:
+    self.log('Solving systems')
+
+    n_variables = (len(summary.keys) * summary.length + 1) if summary.keys is not None else 0
+    if summary.iterations <= n_variables:
+      self.warn(f'Only {summary.iterations} sessions for {n_variables} unknowns, relations may not hold in general')
+
+    # Iterations use the streams from 1 on
+    df = summary.to_frame(GF2Attack.TRIALS, stream_generator(self.seed, 0))
+    df = df.sort_values(by = ['agreement', 'terms', 'bit'], ascending = [False, True, True])
+
+    if self.top is not None:
+      df = df.head(self.top)
+
+    self.warn(f'Found {int(df["exact"].sum())} exact and {int((~df["exact"]).sum())} near-exact relations of {summary.length} target bits over {summary.iterations} sessions')
+    return df
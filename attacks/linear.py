@@ -1,112 +1,104 @@
-import functools
-import itertools
-import statistics
+import multiprocessing
 
+from attacks.engines import Engine, PythonEngine
+from attacks.summary import Summary
 from base.attack import Attack
+from base.batch import Batch
+from base.chain import Chain
+from base.corpus import Corpus
 from base.message import Message
-from base.operators import Operator, OperatorKind
 from base.protocol import Protocol
-from bitarray import bitarray
 from pandas import DataFrame
+from util.bitvector import BitVector, get_backend, use_backend
+from util.logger import Logger, LogLevel, LogSink
+from util.profile import Profile
+from util.rng import new_seed, seed_stream, stream_generator
 
 
-class LinearAttack(Attack):
-
-  def __init__(self, protocol: Protocol, iterations = 1, max_combinations = 2):
-    Attack.__init__(self, 'linear', protocol)
-
-    self.iterations = iterations
-    self.max_combinations = max_combinations
-
-  def run_analysis(self, parts: dict, target: bitarray, iteration: int, max_combinations: int) -> list:
-    def evaluate(value: bitarray, target: bitarray) -> int:
-      # Number of equal bits is count of 0s (falses) in XOR
-      xor = value ^ target
-      return xor.count(False)
-
-    _parts = parts.copy()
-
-    # Add negated parts
-    for part_key, part_value in parts.items():
-      _parts[f'not_{part_key}'] = ~ part_value
-
-    parts = _parts
-
-    # Get combinations of keys
-    combinations = set([])
-
-    for L in range(1, max_combinations + 1):
-      combinations = combinations.union(set(itertools.combinations(parts.keys(), L)))
-
-    # Generate operations
-    # operators = [&, |, ^]
-    results = []
-    operator_kinds = [kind.value for kind in OperatorKind.all()]
-
-    for combination in combinations:
-      # When only one element, use it
-      if len(combination) < 2:
-        description = combination[0]
-        value = parts[description]
-        similarity = evaluate(value, target)
-
-        results.append({
-          'description': description,
-          'value': value,
-          'similarity': similarity
-        })
-      # When several elements, calculate combinations of operators
-      else:
-        n_operators = len(combination) - 1
-
-        operator_combinations = itertools.combinations(operator_kinds, n_operators)
+# Attack of the current worker process
+_worker_attack = None
 
-        # And iterate to create combination of parts and operators
-        for operator_combination in operator_combinations:
-          elements = list(combination)
-          operators = list(operator_combination)
+def _init_worker(attack: 'LinearAttack', level: LogLevel, sink: LogSink, backend: type):
+  global _worker_attack
 
-          description = elements.pop(0)
-          value       = parts[description] # value starts as the first element
+  Logger.set_level(level)
+  Logger.set_sink(sink)
+  use_backend(backend)
+  _worker_attack = attack
 
-          # While we have elements in the list of elements,
-          # If we still have operators, we should have another element
-          while len(operators) > 0 and len(elements) > 0:
-            # Get the kind of operator and the element and update the description
-            operator_kind = operators.pop()
-            element_desc = elements.pop(0)
+def _run_block(block: tuple) -> tuple:
+  target_name, first, count, exclude = block
 
-            description += f' {operator_kind} {element_desc}'
+  _worker_attack.exclude = exclude
+  summary = _worker_attack.run_block(target_name, first, count)
 
-            # Apply the operator to the value with the element
-            operator = OperatorKind(operator_kind).operator
-            element = parts[element_desc]
+  # Workers are not shut down cleanly, so buffered messages are written now
+  Logger.flush()
+  return summary, _worker_attack.profile.take()
 
-            value = operator.apply(value, element)
+class LinearAttack(Attack):
+  # Iterations per block when not running in batches
+  BLOCK_SIZE = 16
 
-          similarity  = evaluate(value, target)
+  # Least blocks between pruning decisions (by default, one per job), and confidence (in standard errors) to prune
+  PRUNE_ROUND = 4
+  PRUNE_Z = 3.0
 
-          # And add the result
-          results.append({
-            'description': description,
-            'value': value,
-            'similarity': similarity
-          })
+  def __init__(self, protocol: Protocol, iterations = 1, max_combinations = 2, engine: Engine = None, batch_size = 0, jobs = 1, seed: int = None, top: int = None, prune: int = None, prune_band: float = 2.0, prune_round: int = None, corpus: Corpus = None, chain: bool = False, checkpoint: int = 0, observers: list = None, resume: str = None, profile: bool = False):
+    Attack.__init__(self, 'linear', protocol)
 
-    self.warn(f'(iter {iteration:4d}) Evaluated {len(results)} combinations')
-    return results
+    self.iterations = iterations
+    self.max_combinations = max_combinations
+    self.engine = engine if engine is not None else PythonEngine()
+    self.batch_size = batch_size
+    self.jobs = jobs
+    self.seed = seed
+    self.top = top
+    self.prune = prune
+    self.prune_band = prune_band
+    self.prune_round = prune_round
+    self.corpus = corpus
+    self.chain = chain
+    self.checkpoint = checkpoint
+    self.observers = observers
+    self.resume = resume
+    self.sessions = None
+    self.profile = Profile(profile)
+
+    # Descriptions of the pruned combinations
+    self.exclude = set()
+    self.length = None
+
+  def run_analysis(self, parts: dict, target: BitVector, iteration: int, max_combinations: int):
+    """Evaluates the combinations of the parts against the target.
+
+    Yields:
+        tuple: The descriptions and the similarities of each chunk of
+          combinations, as they are evaluated
+    """
+    count = 0
+    operations = self.engine.operations
+
+    for descriptions, similarities in self.engine.chunks(parts, target, max_combinations, self.exclude):
+      count += len(descriptions)
+      yield descriptions, similarities
+
+    self.warn('(iter {:4d}) Evaluated {} combinations', iteration, count)
+    self.profile.count(iteration, combinations = count, operations = self.engine.operations - operations)
 
   def run_attack(self, target_name: str, iteration: int = 1, max_combinations: int = 2):
     # Empty messages
     self.messages = []
 
-    # Reinit protocol
-    self.protocol.__init__()
-    self.log(f'(iter {iteration:4d}) Started protocol')
+    # New session, with fresh secrets
+    with self.profile.phase('simulation', iteration):
+      self.protocol.reset()
+    self.log('(iter {:4d}) Reset protocol', iteration)
 
-    # Attach to channel
-    self.log(f'(iter {iteration:4d}) Attached to channel')
-    self.protocol.channel.listen(self)
+    # Attach to channel (it is kept between sessions)
+    if self not in self.protocol.channel.listeners:
+      self.protocol.channel.listen(self)
+      self.log('(iter {:4d}) Attached to channel', iteration)
 
     # Check that we have a target before running protocol
     target = None
@@ -114,25 +106,58 @@ class LinearAttack(Attack):
     if hasattr(self.protocol.tag, target_name):
       target = getattr(self.protocol.tag, target_name)
     else:
-      self.error(f'Tag doesn\'t have attribute {target_name}')
+      self.error('Tag doesn\'t have attribute {}', target_name)
 
     if target is None:
-      self.error(f'(iter {iteration:4d}) Tag doesn\'t have an ID!')
+      self.error('(iter {:4d}) Tag doesn\'t have an ID!', iteration)
     else:
-      self.log(f'(iter {iteration:4d}) Target ID has length {target.length()}')
+      self.log('(iter {:4d}) Target ID has length {}', iteration, len(target))
 
     # Let protocol run
-    self.protocol.run()
+    with self.profile.phase('simulation', iteration):
+      self.protocol.run()
+    self.profile.count(iteration, sessions = 1)
+
+    return self.run_messages(self.messages, target, iteration, max_combinations)
+
+  def run_batch(self, target_name: str, batch: Batch, iteration: int = 1, max_combinations: int = 2):
+    """Runs the attack over every session of a batch, starting at the given iteration.
 
-    # Get messages
-    messages = self.messages
-    self.warn(f'(iter {iteration:4d}) Intercepted {len(messages)} messages')
+    Yields:
+        tuple: The results of each session, as returned by `run_analysis`
+    """
+    if target_name not in batch.variables:
+      self.error(f'Batch doesn\'t have variable {target_name}')
+
+    for session in range(batch.size):
+      messages = batch.transcript(session)
+      target = batch.variable(target_name, session)
+
+      yield self.run_messages(messages, target, iteration + session, max_combinations)
+
+  def run_messages(self, messages: list, target: BitVector, iteration: int = 1, max_combinations: int = 2):
+    """Splits the intercepted messages in parts and analyzes them against the target.
+    """
+    self.warn('(iter {:4d}) Intercepted {} messages', iteration, len(messages))
+
+    with self.profile.phase('parts', iteration):
+      parts = self.split_messages(messages, target, iteration)
+
+    self.profile.count(iteration, messages = len(messages), parts = len(parts))
+    self.warn(lambda: f'(iter {iteration:4d}) Got {len(parts)} total parts -> {list(parts.keys())}')
+
+    # Time to analyze combinations and return results (evaluated as they are consumed)
+    results = self.run_analysis(parts, target, iteration, max_combinations)
+    return self.profile.timed('evaluation', iteration, results)
 
+  def split_messages(self, messages: list, target: BitVector, iteration: int) -> dict:
+    """Infers the length of the parts of the messages (that of the target) and splits them.
+    """
     # Naive infer length
     L = None
 
     for message in messages:
-      l = message.content.length()
+      l = message.size()
 
       # Empty message (hello?)
       if l < 1:
@@ -144,16 +169,18 @@ class LinearAttack(Attack):
       elif l < L and (L % l) == 0:
         L = l
 
-    if L == target.length():
-      self.log(f'(iter {iteration:4d}) Inferred length {L} (same as ID)')
+    self.length = len(target)
+
+    if L == len(target):
+      self.log('(iter {:4d}) Inferred length {} (same as ID)', iteration, L)
     else:
-      self.error(f'(iter {iteration:4d}) Inferred length {L} doesn\'t match target ID length of {target.length()}')
+      self.error('(iter {:4d}) Inferred length {} doesn\'t match target ID length of {}', iteration, L, len(target))
 
     # Get parts
     parts = {}
 
     for message in messages:
-      l = message.content.length()
+      l = message.size()
 
       # Empty message
       if l < 1:
@@ -161,69 +188,196 @@ class LinearAttack(Attack):
 
       # Get # of 'parts'
       if (l % L != 0):
-        self.error(f'(iter {iteration:4d}) Message `{message.label}´ has irregular length {l}, base is {L}')
+        self.error('(iter {:4d}) Message `{}´ has irregular length {}, base is {}', iteration, message.label, l, L)
       else:
-        _parts = [message.content[i:i + L] for i in range(0, l, L)]
+        # Parts reference the values of the message (or views of its rows) when possible
+        _parts = message.split(L)
         _labels = [f'{message.label}_{i}' for i in range(len(_parts))]
 
-        self.log(f'(iter {iteration:4d}) Message `{message.label}´ has regular length {l}, {len(_parts)} parts detected -> {_labels}')
+        self.log('(iter {:4d}) Message `{}´ has regular length {}, {} parts detected -> {}', iteration, message.label, l, len(_parts), _labels)
 
         _parts_labels = list(zip(_labels, _parts))
         for _label, _part in _parts_labels:
           parts[_label] = _part
 
-    self.warn(f'(iter {iteration:4d}) Got {len(parts)} total parts -> {list(parts.keys())}')
+    return parts
 
-    # Time to analyze combinations and return results
-    results = self.run_analysis(parts, target, iteration, max_combinations)
-    return results
+  def create_summary(self) -> Summary:
+    return Summary(pruning = self.prune is not None)
 
-  def summarize_results(self, results_lists: list) -> DataFrame:
+  def summarize_results(self, summary: Summary) -> DataFrame:
     self.log('Summarizing results')
 
-    # Extract keys (descriptions)
-    keys = [set([item['description'] for item in _list]) for _list in results_lists]
-    keys = functools.reduce((lambda history, new: history & new), keys)
+    df = summary.to_frame(self.top)
+    df = df.sort_values(by = ['mean', 'stdev', 'combination'], ascending = False)
+    self.warn(f'Summarized {len(df)} results for {summary.iterations} iterations')
+
+    return df
+
+  def run_block(self, target_name: str, first: int, count: int) -> Summary:
+    """Runs `count` iterations starting at `first` and returns their partial summary.
+
+    Every iteration (or batch) is seeded from the attack seed and its own
+    number, so a block gives the same results wherever it is run.
+    """
+    summary = self.create_summary()
+
+    if self.sessions is not None or self.corpus is not None or self.batch_size > 0:
+      # Sessions of the whole block are simulated (or read) at once, in the first iteration
+      with self.profile.phase('simulation', first):
+        if self.sessions is not None:
+          # The next sessions of the chain (blocks run in order)
+          batch = self.sessions.next(count)
+          self.log('(iter {:4d}) Simulated {} chained sessions', first, batch.size)
+        elif self.corpus is not None:
+          # Read the sessions of the block from the corpus (iterations start at 1)
+          batch = self.corpus.batch(first - 1, count)
+          self.log('(iter {:4d}) Read batch of {} sessions', first, batch.size)
+        else:
+          # Simulate the whole block at once, from the stream of its first iteration
+          batch = self.protocol.run_batch(count, stream_generator(self.seed, first))
+          self.log('(iter {:4d}) Simulated batch of {} sessions', first, batch.size)
+
+      self.profile.count(first, sessions = batch.size)
+
+      for i, results in enumerate(self.run_batch(target_name, batch, first, self.max_combinations), first):
+        with self.profile.phase('fold', i):
+          summary.add(results)
+    else:
+      for i in range(first, first + count):
+        seed_stream(self.seed, i)
+        results = self.run_attack(target_name, i, self.max_combinations)
+
+        with self.profile.phase('fold', i):
+          summary.add(results)
 
-    # Now for each of these keys
-    results = []
+    summary.length = self.length
+    return summary
 
-    for key in keys:
-      # Obtain the relevant elements for each results
-      relevant = [[item for item in _list if item['description'] == key] for _list in results_lists]
-      relevant = functools.reduce((lambda history, new: history + new), relevant)
+  def prune_results(self, summary: Summary):
+    """Prunes the combinations that are confidently within the band around
+    random similarity (half of the target bits), so they are no longer evaluated.
+    """
+    low = summary.length / 2 - self.prune_band
+    high = summary.length / 2 + self.prune_band
 
-      # Obtain the similarities
-      simil = [item['similarity'] for item in relevant]
+    with self.profile.phase('prune'):
+      pruned = summary.prune(low, high, LinearAttack.PRUNE_Z)
+    self.exclude.update(pruned)
 
-      # Obtain mean & stdev
-      mean = statistics.mean(simil)
-      stdev = statistics.stdev(simil) if len(simil) > 1 else 0
+    remaining = len(summary.descriptions) - len(self.exclude)
+    self.warn('(iter {:4d}) Pruned {} combinations, {} remaining', summary.iterations, len(pruned), remaining)
 
-      # Add it to results
-      results.append({
-        'combination': key,
-        'mean': mean,
-        'stdev': stdev
-      })
+  def rounds(self, blocks: list) -> list:
+    """Splits the blocks in rounds, with pruning decisions taken after each one.
 
-    # Create dataframe & return
-    df = DataFrame(results, columns=['combination', 'mean', 'stdev'])
-    self.warn(f'Summarized {len(keys)} results for {len(results_lists)} iterations')
+    The first round ends with the block that completes the warm-up, and the
+    rest have `prune_round` blocks, or one per job (at least PRUNE_ROUND).
+    Without pruning, all blocks are a single round.
+    """
+    if self.prune is None:
+      return [blocks]
 
-    return df
+    round_size = self.prune_round if self.prune_round is not None else max(self.jobs, LinearAttack.PRUNE_ROUND)
+
+    iterations = 0
+    warmup = 0
+    while warmup < len(blocks) and iterations < self.prune:
+      iterations += blocks[warmup][2]
+      warmup += 1
+
+    return [blocks[:warmup]] + [blocks[start:start + round_size] for start in range(warmup, len(blocks), round_size)]
+
+  def run_rounds(self, blocks: list, summary: Summary, pool: multiprocessing.Pool = None):
+    for round_blocks in self.rounds(blocks):
+      if len(round_blocks) == 0:
+        continue
+
+      if pool is not None:
+        exclude = frozenset(self.exclude)
+        partials = pool.imap(_run_block, [block + (exclude,) for block in round_blocks])
+      else:
+        partials = ((self.run_block(*block), None) for block in round_blocks)
+
+      # Partial summaries (and the profiles of workers) are merged in block order
+      for partial, profile in partials:
+        summary.merge(partial)
+
+        if profile is not None:
+          self.profile.merge(profile)
+
+      if self.prune is not None and summary.iterations >= self.prune:
+        self.prune_results(summary)
 
   def run(self, target_name: str) -> DataFrame:
     super(LinearAttack, self).run(target_name)
 
-    results = []
+    if self.corpus is not None:
+      # Sessions were already simulated, with the seed of the corpus
+      if self.iterations > self.corpus.size:
+        self.warn(f'Corpus only has {self.corpus.size} sessions')
+        self.iterations = self.corpus.size
+
+      self.seed = self.corpus.seed
+
+    if self.seed is None:
+      self.seed = new_seed()
+    self.warn(f'Using seed {self.seed}')
+
+    # Iterations are split in blocks that do not depend on the number of jobs,
+    # and pruning decisions are only taken between rounds of blocks
+    block_size = self.batch_size if self.batch_size > 0 else LinearAttack.BLOCK_SIZE
+
+    if self.corpus is not None and self.batch_size == 0:
+      block_size = self.corpus.block_size
+
+    if self.chain:
+      # A single tag, from fresh secrets, whose sessions depend on the previous ones
+      if self.jobs > 1:
+        self.warn('Chained sessions run in order, ignoring jobs')
+        self.jobs = 1
 
-    # Run N times
-    for i in range(1, self.iterations + 1):
-      results.append(self.run_attack(target_name, i, self.max_combinations))
+      seed_stream(self.seed, 0)
+      self.protocol.reset()
+
+      if self.batch_size == 0:
+        block_size = Chain.BLOCK_SIZE
+
+      self.sessions = Chain(self.protocol, stream_generator(self.seed, self.iterations + 1), block_size, self.checkpoint, self.observers)
+
+      if self.resume is not None:
+        self.sessions.resume(self.resume)
+
+      # Blocks end at every checkpoint, as when running the chain on its own
+      blocks = []
+      first = 1
+
+      for size in self.sessions.blocks(self.iterations):
+        blocks.append((target_name, first, size))
+        first += size
+    else:
+      blocks = [
+        (target_name, first, min(block_size, self.iterations + 1 - first))
+        for first in range(1, self.iterations + 1, block_size)
+      ]
+
+    summary = self.create_summary()
+    self.exclude = set()
+
+    # The time of the run not spent in any phase (e.g. waiting for workers) is kept as `other`
+    with self.profile.phase('other'):
+      if self.jobs > 1:
+        # Buffered messages are written before workers get a copy of the sink
+        Logger.flush()
+
+        with multiprocessing.Pool(self.jobs, _init_worker, (self, Logger._level, Logger._sink, get_backend())) as pool:
+          self.run_rounds(blocks, summary, pool)
+      else:
+        self.run_rounds(blocks, summary)
 
-    # Get summary
-    return self.summarize_results(results)
+      # Get summary
+      with self.profile.phase('summary'):
+        return self.summarize_results(summary)
 
   def receive(self, message: Message):
     self.messages.append(message)
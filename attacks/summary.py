@@ -0,0 +1,223 @@
+import heapq
+
+import numpy as np
+from pandas import DataFrame
+
+
+def top_k(k: int, scores: np.ndarray, key) -> np.ndarray:
+  """Returns the indices of the k largest rows, best first.
+
+  Rows are prefiltered by score, so only the candidates that may be in the
+  top k (ties included) are pushed through a bounded heap ordered by `key`.
+
+  Args:
+      k (int): Number of rows to keep
+      scores (np.ndarray): The primary score of each row
+      key (callable): Full ordering key of a row index, starting with its score
+
+  Returns:
+      np.ndarray: The indices of the k best rows
+  """
+  if k <= 0:
+    return np.zeros(0, dtype = np.intp)
+
+  if len(scores) > k:
+    threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+    candidates = np.flatnonzero(scores >= threshold)
+  else:
+    candidates = np.arange(len(scores))
+
+  return np.array(heapq.nlargest(k, candidates.tolist(), key = key), dtype = np.intp)
+
+
+class Summary(object):
+  """Running mean and standard deviation of the similarity of each combination.
+
+  Every iteration is folded into per-combination accumulators (count, mean and
+  M2, following Welford's algorithm) as soon as it is evaluated, so memory is
+  bounded by the number of combinations regardless of the iterations.
+  """
+
+  # Chunks of descriptions whose rows are cached
+  CHUNK_ROWS = 4096
+
+  def __init__(self, pruning: bool = False):
+    self.iterations = 0
+    self.index = {}
+    self.descriptions = []
+    self.pruning = pruning
+
+    # Length in bits of the target the similarities were computed against
+    self.length = None
+
+    self.count = np.zeros(0, dtype = np.int64)
+    self.mean = np.zeros(0, dtype = np.float64)
+    self.m2 = np.zeros(0, dtype = np.float64)
+
+    # Iteration after which each combination was pruned (0 if it was not)
+    self.pruned = np.zeros(0, dtype = np.int64)
+
+    # Rows of the chunks of descriptions that engines reuse between iterations
+    self._chunk_rows = {}
+
+  def rows(self, descriptions: list) -> np.ndarray:
+    """Returns the accumulator row of each description, adding the new ones.
+
+    Descriptions given as a tuple are taken to be reused between iterations,
+    so their rows are only looked up once.
+    """
+    reused = isinstance(descriptions, tuple)
+
+    if reused:
+      # Equal chunks share their rows, whether or not they are the same object
+      cached = self._chunk_rows.get(descriptions)
+
+      if cached is not None:
+        return cached
+
+    rows = np.empty(len(descriptions), dtype = np.intp)
+
+    for i, description in enumerate(descriptions):
+      row = self.index.get(description)
+
+      if row is None:
+        row = len(self.descriptions)
+        self.index[description] = row
+        self.descriptions.append(description)
+
+      rows[i] = row
+
+    self.grow(len(self.descriptions))
+
+    if reused:
+      if len(self._chunk_rows) >= Summary.CHUNK_ROWS:
+        self._chunk_rows.clear()
+
+      self._chunk_rows[descriptions] = rows
+
+    return rows
+
+  def grow(self, size: int):
+    if size <= len(self.count):
+      return
+
+    capacity = max(size, 2 * len(self.count))
+    extra = capacity - len(self.count)
+
+    self.count = np.concatenate([self.count, np.zeros(extra, dtype = np.int64)])
+    self.mean = np.concatenate([self.mean, np.zeros(extra, dtype = np.float64)])
+    self.m2 = np.concatenate([self.m2, np.zeros(extra, dtype = np.float64)])
+    self.pruned = np.concatenate([self.pruned, np.zeros(extra, dtype = np.int64)])
+
+  def add(self, chunks):
+    """Folds the results of one iteration, chunk by chunk, into the accumulators.
+
+    Args:
+        chunks (iterable): The results of the iteration, as tuples of
+          arguments of `fold`
+    """
+    for chunk in chunks:
+      self.fold(*chunk)
+
+    self.iterations += 1
+
+  def fold(self, descriptions: list, similarities: np.ndarray):
+    """Folds the similarities of a chunk of combinations into the accumulators.
+
+    Args:
+        descriptions (list): The (unique) description of each combination
+        similarities (np.ndarray): The similarity of each combination
+    """
+    rows = self.rows(descriptions)
+    similarities = np.asarray(similarities, dtype = np.float64)
+
+    self.count[rows] += 1
+
+    delta = similarities - self.mean[rows]
+    self.mean[rows] += delta / self.count[rows]
+    self.m2[rows] += delta * (similarities - self.mean[rows])
+
+  def merge(self, other: 'Summary'):
+    """Merges the accumulators of another summary into this one (Chan et al.).
+
+    Merging the same partial summaries in the same order always gives the
+    same result, regardless of where they were computed.
+    """
+    size = len(other.descriptions)
+    rows = self.rows(other.descriptions)
+
+    count_a = self.count[rows]
+    count_b = other.count[:size]
+    count = count_a + count_b
+
+    delta = other.mean[:size] - self.mean[rows]
+    ratio = np.divide(count_b, count, out = np.zeros(size), where = count > 0)
+
+    self.mean[rows] += delta * ratio
+    self.m2[rows] += other.m2[:size] + delta * delta * count_a * ratio
+    self.count[rows] = count
+
+    self.iterations += other.iterations
+
+    if other.length is not None:
+      self.length = other.length
+
+  def stdev(self, rows: np.ndarray) -> np.ndarray:
+    count = self.count[rows]
+    return np.sqrt(np.divide(self.m2[rows], count - 1, out = np.zeros(len(rows)), where = count > 1))
+
+  def prune(self, low: float, high: float, z: float) -> list:
+    """Prunes the combinations whose confidence interval for the mean
+    (mean +- z standard errors) sits inside the band [low, high].
+
+    Returns:
+        list: The descriptions of the newly pruned combinations
+    """
+    size = len(self.descriptions)
+    rows = np.flatnonzero((self.pruned[:size] == 0) & (self.count[:size] > 1))
+
+    mean = self.mean[rows]
+    error = z * self.stdev(rows) / np.sqrt(self.count[rows])
+
+    rows = rows[(mean - error >= low) & (mean + error <= high)]
+    self.pruned[rows] = self.iterations
+
+    return [self.descriptions[i] for i in rows]
+
+  def to_frame(self, top: int = None) -> DataFrame:
+    """Returns the mean and stdev of the combinations present in every iteration.
+
+    Args:
+        top (int, optional): Only return the best `top` combinations (by mean,
+          stdev and description, descending), in order
+
+    Returns:
+        DataFrame: The combination, mean and stdev of each combination
+    """
+    size = len(self.descriptions)
+
+    # Only combinations evaluated in every iteration (until pruned) are kept
+    keep = np.flatnonzero((self.count[:size] == self.iterations) | (self.pruned[:size] > 0))
+
+    mean = self.mean[keep]
+    stdev = self.stdev(keep)
+
+    if top is not None:
+      rows = top_k(top, mean, key = lambda i: (mean[i], stdev[i], self.descriptions[keep[i]]))
+
+      keep = keep[rows]
+      mean = mean[rows]
+      stdev = stdev[rows]
+
+    columns = ['combination', 'mean', 'stdev']
+    data = {
+      'combination': [self.descriptions[i] for i in keep],
+      'mean': mean,
+      'stdev': stdev
+    }
+
+    if self.pruning:
+      columns.append('pruned')
+      data['pruned'] = self.pruned[keep]
+
+    return DataFrame(data, columns=columns)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import numpy as np
+from util.logger import Logger, LogLevel
+
+from base.channel import Channel
+from base.message import Message
+
+
+class AsyncChannel(Channel):
+  """Channel delivering messages on an asyncio event loop, after a per-hop latency.
+
+  `send` returns at once and the message is delivered later, so the reply
+  of a participant is no longer sent from within the previous `send`, and
+  the sessions of many channels interleave on the same loop. Readers, tags
+  and taps are the same as with a `Channel`.
+  """
+
+  def __init__(self, id: str, latency: float = 0.0, jitter: float = 0.0, rng: np.random.Generator = None):
+    Channel.__init__(self, id)
+
+    self.latency = latency
+    self.jitter = jitter
+    self.rng = rng if rng is not None else np.random.default_rng()
+
+    # Messages sent but not delivered yet, and the future of `drain`
+    self.in_flight = 0
+    self.idle = None
+
+  def delay(self) -> float:
+    """Returns the latency of a hop (in seconds), plus an exponential jitter.
+    """
+    if self.jitter > 0:
+      return self.latency + self.rng.exponential(self.jitter)
+
+    return self.latency
+
+  def send(self, message: Message):
+    self.log(
+      lambda: f'Message (kind: {message.kind}, label: {message.label}, size: {message.size()} bits)'
+    )
+
+    self.in_flight += 1
+    asyncio.get_running_loop().call_later(self.delay(), self.deliver, message)
+
+  def deliver(self, message: Message):
+    try:
+      Channel.deliver(self, message)
+    finally:
+      # A failing handler still delivers the message, so `drain` does not wait forever
+      self.in_flight -= 1
+
+      if self.in_flight == 0 and self.idle is not None and not self.idle.done():
+        self.idle.set_result(None)
+
+  async def drain(self):
+    """Waits until every message sent (and those sent in reply) is delivered.
+    """
+    if self.in_flight == 0:
+      return
+
+    self.idle = asyncio.get_running_loop().create_future()
+    await self.idle
+
+class ConcurrentSessions(Logger):
+  """Runs many sessions of a protocol concurrently on one event loop.
+
+  Every session has its own participants and `AsyncChannel`, with up to
+  `concurrency` sessions in flight at once. Taps listen to the channels of
+  all of them.
+  """
+
+  def __init__(self, protocol_class: type, sessions: int, concurrency: int, latency: float = 0.0, jitter: float = 0.0, rng: np.random.Generator = None, taps: list = None):
+    Logger.__init__(self, LogLevel.PROTOCOL, 'Sessions', protocol_class.__name__)
+
+    self.protocol_class = protocol_class
+    self.sessions = sessions
+    self.concurrency = concurrency
+    self.latency = latency
+    self.jitter = jitter
+    self.rng = rng if rng is not None else np.random.default_rng()
+    self.taps = list(taps) if taps is not None else []
+
+    self.failed = 0
+
+  async def run_session(self, session: int, slots: asyncio.Semaphore) -> float:
+    async with slots:
+      channel = AsyncChannel(str(session), self.latency, self.jitter, self.rng)
+      for tap in self.taps:
+        channel.listen(tap)
+
+      protocol = self.protocol_class(channel)
+
+      start = time.perf_counter()
+      protocol.run()
+      await channel.drain()
+      duration = time.perf_counter() - start
+
+      if not protocol.verify():
+        self.failed += 1
+
+      return duration
+
+  async def run_all(self) -> list:
+    slots = asyncio.Semaphore(self.concurrency)
+    return await asyncio.gather(*(self.run_session(session, slots) for session in range(self.sessions)))
+
+  def run(self) -> dict:
+    """Runs the sessions and returns the throughput (sessions per second) and
+    the percentiles of the duration of a session (in seconds).
+    """
+    start = time.perf_counter()
+    durations = np.array(asyncio.run(self.run_all()))
+    elapsed = time.perf_counter() - start
+
+    stats = {
+      'sessions': self.sessions,
+      'failed': self.failed,
+      'throughput': self.sessions / elapsed,
+      'p50': float(np.percentile(durations, 50)),
+      'p90': float(np.percentile(durations, 90)),
+      'p99': float(np.percentile(durations, 99)),
+      'max': float(durations.max())
+    }
+
+    self.log('Ran {} sessions ({} failed) in {:.2f} s', self.sessions, self.failed, elapsed)
+    return stats
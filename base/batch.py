@@ -0,0 +1,64 @@
+import numpy as np
+from util.bitvector import NumpyVector
+
+from base.message import Message, MessageKind
+
+
+class BatchMessage(object):
+  """A message of every session in a batch.
+
+  Each of the contents is a vector with one row per session, for one of the
+  values the message is made of.
+  """
+
+  def __init__(self, label: str, kind: MessageKind, contents: list, length: int):
+    self.label = label
+    self.kind = kind
+    self.contents = contents
+    self.length = length
+
+  def message(self, session: int) -> Message:
+    # Parts are views of the rows of the session, not copies
+    return Message(
+      label = self.label,
+      kind  = self.kind,
+      parts = [content.row(session) for content in self.contents]
+    )
+
+class Batch(object):
+  """The result of simulating N independent sessions of a protocol at once.
+
+  `variables` maps the name of every protocol variable (as found in the tag
+  before the session) to a `NumpyVector` with one (packed) row per session,
+  and `messages` holds the transcript in the order the messages were sent
+  over the channel.
+
+  Every message is sent by a participant while it handles the previous one,
+  so a tap of the channel (listening after the participants) intercepts them
+  last to first, and that is the order of the transcript of a session.
+  """
+
+  def __init__(self, size: int, length: int):
+    self.size = size
+    self.length = length
+    self.variables = {}
+    self.messages = []
+
+  def send(self, label: str, kind: MessageKind, *contents: NumpyVector):
+    length = len(contents) * self.length
+
+    if len(contents) == 0:
+      contents = (NumpyVector(np.zeros((self.size, 0), dtype = np.uint8), 0),)
+
+    self.messages.append(BatchMessage(label, kind, list(contents), length))
+
+  def transcript(self, session: int) -> list:
+    """Returns the messages of a single session, in the order a tap of the channel intercepts them.
+    """
+    return [message.message(session) for message in reversed(self.messages)]
+
+  def variable(self, name: str, session: int) -> NumpyVector:
+    if name not in self.variables:
+      return None
+
+    return self.variables[name].row(session)
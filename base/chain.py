@@ -0,0 +1,157 @@
+import json
+
+from util.bitvector import vector
+from util.logger import Logger, LogLevel
+
+from base.batch import Batch
+from base.listener import Listener
+from base.protocol import Protocol
+
+
+class ChainObserver(object):
+  """Hooks called while a chain of sessions runs.
+  """
+
+  def on_sessions(self, first: int, batch: Batch):
+    """Called with every block of consecutive sessions, starting at session `first` (from 0).
+    """
+    pass
+
+  def on_checkpoint(self, session: int, secrets: dict):
+    """Called with the secrets of the reader and the tag before session `session`.
+    """
+    pass
+
+class TranscriptObserver(ChainObserver):
+  """Hands the messages of every chained session to a listener, in the order a tap of the channel would get them.
+  """
+
+  def __init__(self, listener: Listener):
+    self.listener = listener
+
+  def on_sessions(self, first: int, batch: Batch):
+    for session in range(batch.size):
+      for message in batch.transcript(session):
+        self.listener.receive(message)
+
+class CheckpointWriter(ChainObserver):
+  """Appends every checkpoint to a file, as a JSON line with the session and
+  the secrets (as hexadecimal strings), so the chain can be resumed from it
+  (see `Chain.resume`). A chain resumed from the same file keeps appending to it.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+
+  def on_checkpoint(self, session: int, secrets: dict):
+    line = {
+      'session': session,
+      'secrets': {name: [f'{value.to_int():x}', len(value)] for name, value in secrets.items()}
+    }
+
+    # Every checkpoint is written as soon as it is taken
+    with open(self.path, 'a') as f:
+      f.write(json.dumps(line) + '\n')
+
+def load_checkpoint(path: str) -> tuple:
+  """Returns the session and the secrets of the last checkpoint written to a file.
+  """
+  with open(path) as f:
+    lines = [line for line in f if line.strip()]
+
+  if len(lines) == 0:
+    raise ValueError(f'{path} has no checkpoints')
+
+  line = json.loads(lines[-1])
+  secrets = {name: vector(int(value, 16), length) for name, (value, length) in line['secrets'].items()}
+
+  return line['session'], secrets
+
+class Chain(Logger):
+  """Consecutive sessions of the reader and the tag of a protocol, whose
+  secrets evolve from one session to the next.
+
+  Sessions are simulated in blocks (see `Protocol.run_chain`), which are
+  handed to the observers. Every `checkpoint` sessions, the secrets are kept
+  in `checkpoints` and handed to the observers, so the chain can be resumed
+  from them (`resume`). Blocks should end at every checkpoint (as in `run`),
+  or the secrets after the block that goes past one are kept instead.
+  """
+
+  # Sessions simulated at once
+  BLOCK_SIZE = 1024
+
+  def __init__(self, protocol: Protocol, rng = None, block_size: int = 0, checkpoint: int = 0, observers: list = None):
+    Logger.__init__(self, LogLevel.PROTOCOL, 'Chain', protocol.id)
+
+    self.protocol = protocol
+    self.rng = rng
+    self.block_size = block_size if block_size > 0 else Chain.BLOCK_SIZE
+    self.checkpoint = checkpoint
+    self.observers = list(observers) if observers is not None else []
+
+    # Sessions run so far, and (session, secrets) of every checkpoint
+    self.session = 0
+    self.checkpoints = []
+
+  def observe(self, observer: ChainObserver):
+    self.observers.append(observer)
+
+  def resume(self, path: str):
+    """Continues the chain from the last checkpoint written to a file (see `CheckpointWriter`).
+    """
+    self.session, secrets = load_checkpoint(path)
+    self.protocol.restore(secrets)
+
+    self.log('Resumed at session {}', self.session)
+
+  def blocks(self, n: int) -> list:
+    """Returns the sizes of the blocks of the next n sessions, ending at every checkpoint.
+    """
+    sizes = []
+    session = self.session
+    end = self.session + n
+
+    while session < end:
+      size = min(self.block_size, end - session)
+
+      if self.checkpoint > 0:
+        size = min(size, self.checkpoint - session % self.checkpoint)
+
+      sizes.append(size)
+      session += size
+
+    return sizes
+
+  def save(self):
+    secrets = self.protocol.secrets()
+    self.checkpoints.append((self.session, secrets))
+
+    for observer in self.observers:
+      observer.on_checkpoint(self.session, secrets)
+
+    self.log('Checkpoint at session {}', self.session)
+
+  def next(self, n: int) -> Batch:
+    """Runs the next n sessions (at once) and returns them.
+    """
+    first = self.session
+    batch = self.protocol.run_chain(n, self.rng)
+    self.session += n
+
+    for observer in self.observers:
+      observer.on_sessions(first, batch)
+
+    # Whether the block reached (or went past) a checkpoint
+    if self.checkpoint > 0 and first // self.checkpoint != self.session // self.checkpoint:
+      self.save()
+
+    return batch
+
+  def run(self, n: int):
+    """Runs n sessions, in blocks that end at every checkpoint.
+    """
+    for size in self.blocks(n):
+      self.next(size)
+
+    self.log('Ran {} sessions', self.session)
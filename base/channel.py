@@ -5,22 +5,53 @@ from base.message import Message
 
 
 class Channel(Logger):
+  """Delivers messages to the listeners registered for them.
+
+  Messages are routed through a table from (kind, label) to the handlers
+  of every listener, built when listeners are added. Listeners without
+  routes (e.g. attacks) are taps, and get every message.
+  """
+
   def __init__(self, id: str):
     Logger.__init__(self, LogLevel.CHANNEL, 'Channel', id)
 
     self.id = id
     self.listeners = []
 
+    self.taps = ()
+    self.table = {}
+
     self.log('Created')
 
   def listen(self, listener: Listener):
+    if not isinstance(listener, Listener):
+      return
+
     self.listeners.append(listener)
+    self.build_table()
+
+  def build_table(self):
+    routes = [listener.routes() for listener in self.listeners]
+    keys = {key for route in routes for key in route}
+
+    # Handlers are called in the order their listeners were added
+    self.taps = tuple(listener.receive for listener, route in zip(self.listeners, routes) if len(route) == 0)
+    self.table = {
+      key: tuple(
+        route[key] if len(route) > 0 else listener.receive
+        for listener, route in zip(self.listeners, routes)
+        if len(route) == 0 or key in route
+      )
+      for key in keys
+    }
 
   def send(self, message: Message):
     self.log(
-      f'Message (kind: {message.kind}, label: {message.label}, size: {message.size()} bits)'
+      lambda: f'Message (kind: {message.kind}, label: {message.label}, size: {message.size()} bits)'
     )
 
-    for listener in self.listeners:
-      if isinstance(listener, Listener):
-        listener.receive(message)
+    self.deliver(message)
+
+  def deliver(self, message: Message):
+    for handler in self.table.get((message.kind, message.label), self.taps):
+      handler(message)
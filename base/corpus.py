@@ -0,0 +1,148 @@
+import json
+import os
+
+import numpy as np
+from util.bitvector import NumpyVector
+from util.logger import Logger, LogLevel
+from util.rng import stream_generator
+
+from base.batch import Batch, BatchMessage
+from base.message import MessageKind
+from base.protocol import Protocol
+
+
+class Corpus(Logger):
+  """Sessions of a protocol recorded to a file, read through a memory map.
+
+  The file holds a JSON header with the layout of a session, followed by one
+  row of bytes per session with the (packed) variables of the tag and the
+  contents of every message. Batches read from the corpus are views of the
+  rows, so sessions are only read from disk as they are used.
+
+  Sessions are simulated in blocks of `block_size`, each one seeded as the
+  blocks of an attack, so attacking a corpus gives the same results as
+  attacking with the same seed and `block_size` as the batch size.
+  """
+
+  MAGIC = b'RFIDCORP'
+  ALIGNMENT = 64
+
+  def __init__(self, path: str):
+    Logger.__init__(self, LogLevel.ATTACK, 'Corpus', os.path.basename(path))
+
+    self.load(path)
+    self.log('Opened {} sessions of {}', self.size, self.protocol)
+
+  def load(self, path: str):
+    self.path = path
+
+    with open(path, 'rb') as f:
+      if f.read(len(Corpus.MAGIC)) != Corpus.MAGIC:
+        self.error(f'{path} is not a corpus file', exception = ValueError(path))
+
+      header_size = int.from_bytes(f.read(4), 'little')
+      self.header = json.loads(f.read(header_size).decode())
+
+    self.protocol = self.header['protocol']
+    self.size = self.header['size']
+    self.length = self.header['length']
+    self.seed = self.header['seed']
+    self.block_size = self.header['block_size']
+
+    self.rows = np.memmap(path,
+      dtype  = np.uint8,
+      mode   = 'r',
+      offset = self.header['offset'],
+      shape  = (self.size, self.header['row_bytes'])
+    )
+
+  def __getstate__(self) -> dict:
+    # Worker processes map the file again instead of getting a copy of it
+    return {'path': self.path}
+
+  def __setstate__(self, state: dict):
+    Logger.__init__(self, LogLevel.ATTACK, 'Corpus', os.path.basename(state['path']))
+    self.load(state['path'])
+
+  def batch(self, first: int, count: int) -> Batch:
+    """Returns the sessions from `first` (starting at 0) as a batch, whose rows are views of the file.
+    """
+    rows = self.rows[first:first + count]
+
+    def vector(column: dict) -> NumpyVector:
+      return NumpyVector(rows[:, column['offset']:column['offset'] + column['bytes']], column['bits'])
+
+    batch = Batch(len(rows), self.length)
+    batch.variables = {name: vector(column) for name, column in self.header['variables'].items()}
+    batch.messages = [
+      BatchMessage(message['label'], MessageKind[message['kind']], [vector(column) for column in message['contents']], message['length'])
+      for message in self.header['messages']
+    ]
+
+    return batch
+
+  @staticmethod
+  def layout(batch: Batch) -> tuple:
+    """Returns the columns of the variables and messages of a batch within a row, and the bytes of a row.
+    """
+    offset = 0
+
+    def column(content: NumpyVector) -> dict:
+      nonlocal offset
+
+      column = {'offset': offset, 'bytes': content.bits.shape[-1], 'bits': len(content)}
+      offset += column['bytes']
+      return column
+
+    variables = {name: column(variable) for name, variable in batch.variables.items()}
+    messages = [
+      {'label': message.label, 'kind': message.kind.name, 'length': message.length, 'contents': [column(content) for content in message.contents]}
+      for message in batch.messages
+    ]
+
+    return variables, messages, offset
+
+  @staticmethod
+  def rows_of(batch: Batch) -> np.ndarray:
+    contents = list(batch.variables.values()) + [content for message in batch.messages for content in message.contents]
+    return np.concatenate([content.bits for content in contents], axis = 1)
+
+  @staticmethod
+  def record(path: str, protocol: Protocol, n: int, seed: int, block_size: int = 1024) -> 'Corpus':
+    """Simulates n sessions of a protocol in batches and writes them to a corpus file.
+    """
+    logger = Logger(LogLevel.ATTACK, 'Corpus', os.path.basename(path))
+
+    with open(path, 'wb') as f:
+      for first in range(0, n, block_size):
+        # Sessions are seeded as the blocks of an attack (whose iterations start at 1)
+        count = min(block_size, n - first)
+        batch = protocol.run_batch(count, stream_generator(seed, first + 1))
+
+        if first == 0:
+          variables, messages, row_bytes = Corpus.layout(batch)
+          header = {
+            'protocol': protocol.id,
+            'size': n,
+            'length': batch.length,
+            'seed': seed,
+            'block_size': block_size,
+            'row_bytes': row_bytes,
+            'variables': variables,
+            'messages': messages
+          }
+
+          # Rows start at an aligned offset, after the header
+          start = len(Corpus.MAGIC) + 4
+          size = len(json.dumps(header).encode())
+          header['offset'] = -(-(start + size + 32) // Corpus.ALIGNMENT) * Corpus.ALIGNMENT
+          data = json.dumps(header).encode().ljust(header['offset'] - start)
+
+          f.write(Corpus.MAGIC)
+          f.write(len(data).to_bytes(4, 'little'))
+          f.write(data)
+
+        f.write(np.ascontiguousarray(Corpus.rows_of(batch)).tobytes())
+        logger.log('Recorded {} of {} sessions', first + batch.size, n)
+
+    return Corpus(path)
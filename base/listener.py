@@ -4,5 +4,11 @@ from base.message import Message
 
 
 class Listener(ABC):
+  def routes(self) -> dict:
+    """Returns the handler of each (kind, label) of the messages this listener
+    handles. Listeners without routes receive every message through `receive`.
+    """
+    return {}
+
   def receive(self, message: Message):
     pass
@@ -1,6 +1,6 @@
 from enum import Enum
 
-from bitarray import bitarray
+from util.bitvector import BitVector
 
 
 class MessageKind(Enum):
@@ -16,10 +16,51 @@ class MessageKind(Enum):
       return ''
 
 class Message(object):
-  def __init__(self, label: str, kind: MessageKind, content: bitarray):
+  """A message sent over the channel.
+
+  A message references the values it is made of (e.g. A, B and C for
+  A || B || C) instead of owning a concatenated copy, so they can be read
+  back without slicing. Values are bit vectors, which may be views of a
+  larger buffer, such as the rows of a batch.
+  """
+
+  __slots__ = ('label', 'kind', 'parts')
+
+  def __init__(self, label: str, kind: MessageKind, content: BitVector = None, parts: list = None):
     self.label = label
     self.kind = kind
-    self.content = content
+    self.parts = tuple(parts) if parts is not None else (content,)
+
+  @property
+  def content(self) -> BitVector:
+    """The whole content of the message, concatenating its parts if needed.
+    """
+    content = self.parts[0]
+    for part in self.parts[1:]:
+      content = content + part
+
+    return content
 
   def size(self) -> int:
-    return self.content.length()
+    return sum(len(part) for part in self.parts)
+
+  def split(self, length: int) -> list:
+    """Splits the content of the message in values of the given length.
+
+    Parts that already have that length are returned as they are.
+
+    Args:
+        length (int): The length in bits of each value
+
+    Returns:
+        list: The values, as bit vectors of the same backend as the parts
+    """
+    values = []
+
+    for part in self.parts:
+      if len(part) == length:
+        values.append(part)
+      else:
+        values.extend(part[i:i + length] for i in range(0, len(part), length))
+
+    return values
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from enum import Enum
 
-from bitarray import bitarray
+from util.bitvector import BitVector
+
 
 class OperatorKind(Enum):
   AND = '&'
@@ -33,7 +34,7 @@ class Operator(ABC):
     raise NotImplementedError
 
   @abstractmethod
-  def apply(self, left: bitarray, right: bitarray) -> bitarray:
+  def apply(self, left: BitVector, right: BitVector) -> BitVector:
     raise NotImplementedError
 
   @property
@@ -49,7 +50,7 @@ class AndOperator(Operator):
   def __init__(self):
     self._kind = OperatorKind.AND
 
-  def apply(self, left: bitarray, right: bitarray) -> bitarray:
+  def apply(self, left: BitVector, right: BitVector) -> BitVector:
     return (left & right)
 
 class OrOperator(Operator):
@@ -57,7 +58,7 @@ class OrOperator(Operator):
   def __init__(self):
     self._kind = OperatorKind.OR
 
-  def apply(self, left: bitarray, right: bitarray) -> bitarray:
+  def apply(self, left: BitVector, right: BitVector) -> BitVector:
     return (left | right)
 
 class XorOperator(Operator):
@@ -65,5 +66,5 @@ class XorOperator(Operator):
   def __init__(self):
     self._kind = OperatorKind.XOR
 
-  def apply(self, left: bitarray, right: bitarray) -> bitarray:
+  def apply(self, left: BitVector, right: BitVector) -> BitVector:
     return (left ^ right)
@@ -0,0 +1,217 @@
+import time
+
+import numpy as np
+from util.bits import pack_ints, unpack_ints
+from util.bitvector import vector
+from util.logger import Logger, LogLevel
+from util.rng import random_rows
+
+from base.channel import Channel
+from base.message import Message
+from base.protocol import Protocol
+
+
+class BackEnd(object):
+  """The secrets of every tag known to a reader, indexed by pseudonym.
+
+  Secrets are kept packed, in a (tags, secrets, bytes) table, and a hash
+  index maps the pseudonym (e.g. IDS) of every tag to its row, so tags are
+  identified in constant time whatever the size of the population.
+
+  Until a session is confirmed, the secrets the tag may have moved to are
+  kept aside and both pseudonyms are indexed, so the tag is found whether it
+  updated or not (recovering from desynchronization).
+  """
+
+  def __init__(self, table: np.ndarray, length: int, names: tuple, pseudonym: str):
+    self.table = table
+    self.length = length
+    self.names = names
+    self.pseudonym = names.index(pseudonym)
+
+    # Secrets not confirmed yet, by tag
+    self.pending = {}
+    self.recovered = 0
+
+    self.index = dict(zip(unpack_ints(table[:, self.pseudonym], length), range(len(table))))
+
+  def secrets(self, tag: int) -> tuple:
+    return tuple(unpack_ints(self.table[tag], self.length))
+
+  def store(self, tag: int, secrets: tuple):
+    self.table[tag] = pack_ints(secrets, self.length)
+
+  def identify(self, pseudonym: int) -> tuple:
+    """Finds the tag using a pseudonym.
+
+    Returns:
+        tuple: The tag and the secrets the pseudonym belongs to, or (None, None)
+    """
+    tag = self.index.get(pseudonym)
+    if tag is None:
+      return None, None
+
+    pending = self.pending.pop(tag, None)
+
+    if pending is not None:
+      current = self.secrets(tag)
+
+      # Keep the secrets the tag is using, and forget the others
+      if pending[self.pseudonym] == pseudonym:
+        del self.index[current[self.pseudonym]]
+        self.store(tag, pending)
+        self.recovered += 1
+
+        return tag, pending
+      else:
+        del self.index[pending[self.pseudonym]]
+
+        return tag, current
+
+    return tag, self.secrets(tag)
+
+  def propose(self, tag: int, secrets: tuple):
+    """Keeps the secrets a tag moves to in a session that was not confirmed.
+    """
+    self.pending[tag] = secrets
+    self.index[secrets[self.pseudonym]] = tag
+
+  def commit(self, tag: int, secrets: tuple):
+    """Replaces the secrets of a tag, once the session is confirmed.
+    """
+    del self.index[self.table_pseudonym(tag)]
+
+    self.store(tag, secrets)
+    self.index[secrets[self.pseudonym]] = tag
+
+  def table_pseudonym(self, tag: int) -> int:
+    return unpack_ints(self.table[tag, self.pseudonym:self.pseudonym + 1], self.length)[0]
+
+  def linear_search(self, pseudonym: int) -> int:
+    """Finds a tag by comparing the pseudonyms of the whole table (for reference).
+    """
+    key = pack_ints([pseudonym], self.length)[0]
+    rows = np.flatnonzero((self.table[:, self.pseudonym] == key).all(axis = -1))
+
+    return int(rows[0]) if len(rows) > 0 else None
+
+class LossyChannel(Channel):
+  """A channel that loses the next message with a given label.
+  """
+
+  def __init__(self, id: str):
+    Channel.__init__(self, id)
+
+    self.lose = None
+
+  def deliver(self, message: Message):
+    if message.label == self.lose:
+      self.lose = None
+      self.log('Lost {} message', message.label)
+      return
+
+    Channel.deliver(self, message)
+
+class Population(Logger):
+  """A reader serving a population of tags of a protocol.
+
+  Every session, a random tag sends its pseudonym, the reader identifies it
+  through its back-end and both update their secrets. Sessions run on a
+  copy of the protocol, whose tag takes the secrets of the selected tag,
+  over a channel that loses the last message of a session with probability
+  `loss`. The tag then updates but the reader does not confirm it, and has
+  to recover in the next session.
+  """
+
+  # Lookups timed with a linear search, for reference
+  LINEAR_LOOKUPS = 16
+
+  def __init__(self, protocol: Protocol, size: int, rng: np.random.Generator = None, loss: float = 0.0):
+    Logger.__init__(self, LogLevel.PROTOCOL, 'Population', protocol.id)
+
+    self.size = size
+    self.rng = rng if rng is not None else np.random.default_rng()
+    self.loss = loss
+
+    self.channel = LossyChannel(protocol.id)
+    self.protocol = type(protocol)(self.channel)
+
+    self.names = protocol.SECRETS
+    self.length = len(getattr(protocol.tag, self.names[0]))
+
+    # Secrets of the tags, and the copy of the reader
+    bits = random_rows(size * len(self.names), self.length, self.rng).bits
+    self.tags = bits.reshape(size, len(self.names), -1)
+    self.backend = BackEnd(self.tags.copy(), self.length, self.names, protocol.PSEUDONYM)
+    self.protocol.reader.backend = self.backend
+
+    # The last message of a session, which confirms it to the reader
+    self.last = list(self.protocol.reader.HANDLERS)[-1]
+
+    self.log('Created {} tags', size)
+
+  def run(self, n: int) -> float:
+    """Runs n sessions of random tags.
+
+    Returns:
+        float: The mean duration of a session, in seconds
+    """
+    tags = self.rng.integers(0, self.size, n)
+    lost = self.rng.random(n) < self.loss
+
+    reader = self.protocol.reader
+    tag = self.protocol.tag
+    elapsed = 0.0
+
+    for index, lose in zip(tags.tolist(), lost.tolist()):
+      for name, value in zip(self.names, unpack_ints(self.tags[index], self.length)):
+        setattr(tag, name, vector(value, self.length))
+
+      self.channel.lose = self.last if lose else None
+
+      start = time.perf_counter()
+      self.protocol.run()
+      elapsed += time.perf_counter() - start
+
+      if reader.identified != index:
+        self.error('Tag {} was not identified', index)
+        continue
+
+      self.tags[index] = pack_ints([getattr(tag, name).to_int() for name in self.names], self.length)
+
+      # The reader keeps aside the secrets the tag moved to, without confirming them
+      if lose:
+        known = tuple(getattr(reader, name).to_int() for name in self.names)
+        self.backend.propose(index, self.protocol.next_secrets(known, reader.n1.to_int(), reader.n2.to_int()))
+
+    latency = elapsed / max(n, 1)
+    self.log('Ran {} sessions in {:.2f} us on average, {} after desynchronization', n, latency * 1e6, self.backend.recovered)
+
+    return latency
+
+  def linear_latency(self) -> float:
+    """Returns the mean time to identify a tag with a linear search, in seconds.
+    """
+    tags = self.rng.integers(0, self.size, Population.LINEAR_LOOKUPS).tolist()
+    pseudonyms = [unpack_ints(self.tags[tag, self.backend.pseudonym:self.backend.pseudonym + 1], self.length)[0] for tag in tags]
+
+    start = time.perf_counter()
+    for pseudonym in pseudonyms:
+      self.backend.linear_search(pseudonym)
+
+    return (time.perf_counter() - start) / len(pseudonyms)
+
+  def verify(self) -> bool:
+    """Checks that the reader identifies every tag, with the secrets it is using.
+    """
+    synchronized = (self.tags == self.backend.table).all(axis = (1, 2))
+
+    for tag in np.flatnonzero(~synchronized).tolist():
+      pending = self.backend.pending.get(tag)
+
+      if pending is None or pending != tuple(unpack_ints(self.tags[tag], self.length)):
+        self.error('Tag {} is desynchronized', tag)
+        return False
+
+    self.success('Verification successful')
+    return True
@@ -1,20 +1,76 @@
 from util.logger import Logger, LogLevel
 
+from base.batch import Batch
 from base.channel import Channel
 
 
 class Protocol(Logger):
 
-  def __init__(self, id: str):
+  # Names of the secrets shared by the reader and the tag, which evolve from one session to the next
+  SECRETS = ()
+
+  # Secret the tag identifies itself with
+  PSEUDONYM = None
+
+  def __init__(self, id: str, channel: Channel = None):
     Logger.__init__(self, LogLevel.PROTOCOL, 'Protocol', id)
 
     self.id = id
-    self.channel = Channel(id)
+    self.channel = channel if channel is not None else Channel(id)
 
     self.log('Created')
 
+  def reset(self):
+    """Prepares a new session with fresh secrets, reusing the channel, the
+    participants and everything listening to the channel.
+    """
+    self.log('Reset')
+
   def run(self):
     self.log('Started')
 
   def verify(self) -> bool:
     return False
+
+  def run_batch(self, n: int, rng = None) -> Batch:
+    """Simulates n independent sessions at once.
+
+    Args:
+        n (int): Number of sessions
+        rng (np.random.Generator, optional): Source for secrets and nonces
+
+    Returns:
+        Batch: The transcripts and variables of every session
+    """
+    raise NotImplementedError
+
+  def run_chain(self, n: int, rng = None) -> Batch:
+    """Simulates n consecutive sessions of the reader and the tag, from their
+    current secrets, and leaves them with the secrets after the last one.
+
+    Args:
+        n (int): Number of sessions
+        rng (np.random.Generator, optional): Source for nonces
+
+    Returns:
+        Batch: The transcripts and variables of every session
+    """
+    raise NotImplementedError
+
+  @staticmethod
+  def next_secrets(secrets: tuple, n1: int, n2: int) -> tuple:
+    """Returns the secrets after a session with the given nonces, as integers in the order of SECRETS.
+    """
+    raise NotImplementedError
+
+  def secrets(self) -> dict:
+    """Returns the current secrets of the tag.
+    """
+    return {name: getattr(self.tag, name) for name in self.SECRETS}
+
+  def restore(self, secrets: dict):
+    """Sets the secrets of the reader and the tag (e.g. from a checkpoint).
+    """
+    for name, value in secrets.items():
+      setattr(self.reader, name, value)
+      setattr(self.tag, name, value)
@@ -1,25 +1,65 @@
+from util.bitvector import BitVector, vector
 from util.logger import Logger, LogLevel
 
 from base.channel import Channel
 from base.listener import Listener
-from base.message import Message, MessageKind
+from base.message import MessageKind
 
 
 class Reader(Listener, Logger):
 
+  # Handler (name of the method) of each label of the messages from tags
+  HANDLERS = {}
+
   def __init__(self, id: str, channel: Channel):
     Logger.__init__(self, LogLevel.READER, 'Reader', id)
 
     self.id = id
     self.channel = channel
 
+    # Secrets of the tags the reader serves (see `base.population.BackEnd`), if more than one
+    self.backend = None
+    self.identified = None
+
     self.log('Created')
 
   def start(self):
     pass
 
-  def receive(self, message: Message):
-    if message.kind != MessageKind.TAG_TO_READER:
+  def reset(self):
+    """Clears the state of the participant, before a new session.
+    """
+    pass
+
+  def identify(self, pseudonym: BitVector) -> bool:
+    """Finds the tag that sent a pseudonym in the back-end, and takes its secrets.
+    Without a back-end, the reader already shares the secrets of its only tag.
+
+    Returns:
+        bool: Whether the tag is known
+    """
+    if self.backend is None:
+      return True
+
+    self.identified, secrets = self.backend.identify(pseudonym.to_int())
+
+    if self.identified is None:
+      self.error('Unknown tag')
+      return False
+
+    for name, value in zip(self.backend.names, secrets):
+      setattr(self, name, vector(value, self.backend.length))
+
+    self.log('Identified tag {}', self.identified)
+    return True
+
+  def confirm(self):
+    """Stores the secrets of the identified tag in the back-end, once the session is over.
+    """
+    if self.backend is None:
       return
 
-    self.log(f'Received message with label "{message.label}"')
+    self.backend.commit(self.identified, tuple(getattr(self, name).to_int() for name in self.backend.names))
+
+  def routes(self) -> dict:
+    return {(MessageKind.TAG_TO_READER, label): getattr(self, handler) for label, handler in self.HANDLERS.items()}
@@ -2,11 +2,14 @@ from util.logger import Logger, LogLevel
 
 from base.channel import Channel
 from base.listener import Listener
-from base.message import Message, MessageKind
+from base.message import MessageKind
 
 
 class Tag(Listener, Logger):
 
+  # Handler (name of the method) of each label of the messages from the reader
+  HANDLERS = {}
+
   def __init__(self, id: str, channel: Channel):
     Logger.__init__(self, LogLevel.TAG, 'Tag', id)
 
@@ -18,8 +21,10 @@ class Tag(Listener, Logger):
   def start(self):
     pass
 
-  def receive(self, message: Message):
-    if message.kind != MessageKind.READER_TO_TAG:
-      return
+  def reset(self):
+    """Clears the state of the participant, before a new session.
+    """
+    pass
 
-    self.log(f'Received message with label "{message.label}"')
+  def routes(self) -> dict:
+    return {(MessageKind.READER_TO_TAG, label): getattr(self, handler) for label, handler in self.HANDLERS.items()}
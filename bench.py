@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+import fnmatch
+import gc
+import json
+import math
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+from attacks.bias import BiasAttack
+from attacks.engines import NumpyEngine, PythonEngine
+from attacks.linear import LinearAttack
+from base.population import Population
+from protocols.emap import EMAPProtocol
+from protocols.dp import DPProtocol
+from util.bitvector import BitarrayVector, IntVector, NumpyVector, use_backend
+from util.logger import ForceLogger, Logger, LogLevel
+from util.parse import BitsKind, EngineKind, ProtocolKind, parse_bench_args
+from util.rng import seed_stream, stream_generator
+
+_PROTOCOLS = {
+  ProtocolKind.EMAP: EMAPProtocol,
+  ProtocolKind.DP: DPProtocol
+}
+
+# Target of the attacks on each protocol
+_TARGETS = {
+  ProtocolKind.EMAP: 'ID',
+  ProtocolKind.DP: 'PID'
+}
+
+_ENGINES = {
+  EngineKind.PYTHON: PythonEngine,
+  EngineKind.NUMPY: NumpyEngine
+}
+
+_BITS = {
+  BitsKind.BITARRAY: BitarrayVector,
+  BitsKind.INT: IntVector,
+  BitsKind.NUMPY: NumpyVector
+}
+
+# Every benchmark is seeded, so it does the same work on every run
+SEED = 1
+
+# Sessions simulated by each benchmark of the protocols
+SESSIONS = {'run': 1000, 'batch': 4096, 'chain': 4096}
+
+# Tags of each benchmark of the identification of a population, and pseudonyms looked up
+POPULATION_SIZES = [1000, 10000, 100000, 1000000]
+POPULATION_LOOKUPS = 1000
+
+# Sessions analyzed by each benchmark of `run_analysis`, by maximum number of combinations
+ANALYSIS_SESSIONS = {1: 256, 2: 64, 3: 8, 4: 1}
+
+# Iterations summarized by each benchmark of `summarize_results`, and their combinations
+SUMMARY_ITERATIONS = [16, 128, 1024]
+SUMMARY_COMBINATIONS = 3
+
+# Iterations summarized by each benchmark of the bias attack, and their maximum numbers of combinations
+BIAS_ITERATIONS = 16
+BIAS_COMBINATIONS = [3, 4]
+
+# Shortest time (in seconds) of a sample, running the case as many times as needed
+MIN_TIME = 0.1
+
+# Growth of peak memory (in bytes) ignored when comparing with a baseline
+MEMORY_SLACK = 1 << 16
+
+class Case(object):
+  """A benchmark, whose `setup` returns the function to time.
+
+  The function returns the work it did (e.g. sessions), and the result is
+  the rate of work per second, the higher the better. Cases without a unit
+  of work return None, and the result is the time they take (in seconds),
+  the lower the better.
+  """
+
+  def __init__(self, name: str, setup, unit: str = None):
+    self.name = name
+    self.setup = setup
+    self.unit = unit
+
+  def measure(self, repeat: int) -> dict:
+    """Times `repeat` samples of the case, keeping the best, and runs it once more to trace its peak memory.
+
+    Short cases are run several times per sample, so every sample takes at
+    least `MIN_TIME`. As with `timeit`, garbage collection is disabled while
+    timing.
+    """
+    level = Logger._level
+    Logger.set_level(LogLevel.NONE)
+
+    try:
+      run = self.setup()
+
+      start = time.perf_counter()
+      run()
+      loops = max(1, math.ceil(MIN_TIME / (time.perf_counter() - start)))
+
+      best = math.inf
+      gc.disable()
+
+      for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+          work = run()
+        best = min(best, (time.perf_counter() - start) / loops)
+
+      gc.enable()
+
+      # Memory allocated by the case, on top of its setup
+      gc.collect()
+      tracemalloc.start()
+      run()
+      _, peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+    finally:
+      gc.enable()
+      Logger.set_level(level)
+
+    if self.unit is not None:
+      return {'value': work / best, 'unit': f'{self.unit}/s', 'better': 'higher', 'peak_memory': peak}
+
+    return {'value': best, 'unit': 's', 'better': 'lower', 'peak_memory': peak}
+
+def session_cases(kind: ProtocolKind) -> list:
+  def run_setup():
+    seed_stream(SEED)
+    protocol = _PROTOCOLS[kind]()
+
+    def run() -> int:
+      for _ in range(SESSIONS['run']):
+        protocol.reset()
+        protocol.run()
+
+      return SESSIONS['run']
+
+    return run
+
+  def batch_setup():
+    protocol = _PROTOCOLS[kind]()
+
+    def run() -> int:
+      return protocol.run_batch(SESSIONS['batch'], stream_generator(SEED, 1)).size
+
+    return run
+
+  def chain_setup():
+    seed_stream(SEED)
+    protocol = _PROTOCOLS[kind]()
+    rng = stream_generator(SEED, 1)
+
+    def run() -> int:
+      return protocol.run_chain(SESSIONS['chain'], rng).size
+
+    return run
+
+  return [
+    Case(f'sessions/{kind.name}/run', run_setup, 'sessions'),
+    Case(f'sessions/{kind.name}/batch', batch_setup, 'sessions'),
+    Case(f'sessions/{kind.name}/chain', chain_setup, 'sessions')
+  ]
+
+def population_case(kind: ProtocolKind, size: int) -> Case:
+  def setup():
+    population = Population(_PROTOCOLS[kind](), size, stream_generator(SEED, 1))
+    backend = population.backend
+
+    tags = population.rng.integers(0, size, POPULATION_LOOKUPS).tolist()
+    pseudonyms = [backend.table_pseudonym(tag) for tag in tags]
+
+    def run() -> int:
+      for pseudonym in pseudonyms:
+        backend.identify(pseudonym)
+
+      return len(pseudonyms)
+
+    return run
+
+  return Case(f'population/{kind.name}/n{size}', setup, 'lookups')
+
+def analysis_case(kind: ProtocolKind, engine: EngineKind, max_combinations: int) -> Case:
+  def setup():
+    protocol = _PROTOCOLS[kind]()
+    attack = LinearAttack(protocol, engine = _ENGINES[engine]())
+    batch = protocol.run_batch(ANALYSIS_SESSIONS[max_combinations], stream_generator(SEED, 1))
+
+    def run() -> int:
+      count = 0
+
+      for results in attack.run_batch(_TARGETS[kind], batch, 1, max_combinations):
+        for descriptions, _ in results:
+          count += len(descriptions)
+
+      return count
+
+    return run
+
+  return Case(f'analysis/{kind.name}/{engine.name}/c{max_combinations}', setup, 'combinations')
+
+def summary_case(kind: ProtocolKind, iterations: int) -> Case:
+  def setup():
+    protocol = _PROTOCOLS[kind]()
+    attack = LinearAttack(protocol, engine = NumpyEngine())
+    batch = protocol.run_batch(iterations, stream_generator(SEED, 1))
+
+    summary = attack.create_summary()
+    for results in attack.run_batch(_TARGETS[kind], batch, 1, SUMMARY_COMBINATIONS):
+      summary.add(results)
+    summary.length = attack.length
+
+    def run():
+      attack.summarize_results(summary)
+
+    return run
+
+  return Case(f'summary/{kind.name}/i{iterations}', setup)
+
+def bias_case(kind: ProtocolKind, max_combinations: int) -> Case:
+  def setup():
+    protocol = _PROTOCOLS[kind]()
+    attack = BiasAttack(protocol)
+    batch = protocol.run_batch(BIAS_ITERATIONS, stream_generator(SEED, 1))
+
+    summary = attack.create_summary()
+    for results in attack.run_batch(_TARGETS[kind], batch, 1, max_combinations):
+      summary.add(results)
+
+    def run():
+      attack.summarize_results(summary)
+
+    return run
+
+  return Case(f'bias/{kind.name}/c{max_combinations}', setup)
+
+def all_cases() -> list:
+  cases = []
+
+  for kind in ProtocolKind:
+    cases += session_cases(kind)
+
+    for size in POPULATION_SIZES:
+      cases.append(population_case(kind, size))
+
+    for max_combinations in ANALYSIS_SESSIONS:
+      for engine in EngineKind:
+        cases.append(analysis_case(kind, engine, max_combinations))
+
+    for iterations in SUMMARY_ITERATIONS:
+      cases.append(summary_case(kind, iterations))
+
+    for max_combinations in BIAS_COMBINATIONS:
+      cases.append(bias_case(kind, max_combinations))
+
+  return cases
+
+def compare(results: dict, baseline: dict, threshold: float, logger: Logger) -> list:
+  """Compares the results with a baseline.
+
+  Returns:
+      list: The names of the benchmarks that regressed by more than `threshold`
+  """
+  regressions = []
+
+  for name, result in results.items():
+    base = baseline['results'].get(name)
+
+    if base is None:
+      logger.log(f'{name:<28} not in baseline')
+      continue
+
+    change = result['value'] / base['value'] - 1
+    if result['better'] == 'lower':
+      change = -change
+
+    memory = result['peak_memory'] - base['peak_memory']
+    slower = change < -threshold
+    heavier = memory > max(threshold * base['peak_memory'], MEMORY_SLACK)
+
+    message = f'{name:<28} {change:+7.1%} {result["unit"]}, peak memory {memory / 1024:+.0f} KiB'
+
+    if slower or heavier:
+      regressions.append(name)
+      logger.error(message)
+    elif change > threshold:
+      logger.success(message)
+    else:
+      logger.log(message)
+
+  return regressions
+
+def main():
+  args = parse_bench_args()
+  logger = ForceLogger('Bench', 'main')
+
+  # Set bit vector backend
+  use_backend(_BITS[BitsKind[args.bits]])
+
+  cases = all_cases()
+  if args.filter is not None:
+    cases = [case for case in cases if any(fnmatch.fnmatch(case.name, pattern) for pattern in args.filter)]
+
+  logger.log(f'Running {len(cases)} benchmarks, best of {args.repeat}')
+
+  results = {}
+  for case in cases:
+    result = case.measure(args.repeat)
+    results[case.name] = result
+
+    logger.log(f'{case.name:<28} {result["value"]:12.4g} {result["unit"]:<15} peak memory {result["peak_memory"] / 1024:.0f} KiB')
+
+  report = {
+    'meta': {
+      'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+      'python': platform.python_version(),
+      'numpy': np.__version__,
+      'machine': platform.machine(),
+      'bits': args.bits,
+      'repeat': args.repeat
+    },
+    'results': results
+  }
+
+  if args.output is not None:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent = 2)
+
+    logger.warn(f'Saved results to {args.output}')
+
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+
+    if baseline['meta']['bits'] != args.bits:
+      logger.warn(f'Baseline was run with {baseline["meta"]["bits"]} bit vectors, not {args.bits}')
+
+    regressions = compare(results, baseline, args.threshold, logger)
+
+    if len(regressions) > 0:
+      logger.error(f'{len(regressions)} benchmarks regressed more than {args.threshold:.0%}')
+      exit(1)
+
+    logger.success('No regressions')
+
+  logger.log('Finished running')
+
+if __name__ == '__main__':
+  main()
@@ -1,22 +1,127 @@
+import numpy as np
+from base.batch import Batch
 from base.channel import Channel
 from base.message import Message, MessageKind
 from base.protocol import Protocol
 from base.reader import Reader
 from base.tag import Tag
-from bitarray import bitarray
+from util.bits import pack_ints, unpack_ints
+from util.bitvector import NumpyVector, vector
+from util.rng import random_bits, random_rows
 
 MESSAGE_SIZE = 96
 
 # --------------------
 # Functions
 # --------------------
+def next_secrets(secrets: tuple, n1: int, n2: int) -> tuple:
+  """Returns PID, PID2, K1 and K2 after a session, as integers.
+  """
+  PID, PID2, K1, K2 = secrets
+  return (PID2, PID2 ^ n1 ^ n2, K1, K2)
+
+def simulate_batch(n: int, rng: np.random.Generator = None, **variables) -> Batch:
+  """Simulates n independent DP sessions at once.
+
+  Every variable is a `NumpyVector` with one row per session, so the same
+  expressions as in the simulation apply to all of them. Secrets and nonces
+  that are not given are drawn from `rng`.
+
+  Args:
+      n (int): Number of sessions
+      rng (np.random.Generator, optional): Source for secrets and nonces
+
+  Returns:
+      Batch: The transcripts and variables of every session
+  """
+  def get(name: str) -> NumpyVector:
+    if name in variables:
+      return variables[name]
+
+    return random_rows(n, MESSAGE_SIZE, rng)
+
+  # Tag secrets
+  PID  = get('PID')
+  PID2 = get('PID2')
+  K1   = get('K1')
+  K2   = get('K2')
+
+  # Reader nonces and A, B, D
+  n1 = get('n1')
+  n2 = get('n2')
+
+  A = (PID2 & K1 & K2) ^ n1
+  B = (~PID2 & K2 & K1) ^ n2
+  D = (K1 & n2) ^ (K2 & n1)
+
+  # Tag E, F
+  E = (K1 ^ n1 ^ PID) ^ (K2 & n2)
+  F = (K1 & n1) ^ (K2 & n2)
+
+  batch = Batch(n, MESSAGE_SIZE)
+  batch.variables = {
+    'PID': PID, 'PID2': PID2, 'K1': K1, 'K2': K2,
+    'n1': n1, 'n2': n2, 'A': A, 'B': B, 'D': D, 'E': E, 'F': F
+  }
+
+  batch.send('hello', MessageKind.READER_TO_TAG)
+  batch.send('PID2',  MessageKind.TAG_TO_READER, PID2)
+  batch.send('ABD',   MessageKind.READER_TO_TAG, A, B, D)
+  batch.send('EF',    MessageKind.TAG_TO_READER, E, F)
+
+  return batch
+
+def simulate_chain(n: int, secrets: dict, rng: np.random.Generator = None) -> tuple:
+  """Simulates n consecutive DP sessions of the same reader and tag.
+
+  The PIDs are updated after every session, as both parties do, using plain
+  integers. The transcripts are then computed at once, as in
+  `simulate_batch`.
+
+  Args:
+      n (int): Number of sessions
+      secrets (dict): PID, PID2, K1 and K2 before the first session
+      rng (np.random.Generator, optional): Source for nonces
+
+  Returns:
+      tuple: The batch of the sessions (with the secrets of each one, before
+        its update), and the secrets after the last one
+  """
+  n1 = random_rows(n, MESSAGE_SIZE, rng)
+  n2 = random_rows(n, MESSAGE_SIZE, rng)
+
+  PID, PID2, K1, K2 = (secrets[name].to_int() for name in DPProtocol.SECRETS)
+  history = []
+
+  for nonce1, nonce2 in zip(unpack_ints(n1.bits, MESSAGE_SIZE), unpack_ints(n2.bits, MESSAGE_SIZE)):
+    history.append((PID, PID2))
+    PID, PID2 = PID2, PID2 ^ nonce1 ^ nonce2
+
+  columns = {name: NumpyVector(pack_ints(values, MESSAGE_SIZE), MESSAGE_SIZE) for name, values in zip(('PID', 'PID2'), zip(*history))}
+  columns['K1'] = NumpyVector(pack_ints([K1] * n, MESSAGE_SIZE), MESSAGE_SIZE)
+  columns['K2'] = NumpyVector(pack_ints([K2] * n, MESSAGE_SIZE), MESSAGE_SIZE)
+
+  batch = simulate_batch(n, n1 = n1, n2 = n2, **columns)
+  secrets = {name: vector(value, MESSAGE_SIZE) for name, value in zip(DPProtocol.SECRETS, (PID, PID2, K1, K2))}
+
+  return batch, secrets
 
 # --------------------
 # DPReader
 # --------------------
 class DPReader(Reader):
 
+  HANDLERS = {
+    'PID2': 'handle_PID2_message',
+    'EF':   'handle_EF_message'
+  }
+
   def __init__(self, channel: Channel):
+    self.reset()
+
+    Reader.__init__(self, 'emap', channel)
+
+  def reset(self):
     self.PID  = None
     self.PID2 = None
     self.K1   = None
@@ -24,8 +129,6 @@ class DPReader(Reader):
     self.n1   = None
     self.n2   = None
 
-    Reader.__init__(self, 'emap', channel)
-
   def start(self):
     """Starts the protocol by sending the hello message.
     """
@@ -37,7 +140,7 @@ class DPReader(Reader):
     hello_message = Message(
       label   = 'hello',
       kind    = MessageKind.READER_TO_TAG,
-      content = bitarray(0)
+      content = vector(0, 0)
     )
 
     self.log('Sent hello message')
@@ -62,9 +165,13 @@ class DPReader(Reader):
 
     self.log('PID2 Valid')
 
+    # Look up the keys of the tag, if the reader serves more than one
+    if not self.identify(self.PID2):
+      return
+
     # First, create n1 & n2
-    self.n1 = bitarray(MESSAGE_SIZE)
-    self.n2 = bitarray(MESSAGE_SIZE)
+    self.n1 = random_bits(MESSAGE_SIZE)
+    self.n2 = random_bits(MESSAGE_SIZE)
 
     self.log('Created n1, n2')
 
@@ -76,21 +183,10 @@ class DPReader(Reader):
     self.log('Created A, B, D')
 
     # Create and send message
-    content = bitarray(0)
-    content.extend(A)
-    content.extend(B)
-    content.extend(D)
-
-    # Create and send message
-    content = bitarray(0)
-    content.extend(A)
-    content.extend(B)
-    content.extend(D)
-
     abd_message = Message(
       label   = 'ABD',
       kind    = MessageKind.READER_TO_TAG,
-      content = content
+      parts   = [A, B, D]
     )
 
     self.log('Sent ABD message')
@@ -102,13 +198,11 @@ class DPReader(Reader):
     Args:
         message (Message): The message containing E || F
     """
-    EF = message.content
-    if EF is None or len(EF) != 2 * MESSAGE_SIZE:
+    if message.size() != 2 * MESSAGE_SIZE:
       self.error('Missing EF or incorrect size')
 
     # Get D, E
-    E = EF[:MESSAGE_SIZE]
-    F = EF[MESSAGE_SIZE:]
+    E, F = message.split(MESSAGE_SIZE)
 
     self.log('Got E, F')
 
@@ -127,32 +221,32 @@ class DPReader(Reader):
 
     # Update PIDs
     self.update()
-
-  def receive(self, message: Message):
-    super(DPReader, self).receive(message)
-
-    if message.label == 'PID2':
-      self.handle_PID2_message(message)
-    elif message.label == 'EF':
-      self.handle_EF_message(message)
+    self.confirm()
 
 # --------------------
 # DPTag
 # --------------------
 class DPTag(Tag):
 
+  HANDLERS = {
+    'hello': 'handle_hello_message',
+    'ABD':   'handle_ABD_message'
+  }
+
   def __init__(self, channel: Channel):
-    self.PID  = bitarray(MESSAGE_SIZE)
-    self.PID2 = bitarray(MESSAGE_SIZE)
-    self.K1   = bitarray(MESSAGE_SIZE)
-    self.K2   = bitarray(MESSAGE_SIZE)
-    self.n1   = None
-    self.n2   = None
+    self.reset()
 
     Tag.__init__(self, 'emap', channel)
 
   def reset(self):
-    pass
+    """Draws new secrets and clears the nonces.
+    """
+    self.PID  = random_bits(MESSAGE_SIZE)
+    self.PID2 = random_bits(MESSAGE_SIZE)
+    self.K1   = random_bits(MESSAGE_SIZE)
+    self.K2   = random_bits(MESSAGE_SIZE)
+    self.n1   = None
+    self.n2   = None
 
   def update(self):
     """
@@ -160,7 +254,7 @@ class DPTag(Tag):
     self.PID = self.PID2
     self.PID2 = self.PID2 ^ self.n1 ^ self.n2
 
-  def handle_hello_message(self):
+  def handle_hello_message(self, message: Message):
     """Handles initial hello message from the reader.
     """
     PID2_message = Message(
@@ -178,14 +272,11 @@ class DPTag(Tag):
     Args:
         message (Message): The message containing A || B || D
     """
-    ABD = message.content
-    if ABD is None or len(ABD) != 3 * MESSAGE_SIZE:
+    if message.size() != 3 * MESSAGE_SIZE:
       self.error('Missing ABD or incorrect size')
 
     # Get A, B, D
-    A = ABD[:MESSAGE_SIZE]
-    B = ABD[MESSAGE_SIZE:2*MESSAGE_SIZE]
-    D = ABD[2*MESSAGE_SIZE:]
+    A, B, D = message.split(MESSAGE_SIZE)
 
     self.log('Got A, B, D')
 
@@ -209,14 +300,10 @@ class DPTag(Tag):
     self.log('Created E, F')
 
     # Create message and send
-    content = bitarray(0)
-    content.extend(E)
-    content.extend(F)
-
     ef_message = Message(
       label   = 'EF',
       kind    = MessageKind.TAG_TO_READER,
-      content = content
+      parts   = [E, F]
     )
 
     self.log('Sent EF message')
@@ -226,33 +313,39 @@ class DPTag(Tag):
 
     self.channel.send(ef_message)
 
-  def receive(self, message: Message):
-    super(DPTag, self).receive(message)
-
-    if message.label == 'hello':
-      self.handle_hello_message()
-    elif message.label == 'ABD':
-      self.handle_ABD_message(message)
-
 # --------------------
 # DPProtocol
 # --------------------
 class DPProtocol(Protocol):
 
-  def __init__(self):
-    Protocol.__init__(self, 'dp')
+  SECRETS = ('PID', 'PID2', 'K1', 'K2')
+  PSEUDONYM = 'PID2'
+
+  def __init__(self, channel: Channel = None):
+    Protocol.__init__(self, 'dp', channel)
 
     self.reader = DPReader(self.channel)
     self.tag = DPTag(self.channel)
 
+    self.share_secrets()
+
+    self.channel.listen(self.reader)
+    self.channel.listen(self.tag)
+
+  def share_secrets(self):
     # start Secure channel
     self.reader.K1 = self.tag.K1
     self.reader.K2 = self.tag.K2
     self.log('Transferred secret keys through secure channel')
     # end Secure channel
 
-    self.channel.listen(self.reader)
-    self.channel.listen(self.tag)
+  def reset(self):
+    super(DPProtocol, self).reset()
+
+    self.reader.reset()
+    self.tag.reset()
+
+    self.share_secrets()
 
   def run(self):
     super(DPProtocol, self).run()
@@ -287,3 +380,16 @@ class DPProtocol(Protocol):
 
     self.success('Verification successful')
     return True
+
+  def run_batch(self, n: int, rng: np.random.Generator = None) -> Batch:
+    return simulate_batch(n, rng)
+
+  @staticmethod
+  def next_secrets(secrets: tuple, n1: int, n2: int) -> tuple:
+    return next_secrets(secrets, n1, n2)
+
+  def run_chain(self, n: int, rng: np.random.Generator = None) -> Batch:
+    batch, secrets = simulate_chain(n, self.secrets(), rng)
+    self.restore(secrets)
+
+    return batch
@@ -1,58 +1,240 @@
+import numpy as np
+from base.batch import Batch
 from base.channel import Channel
 from base.message import Message, MessageKind
 from base.protocol import Protocol
 from base.reader import Reader
 from base.tag import Tag
-from bitarray import bitarray
+from util.bits import pack_ints, unpack_ints
+from util.bitvector import BitVector, NumpyVector, bit_count, vector
+from util.rng import random_bits, random_rows
 
 MESSAGE_SIZE = 96
 
 # --------------------
 # Functions
 # --------------------
-def parity(b: bitarray, n: int = 4) -> bitarray:
-  # Divide in chunks of 4 bits
-  chunks = [b[i:i + n] for i in range(0, len(b), n)]
+# Parities (set if even) of the high and low nibbles of every byte value
+NIBBLE_PARITY = bytes(((1 - bin(i >> 4).count('1') % 2) << 1) | (1 - bin(i & 0xf).count('1') % 2) for i in range(256))
+NIBBLE_PARITY_ROWS = np.frombuffer(NIBBLE_PARITY, dtype = np.uint8)
 
-  # Calc parity for each chunk
-  parities = [c.count(True) % 2 == 0 for c in chunks]
+def parity_int(value: int, length: int, n: int = 4) -> int:
+  """Returns the parities (set if even) of the chunks of n bits of an integer of `length` bits.
+  """
+  # Divide in chunks of 4 bits (padding the last one with zeros)
+  padded = length + (-length) % n
 
-  # Return bitarray
-  return bitarray(parities)
+  if n == 4:
+    # Look up the parities of both nibbles of every byte
+    n_bytes = (length + 7) // 8
+    data = (value << (8 * n_bytes - length)).to_bytes(n_bytes, 'big').translate(NIBBLE_PARITY)
 
-def update(ID: bitarray, IDS: bitarray, K1: bitarray, K2: bitarray, K3: bitarray, K4: bitarray, n1: bitarray, n2: bitarray):
+    parities = 0
+    for pair in data:
+      parities = (parities << 2) | pair
+
+    # Drop the nibble that only holds padding, if any
+    return parities >> ((8 * n_bytes - padded) // 4)
+
+  value = value << (padded - length)
+  mask = (1 << n) - 1
+
+  # Calc parity for each chunk (set if even)
+  parities = 0
+  for shift in range(padded - n, -1, -n):
+    parities = (parities << 1) | (1 - bit_count((value >> shift) & mask) % 2)
+
+  return parities
+
+def parity_rows(b: NumpyVector) -> NumpyVector:
+  """Returns the parities (set if even) of the chunks of 4 bits of every row at once.
+  """
+  length = (len(b) + 3) // 4
+
+  # Parities of both nibbles of every byte, 4 bytes per byte of the result
+  pairs = NIBBLE_PARITY_ROWS[b.bits]
+  pairs = np.pad(pairs, [(0, 0)] * (pairs.ndim - 1) + [(0, (-pairs.shape[-1]) % 4)])
+  pairs = pairs.reshape(pairs.shape[:-1] + (-1, 4))
+
+  bits = (pairs[..., 0] << 6) | (pairs[..., 1] << 4) | (pairs[..., 2] << 2) | pairs[..., 3]
+  bits = bits[..., :(length + 7) // 8]
+
+  # The nibble that only holds padding, if any, is cleared too
+  if length % 8 != 0:
+    bits[..., -1] &= np.uint8((0xff << (8 - length % 8)) & 0xff)
+
+  return NumpyVector(bits, length)
+
+def parity(b: BitVector, n: int = 4) -> BitVector:
+  if isinstance(b, NumpyVector) and n == 4:
+    return parity_rows(b)
+
+  length = len(b) + (-len(b)) % n
+
+  # Return vector
+  return vector(parity_int(b.to_int(), len(b), n), length // n)
+
+def update_int(ID: int, IDS: int, K1: int, K2: int, K3: int, K4: int, n1: int, n2: int) -> tuple:
+  """Updates the IDS and keys, as integers of MESSAGE_SIZE bits (see `update`).
+  """
   IDS_ = IDS ^ n2 ^ K1
 
   idx = int(MESSAGE_SIZE/2)
+  size = (MESSAGE_SIZE + 3) // 4
+
+  # Halves of the ID and parities of the keys
+  ID_high = ID >> (MESSAGE_SIZE - idx)
+  ID_low  = ID & ((1 << (MESSAGE_SIZE - idx)) - 1)
+
+  P1 = parity_int(K1, MESSAGE_SIZE)
+  P2 = parity_int(K2, MESSAGE_SIZE)
+  P3 = parity_int(K3, MESSAGE_SIZE)
+  P4 = parity_int(K4, MESSAGE_SIZE)
 
-  K1_delta = ID[:idx]
-  K1_delta.extend(parity(K4))
-  K1_delta.extend(parity(K3))
+  K1_delta = (ID_high << (2 * size)) | (P4 << size) | P3
   K1_ = K1 ^ n2 ^ K1_delta
 
-  K2_delta = parity(K1)
-  K2_delta.extend(parity(K4))
-  K2_delta.extend(ID[idx:])
+  K2_delta = (P1 << (size + MESSAGE_SIZE - idx)) | (P4 << (MESSAGE_SIZE - idx)) | ID_low
   K2_ = K2 ^ n2 ^ K2_delta
 
-  K3_delta = ID[:idx]
-  K3_delta.extend(parity(K4))
-  K3_delta.extend(parity(K2))
+  K3_delta = (ID_high << (2 * size)) | (P4 << size) | P2
   K3_ = K3 ^ n1 ^ K3_delta
 
-  K4_delta = parity(K3)
-  K4_delta.extend(parity(K1))
-  K4_delta.extend(ID[idx:])
+  K4_delta = (P3 << (size + MESSAGE_SIZE - idx)) | (P1 << (MESSAGE_SIZE - idx)) | ID_low
   K4_ = K4 ^ n1 ^ K4_delta
 
-  return (IDS, K1, K2, K3, K4)
+  return (IDS_, K1_, K2_, K3_, K4_)
+
+def next_secrets(secrets: tuple, n1: int, n2: int) -> tuple:
+  """Returns ID, IDS, K1, K2, K3 and K4 after a session, as integers.
+  """
+  ID, IDS, K1, K2, K3, K4 = secrets
+  return (ID,) + update_int(ID, IDS, K1, K2, K3, K4, n1, n2)
+
+def update(ID: BitVector, IDS: BitVector, K1: BitVector, K2: BitVector, K3: BitVector, K4: BitVector, n1: BitVector, n2: BitVector):
+  """Returns the new IDS, K1, K2, K3 and K4 after a session, as vectors of the same backend.
+
+  Vectors with many rows (e.g. the variables of a batch) are updated at once.
+  """
+  if isinstance(IDS, NumpyVector):
+    IDS_ = IDS ^ n2 ^ K1
+
+    idx = int(MESSAGE_SIZE/2)
+
+    K1_ = K1 ^ n2 ^ (ID[:idx] + parity(K4) + parity(K3))
+    K2_ = K2 ^ n2 ^ (parity(K1) + parity(K4) + ID[idx:])
+    K3_ = K3 ^ n1 ^ (ID[:idx] + parity(K4) + parity(K2))
+    K4_ = K4 ^ n1 ^ (parity(K3) + parity(K1) + ID[idx:])
+
+    return (IDS_, K1_, K2_, K3_, K4_)
+
+  values = update_int(*(b.to_int() for b in (ID, IDS, K1, K2, K3, K4, n1, n2)))
+
+  return tuple(type(IDS).from_int(value, MESSAGE_SIZE) for value in values)
+
+def simulate_batch(n: int, rng: np.random.Generator = None, **variables) -> Batch:
+  """Simulates n independent EMAP sessions at once.
+
+  Every variable is a `NumpyVector` with one row per session, so the same
+  expressions as in the simulation apply to all of them. Secrets and nonces
+  that are not given are drawn from `rng`.
+
+  Args:
+      n (int): Number of sessions
+      rng (np.random.Generator, optional): Source for secrets and nonces
+
+  Returns:
+      Batch: The transcripts and variables of every session
+  """
+  def get(name: str) -> NumpyVector:
+    if name in variables:
+      return variables[name]
+
+    return random_rows(n, MESSAGE_SIZE, rng)
+
+  # Tag secrets
+  ID  = get('ID')
+  IDS = get('IDS')
+  K1  = get('K1')
+  K2  = get('K2')
+  K3  = get('K3')
+  K4  = get('K4')
+
+  # Reader nonces and A, B, C
+  n1 = get('n1')
+  n2 = get('n2')
+
+  A =  IDS ^ K1  ^ n1
+  B = (IDS | K2) ^ n1
+  C =  IDS ^ K3  ^ n2
+
+  # Tag D, E
+  D = (IDS & K4) ^ n2
+  E = (IDS & n1 | n2) ^ ID ^ K1 ^ K2 ^ K3 ^ K4
+
+  batch = Batch(n, MESSAGE_SIZE)
+  batch.variables = {
+    'ID': ID, 'IDS': IDS, 'K1': K1, 'K2': K2, 'K3': K3, 'K4': K4,
+    'n1': n1, 'n2': n2, 'A': A, 'B': B, 'C': C, 'D': D, 'E': E
+  }
+
+  batch.send('hello', MessageKind.READER_TO_TAG)
+  batch.send('IDS',   MessageKind.TAG_TO_READER, IDS)
+  batch.send('ABC',   MessageKind.READER_TO_TAG, A, B, C)
+  batch.send('DE',    MessageKind.TAG_TO_READER, D, E)
+
+  return batch
+
+def simulate_chain(n: int, secrets: dict, rng: np.random.Generator = None) -> tuple:
+  """Simulates n consecutive EMAP sessions of the same reader and tag.
+
+  The IDS and keys are updated after every session, as both parties do,
+  using plain integers. The transcripts are then computed at once, as in
+  `simulate_batch`.
+
+  Args:
+      n (int): Number of sessions
+      secrets (dict): ID, IDS, K1, K2, K3 and K4 before the first session
+      rng (np.random.Generator, optional): Source for nonces
+
+  Returns:
+      tuple: The batch of the sessions (with the secrets of each one, before
+        its update), and the secrets after the last one
+  """
+  n1 = random_rows(n, MESSAGE_SIZE, rng)
+  n2 = random_rows(n, MESSAGE_SIZE, rng)
+
+  ID, IDS, K1, K2, K3, K4 = (secrets[name].to_int() for name in EMAPProtocol.SECRETS)
+  history = []
+
+  for nonce1, nonce2 in zip(unpack_ints(n1.bits, MESSAGE_SIZE), unpack_ints(n2.bits, MESSAGE_SIZE)):
+    history.append((IDS, K1, K2, K3, K4))
+    IDS, K1, K2, K3, K4 = update_int(ID, IDS, K1, K2, K3, K4, nonce1, nonce2)
+
+  columns = {name: NumpyVector(pack_ints(values, MESSAGE_SIZE), MESSAGE_SIZE) for name, values in zip(EMAPProtocol.SECRETS[1:], zip(*history))}
+  columns['ID'] = NumpyVector(pack_ints([ID] * n, MESSAGE_SIZE), MESSAGE_SIZE)
+
+  batch = simulate_batch(n, n1 = n1, n2 = n2, **columns)
+  secrets = {name: vector(value, MESSAGE_SIZE) for name, value in zip(EMAPProtocol.SECRETS, (ID, IDS, K1, K2, K3, K4))}
+
+  return batch, secrets
 
 # --------------------
 # EMAPReader
 # --------------------
 class EMAPReader(Reader):
 
+  HANDLERS = {
+    'IDS': 'handle_IDS_message',
+    'DE':  'handle_ED_message'
+  }
+
   def __init__(self, channel: Channel):
+    self.reset()
+
+    Reader.__init__(self, 'emap', channel)
+
+  def reset(self):
     self.ID  = None
     self.IDS = None
     self.K1  = None
@@ -62,8 +244,6 @@ class EMAPReader(Reader):
     self.n1  = None
     self.n2  = None
 
-    Reader.__init__(self, 'emap', channel)
-
   def start(self):
     """Starts the protocol by sending the hello message.
     """
@@ -79,7 +259,7 @@ class EMAPReader(Reader):
     hello_message = Message(
       label   = 'hello',
       kind    = MessageKind.READER_TO_TAG,
-      content = bitarray(0)
+      content = vector(0, 0)
     )
 
     self.log('Sent hello message')
@@ -110,9 +290,13 @@ class EMAPReader(Reader):
 
     self.log('IDS Valid')
 
+    # Look up the keys of the tag, if the reader serves more than one
+    if not self.identify(self.IDS):
+      return
+
     # First, create n1 & n2
-    self.n1 = bitarray(MESSAGE_SIZE)
-    self.n2 = bitarray(MESSAGE_SIZE)
+    self.n1 = random_bits(MESSAGE_SIZE)
+    self.n2 = random_bits(MESSAGE_SIZE)
 
     self.log('Created n1, n2')
 
@@ -124,15 +308,10 @@ class EMAPReader(Reader):
     self.log('Created A, B, C')
 
     # Create and send message
-    content = bitarray(0)
-    content.extend(A)
-    content.extend(B)
-    content.extend(C)
-
     abc_message = Message(
       label   = 'ABC',
       kind    = MessageKind.READER_TO_TAG,
-      content = content
+      parts   = [A, B, C]
     )
 
     self.log('Sent ABC message')
@@ -144,13 +323,11 @@ class EMAPReader(Reader):
     Args:
         message (Message): The message containing E || D
     """
-    DE = message.content
-    if DE is None or len(DE) != 2 * MESSAGE_SIZE:
+    if message.size() != 2 * MESSAGE_SIZE:
       self.error('Missing DE or incorrect size')
 
     # Get D, E
-    D = DE[:MESSAGE_SIZE]
-    E = DE[MESSAGE_SIZE:]
+    D, E = message.split(MESSAGE_SIZE)
 
     self.log('Got D, E')
 
@@ -169,33 +346,32 @@ class EMAPReader(Reader):
 
     # Update keys
     self.update()
-
-  def receive(self, message: Message):
-    super(EMAPReader, self).receive(message)
-
-    if message.label == 'IDS':
-      self.handle_IDS_message(message)
-    elif message.label == 'DE':
-      self.handle_ED_message(message)
+    self.confirm()
 
 # --------------------
 # EMAPTag
 # --------------------
 class EMAPTag(Tag):
 
+  HANDLERS = {
+    'hello': 'handle_hello_message',
+    'ABC':   'handle_ABC_message'
+  }
+
   def __init__(self, channel: Channel):
-    self.ID  = bitarray(MESSAGE_SIZE)
-    self.IDS = bitarray(MESSAGE_SIZE)
-    self.K1  = bitarray(MESSAGE_SIZE)
-    self.K2  = bitarray(MESSAGE_SIZE)
-    self.K3  = bitarray(MESSAGE_SIZE)
-    self.K4  = bitarray(MESSAGE_SIZE)
-    self.n1  = None
-    self.n2  = None
+    self.reset()
 
     Tag.__init__(self, 'emap', channel)
 
   def reset(self):
+    """Draws new secrets and clears the nonces.
+    """
+    self.ID  = random_bits(MESSAGE_SIZE)
+    self.IDS = random_bits(MESSAGE_SIZE)
+    self.K1  = random_bits(MESSAGE_SIZE)
+    self.K2  = random_bits(MESSAGE_SIZE)
+    self.K3  = random_bits(MESSAGE_SIZE)
+    self.K4  = random_bits(MESSAGE_SIZE)
     self.n1  = None
     self.n2  = None
 
@@ -212,7 +388,7 @@ class EMAPTag(Tag):
 
     self.log('Updated keys and IDS')
 
-  def handle_hello_message(self):
+  def handle_hello_message(self, message: Message):
     """Handles initial hello message from the reader.
     """
     IDS_message = Message(
@@ -230,14 +406,11 @@ class EMAPTag(Tag):
     Args:
         message (Message): The message containing A || B || C
     """
-    ABC = message.content
-    if ABC is None or len(ABC) != 3 * MESSAGE_SIZE:
+    if message.size() != 3 * MESSAGE_SIZE:
       self.error('Missing ABC or incorrect size')
 
     # Get A, B, C
-    A = ABC[:MESSAGE_SIZE]
-    B = ABC[MESSAGE_SIZE:2*MESSAGE_SIZE]
-    C = ABC[2*MESSAGE_SIZE:]
+    A, B, C = message.split(MESSAGE_SIZE)
 
     self.log('Got A, B, C')
 
@@ -260,14 +433,10 @@ class EMAPTag(Tag):
     self.log('Created D, E')
 
     # Create message and send
-    content = bitarray(0)
-    content.extend(D)
-    content.extend(E)
-
     de_message = Message(
       label   = 'DE',
       kind    = MessageKind.TAG_TO_READER,
-      content = content
+      parts   = [D, E]
     )
 
     self.log('Sent DE message')
@@ -277,26 +446,26 @@ class EMAPTag(Tag):
 
     self.channel.send(de_message)
 
-
-  def receive(self, message: Message):
-    super(EMAPTag, self).receive(message)
-
-    if message.label == 'hello':
-      self.handle_hello_message()
-    elif message.label == 'ABC':
-      self.handle_ABC_message(message)
-
 # --------------------
 # EMAPProtocol
 # --------------------
 class EMAPProtocol(Protocol):
 
-  def __init__(self):
-    Protocol.__init__(self, 'emap')
+  SECRETS = ('ID', 'IDS', 'K1', 'K2', 'K3', 'K4')
+  PSEUDONYM = 'IDS'
+
+  def __init__(self, channel: Channel = None):
+    Protocol.__init__(self, 'emap', channel)
 
     self.reader = EMAPReader(self.channel)
     self.tag = EMAPTag(self.channel)
 
+    self.share_secrets()
+
+    self.channel.listen(self.reader)
+    self.channel.listen(self.tag)
+
+  def share_secrets(self):
     # start Secure channel
     self.reader.K1 = self.tag.K1
     self.reader.K2 = self.tag.K2
@@ -305,8 +474,13 @@ class EMAPProtocol(Protocol):
     self.log('Transferred secret keys through secure channel')
     # end Secure channel
 
-    self.channel.listen(self.reader)
-    self.channel.listen(self.tag)
+  def reset(self):
+    super(EMAPProtocol, self).reset()
+
+    self.reader.reset()
+    self.tag.reset()
+
+    self.share_secrets()
 
   def run(self):
     super(EMAPProtocol, self).run()
@@ -349,3 +523,16 @@ class EMAPProtocol(Protocol):
 
     self.success('Verification successful')
     return True
+
+  def run_batch(self, n: int, rng: np.random.Generator = None) -> Batch:
+    return simulate_batch(n, rng)
+
+  @staticmethod
+  def next_secrets(secrets: tuple, n1: int, n2: int) -> tuple:
+    return next_secrets(secrets, n1, n2)
+
+  def run_chain(self, n: int, rng: np.random.Generator = None) -> Batch:
+    batch, secrets = simulate_chain(n, self.secrets(), rng)
+    self.restore(secrets)
+
+    return batch
@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
+import cProfile
+
+from attacks.bias import BiasAttack
+from attacks.engines import NumpyEngine, PythonEngine
+from attacks.gf2 import GF2Attack
 from attacks.linear import LinearAttack
+from base.async_channel import ConcurrentSessions
+from base.chain import Chain, CheckpointWriter
+from base.corpus import Corpus
+from base.population import Population
 from protocols.emap import EMAPProtocol
 from protocols.dp import DPProtocol
-from util.logger import Logger, LogLevel, ForceLogger
-from util.parse import AttackKind, ProtocolKind, parse_args
+from util.bitvector import BitarrayVector, IntVector, NumpyVector, use_backend
+from util.logger import ForceLogger, JsonSink, Logger, LogLevel
+from util.parse import AttackKind, BitsKind, EngineKind, ProtocolKind, parse_args
+from util.rng import new_seed, seed_stream, stream_generator
 
 _PROTOCOLS = {
   ProtocolKind.EMAP: EMAPProtocol,
@@ -11,23 +22,93 @@ _PROTOCOLS = {
 }
 
 _ATTACKS = {
-  AttackKind.LINEAR: LinearAttack
+  AttackKind.LINEAR: LinearAttack,
+  AttackKind.BIAS: BiasAttack,
+  AttackKind.GF2: GF2Attack
+}
+
+_ENGINES = {
+  EngineKind.PYTHON: PythonEngine,
+  EngineKind.NUMPY: NumpyEngine
+}
+
+_BITS = {
+  BitsKind.BITARRAY: BitarrayVector,
+  BitsKind.INT: IntVector,
+  BitsKind.NUMPY: NumpyVector
 }
 
 def main():
   args = parse_args()
 
   # Set logging level
-  Logger._level = LogLevel[args.loglevel]
+  Logger.set_level(LogLevel[args.loglevel])
+  if args.log_file is not None:
+    Logger.set_sink(JsonSink(args.log_file))
   logger = ForceLogger('RFID', 'main')
 
+  # Set bit vector backend
+  use_backend(_BITS[BitsKind[args.bits]])
+
+  # Seed the keys and nonces (attacks seed every iteration on their own)
+  if args.seed is not None:
+    seed_stream(args.seed)
+
   # Create protocol
   protocol = _PROTOCOLS[ProtocolKind[args.protocol]]()
 
+  # Record sessions to a corpus
+  if args.record is not None:
+    seed = args.seed if args.seed is not None else new_seed()
+    block_size = args.batch if args.batch > 0 else 1024
+
+    logger.log(f'Recording {args.iterations} sessions with seed {seed}')
+    Corpus.record(args.record, protocol, args.iterations, seed, block_size)
+    logger.warn(f'Saved corpus to {args.record}')
+
+    logger.log('Finished running')
+    return
+
+  # Open recorded sessions
+  corpus = None
+  if args.corpus is not None:
+    corpus = Corpus(args.corpus)
+
+    if corpus.protocol != protocol.id:
+      logger.error(f'Corpus has sessions of {corpus.protocol}, not {protocol.id}')
+      exit(1)
+
+  # Checkpoints of chained sessions are written as they are taken
+  observers = []
+  if args.checkpoint_file is not None:
+    observers.append(CheckpointWriter(args.checkpoint_file))
+
   # Create attack if appropriate
   attack = None
   if args.attack is not None:
-    attack = _ATTACKS[AttackKind[args.attack]](protocol, args.iterations, args.combinations)
+    options = {
+      'batch_size': args.batch,
+      'jobs':       args.jobs,
+      'seed':       args.seed,
+      'top':        args.top,
+      'corpus':     corpus,
+      'chain':      args.chain,
+      'checkpoint': args.checkpoint,
+      'observers':  observers,
+      'resume':     args.resume,
+      'profile':    args.profile or args.profile_file is not None
+    }
+
+    # Only the linear attack evaluates combinations with an engine, and prunes them
+    if AttackKind[args.attack] == AttackKind.LINEAR:
+      options.update(
+        engine      = _ENGINES[EngineKind[args.engine]](),
+        prune       = args.prune,
+        prune_band  = args.prune_band,
+        prune_round = args.prune_round
+      )
+
+    attack = _ATTACKS[AttackKind[args.attack]](protocol, args.iterations, args.combinations, **options)
   target_name = args.target
 
   # Execute according
@@ -37,15 +118,65 @@ def main():
       exit(1)
 
     logger.log('Running Attack')
-    results = attack.run(target_name)
 
-    results = results.sort_values(by = ['mean', 'stdev', 'combination'], ascending = False)
+    if args.profile_file is not None:
+      profiler = cProfile.Profile()
+      results = profiler.runcall(attack.run, target_name)
+
+      profiler.dump_stats(args.profile_file)
+      logger.warn(f'Saved profile to {args.profile_file}')
+    else:
+      results = attack.run(target_name)
+
+    if attack.profile.enabled:
+      for line in attack.profile.table():
+        logger.log(line)
 
     if args.output is not None:
       out_filename = args.output
       results.to_csv(out_filename, index=False)
       logger.warn(f'Saved results to {out_filename}')
 
+  elif args.concurrency > 0:
+    logger.log(f'Running {args.iterations} sessions, {args.concurrency} at once')
+    sessions = ConcurrentSessions(_PROTOCOLS[ProtocolKind[args.protocol]], args.iterations, args.concurrency,
+      latency = args.latency / 1000,
+      jitter  = args.jitter / 1000,
+      rng     = stream_generator(args.seed if args.seed is not None else new_seed())
+    )
+    stats = sessions.run()
+
+    logger.warn(f'Throughput {stats["throughput"]:.0f} sessions/s, duration p50 {stats["p50"] * 1000:.2f} ms, p90 {stats["p90"] * 1000:.2f} ms, p99 {stats["p99"] * 1000:.2f} ms, max {stats["max"] * 1000:.2f} ms')
+
+    if stats['failed'] > 0:
+      logger.error(f'{stats["failed"]} sessions failed verification')
+
+  elif args.population > 0:
+    logger.log(f'Running {args.iterations} sessions of a population of {args.population} tags')
+    population = Population(protocol, args.population, stream_generator(args.seed if args.seed is not None else new_seed()), args.loss)
+
+    latency = population.run(args.iterations)
+    logger.warn(f'Sessions take {latency * 1e6:.2f} us identifying tags with the index, a linear search alone takes {population.linear_latency() * 1e6:.2f} us')
+
+    population.verify()
+
+  elif args.chain:
+    logger.log(f'Running {args.iterations} chained sessions')
+    chain = Chain(protocol, stream_generator(args.seed if args.seed is not None else new_seed()),
+      block_size = args.batch,
+      checkpoint = args.checkpoint,
+      observers  = observers
+    )
+
+    if args.resume is not None:
+      chain.resume(args.resume)
+
+    chain.run(args.iterations)
+
+    # One more session through the channel, from the secrets after the chain
+    protocol.run()
+    protocol.verify()
+
   else:
     logger.log('Running Protocol')
     protocol.run()
@@ -0,0 +1,19 @@
+import pytest
+from util.bitvector import IntVector, get_backend, use_backend
+from util.logger import Logger, LogLevel
+
+
+@pytest.fixture(autouse = True)
+def quiet():
+  """Runs every test without logging, and with the default bit vector backend.
+  """
+  level = Logger._level
+  backend = get_backend()
+
+  Logger.set_level(LogLevel.NONE)
+  use_backend(IntVector)
+
+  yield
+
+  Logger.set_level(level)
+  use_backend(backend)
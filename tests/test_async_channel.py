@@ -0,0 +1,49 @@
+import asyncio
+
+from base.async_channel import AsyncChannel, ConcurrentSessions
+from base.listener import Listener
+from base.message import Message, MessageKind
+from protocols.emap import EMAPProtocol
+from util.bitvector import vector
+
+
+class FailingTap(Listener):
+
+  def __init__(self):
+    self.messages = []
+
+  def receive(self, message: Message):
+    self.messages.append(message)
+    raise RuntimeError('failing handler')
+
+def test_concurrent_sessions_report_throughput_and_percentiles():
+  latency = 0.001
+  stats = ConcurrentSessions(EMAPProtocol, 20, 5, latency = latency, jitter = 0.0005).run()
+
+  assert stats['sessions'] == 20 and stats['failed'] == 0
+  assert stats['throughput'] > 0
+
+  # Every session takes at least its 4 hops
+  assert 4 * latency <= stats['p50'] <= stats['p90'] <= stats['p99'] <= stats['max']
+
+  # At most 5 sessions are in flight, so 20 of them take at least 4 rounds
+  assert stats['throughput'] <= 5 / (4 * latency)
+
+def test_drain_after_failing_handler():
+  tap = FailingTap()
+  errors = []
+
+  async def run():
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context['exception']))
+
+    channel = AsyncChannel('failing', latency = 0.001)
+    channel.listen(tap)
+
+    for _ in range(3):
+      channel.send(Message('hello', MessageKind.READER_TO_TAG, vector(0, 8)))
+
+    await asyncio.wait_for(channel.drain(), timeout = 1)
+    return channel.in_flight
+
+  assert asyncio.run(run()) == 0
+  assert len(tap.messages) == 3 and len(errors) == 3
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from attacks.bias import BiasAttack
+from attacks.engines import NumpyEngine, PythonEngine
+from attacks.gf2 import GF2Attack
+from attacks.linear import LinearAttack
+from base.corpus import Corpus
+from base.listener import Listener
+from base.message import Message
+from pandas.testing import assert_frame_equal
+from protocols.dp import DPProtocol
+from protocols.emap import EMAPProtocol
+from util.rng import SessionStreams, random_bits, seed_stream, stream_generator
+
+PROTOCOLS = [(EMAPProtocol, 'ID'), (DPProtocol, 'PID')]
+
+
+class Tap(Listener):
+
+  def __init__(self):
+    self.messages = []
+
+  def receive(self, message: Message):
+    self.messages.append(message)
+
+@pytest.mark.parametrize('protocol_class, target', PROTOCOLS)
+def test_transcript_matches_simulation(protocol_class, target):
+  seed_stream(5, 1)
+  protocol = protocol_class()
+
+  tap = Tap()
+  protocol.channel.listen(tap)
+  protocol.run()
+
+  batch = protocol_class().run_batch(1, SessionStreams(5, 1, 1))
+  transcript = batch.transcript(0)
+
+  assert [message.label for message in transcript] == [message.label for message in tap.messages]
+  assert [message.content.to_int() for message in transcript] == [message.content.to_int() for message in tap.messages]
+
+def test_session_streams_match_random_bits():
+  rows = SessionStreams(3, 10, 4).rows(96)
+
+  for session in range(4):
+    seed_stream(3, 10 + session)
+    assert rows.row(session).to_int() == random_bits(96).to_int()
+
+@pytest.mark.parametrize('protocol_class, target', PROTOCOLS)
+@pytest.mark.parametrize('engine_class', [PythonEngine, NumpyEngine])
+def test_batch_results_do_not_depend_on_jobs(protocol_class, target, engine_class):
+  def run(**options):
+    return LinearAttack(protocol_class(), 32, 2, engine = engine_class(), seed = 9, batch_size = 8, **options).run(target)
+
+  assert_frame_equal(run(), run(jobs = 2))
+
+def test_batches_are_drawn_from_the_streams_of_their_blocks(monkeypatch):
+  run_batch = EMAPProtocol.run_batch
+  batches = []
+
+  def record(self, n, rng = None):
+    batches.append(run_batch(self, n, rng))
+    return batches[-1]
+
+  monkeypatch.setattr(EMAPProtocol, 'run_batch', record)
+  LinearAttack(EMAPProtocol(), 20, 1, seed = 9, batch_size = 8).run('ID')
+
+  expected = [run_batch(EMAPProtocol(), count, stream_generator(9, first)) for first, count in [(1, 8), (9, 8), (17, 4)]]
+
+  assert len(batches) == len(expected)
+  for batch, other in zip(batches, expected):
+    assert np.array_equal(Corpus.rows_of(batch), Corpus.rows_of(other))
+
+@pytest.mark.parametrize('attack_class', [BiasAttack, GF2Attack])
+def test_batch_results_of_other_attacks_do_not_depend_on_jobs(attack_class):
+  def run(**options):
+    return attack_class(EMAPProtocol(), 48, 2, seed = 9, batch_size = 16, **options).run('ID')
+
+  assert_frame_equal(run(), run(jobs = 2))
+
+def test_corpus_results_match_batches(tmp_path):
+  path = str(tmp_path / 'emap.corpus')
+  corpus = Corpus.record(path, EMAPProtocol(), 32, 9, 8)
+
+  expected = LinearAttack(EMAPProtocol(), 32, 2, seed = 9, batch_size = 8).run('ID')
+  assert_frame_equal(expected, LinearAttack(EMAPProtocol(), 32, 2, corpus = corpus).run('ID'))
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+from base.message import Message, MessageKind
+from util.bitvector import BitarrayVector, IntVector, NumpyVector, bit_count
+
+BACKENDS = [IntVector, BitarrayVector, NumpyVector]
+LENGTHS = [8, 13, 96]
+
+
+def values(length: int, n: int = 8) -> list:
+  source = random.Random(length)
+  return [source.getrandbits(length) for _ in range(n)] + [0, (1 << length) - 1]
+
+def rotate(value: int, shift: int, length: int) -> int:
+  shift %= length
+  return ((value << shift) | (value >> (length - shift))) & ((1 << length) - 1)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('length', LENGTHS)
+def test_operators_match_integers(backend, length):
+  mask = (1 << length) - 1
+
+  for a, b in zip(values(length), reversed(values(length))):
+    x, y = backend.from_int(a, length), backend.from_int(b, length)
+
+    assert (x.to_int(), len(x)) == (a, length)
+    assert (x ^ y).to_int() == a ^ b
+    assert (x & y).to_int() == a & b
+    assert (x | y).to_int() == a | b
+    assert (~x).to_int() == ~a & mask
+    assert x.count() == bit_count(a) == bin(a).count('1')
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('length', LENGTHS)
+def test_rotations_match_integers(backend, length):
+  for a in values(length):
+    x = backend.from_int(a, length)
+
+    for shift in [0, 1, 3, 8, length - 1]:
+      # Rotating left is slicing at the shift and swapping both halves
+      rotated = x[shift % length:] + x[:shift % length]
+      assert (rotated.to_int(), len(rotated)) == (rotate(a, shift, length), length)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_split_matches_integers(backend):
+  length = 96
+  parts = values(length, 1)
+
+  whole = Message('ABC', MessageKind.READER_TO_TAG, backend.from_int((parts[0] << 2 * length) | (parts[1] << length) | parts[2], 3 * length))
+  separate = Message('ABC', MessageKind.READER_TO_TAG, parts = [backend.from_int(part, length) for part in parts])
+
+  assert [value.to_int() for value in whole.split(length)] == parts
+  assert [value.to_int() for value in separate.split(length)] == parts
+  assert whole.content == separate.content
+
+@pytest.mark.parametrize('length', LENGTHS)
+def test_backends_agree(length):
+  for a, b in zip(values(length), reversed(values(length))):
+    results = []
+
+    for backend in BACKENDS:
+      x, y = backend.from_int(a, length), backend.from_int(b, length)
+      rotated = x[3 % length:] + x[:3 % length]
+      split = Message('XY', MessageKind.TAG_TO_READER, x + y).split(length // 2)
+
+      results.append(((x ^ y).to_int(), rotated.to_int(), [value.to_int() for value in split], (x ^ y).count(), x.pack().tolist()))
+
+    assert all(result == results[0] for result in results[1:])
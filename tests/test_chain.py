@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+import protocols.dp as dp
+import protocols.emap as emap
+from attacks.linear import LinearAttack
+from base.chain import Chain, ChainObserver, CheckpointWriter, TranscriptObserver, load_checkpoint
+from base.listener import Listener
+from base.message import Message
+from util.bitvector import vector
+from util.rng import random_rows, seed_stream
+
+PROTOCOLS = [(emap, emap.EMAPProtocol), (dp, dp.DPProtocol)]
+
+
+class Tap(Listener):
+
+  def __init__(self):
+    self.messages = []
+
+  def receive(self, message: Message):
+    self.messages.append(message)
+
+@pytest.mark.parametrize('module, protocol_class', PROTOCOLS)
+def test_chain_matches_simulation(monkeypatch, module, protocol_class):
+  sessions = 20
+
+  seed_stream(5)
+  protocol = protocol_class()
+  secrets = protocol.secrets()
+
+  chained = protocol_class()
+  chained.restore(secrets)
+  batch = chained.run_chain(sessions, np.random.default_rng(1))
+
+  # Consecutive sessions of the simulation, with the nonces of the chain
+  nonces = iter([batch.variable(name, i).to_int() for i in range(sessions) for name in ('n1', 'n2')])
+  monkeypatch.setattr(module, 'random_bits', lambda size: vector(next(nonces), size))
+
+  for i in range(sessions):
+    for name in protocol_class.SECRETS:
+      assert getattr(protocol.tag, name).to_int() == batch.variable(name, i).to_int()
+
+    tap = Tap()
+    protocol.channel.listen(tap)
+    protocol.run()
+
+    assert protocol.verify() is not False
+    assert [message.content.to_int() for message in batch.transcript(i)] == [message.content.to_int() for message in tap.messages]
+
+  assert protocol.secrets() == chained.secrets()
+
+def test_checkpoints_are_kept_when_blocks_go_past_them():
+  seed_stream(5)
+  chain = Chain(emap.EMAPProtocol(), np.random.default_rng(1), checkpoint = 10)
+
+  for n in [6, 6, 3, 12, 20]:
+    chain.next(n)
+
+  assert [session for session, _ in chain.checkpoints] == [12, 27, 47]
+
+def test_checkpoints_resume_the_chain():
+  seed_stream(5)
+  protocol = emap.EMAPProtocol()
+  chain = Chain(protocol, np.random.default_rng(1), block_size = 10, checkpoint = 10)
+  chain.run(30)
+
+  assert [session for session, _ in chain.checkpoints] == [10, 20, 30]
+
+  # The nonces of the first 20 sessions are skipped, two per session
+  rng = np.random.default_rng(1)
+  for _ in range(4):
+    random_rows(10, emap.MESSAGE_SIZE, rng)
+
+  resumed = emap.EMAPProtocol()
+  resumed.restore(chain.checkpoints[1][1])
+  resumed.run_chain(10, rng)
+
+  assert resumed.secrets() == chain.checkpoints[2][1] == protocol.secrets()
+
+class Recorder(ChainObserver):
+
+  def __init__(self):
+    self.blocks = []
+    self.checkpoints = []
+
+  def on_sessions(self, first: int, batch):
+    self.blocks.append((first, batch.size))
+
+  def on_checkpoint(self, session: int, secrets: dict):
+    self.checkpoints.append(session)
+
+def test_attack_checkpoints_at_every_multiple(tmp_path):
+  path = str(tmp_path / 'checkpoints.jsonl')
+  recorder = Recorder()
+
+  attack = LinearAttack(emap.EMAPProtocol(), 48, 1, seed = 3, chain = True, batch_size = 16, checkpoint = 20, observers = [recorder, CheckpointWriter(path)])
+  attack.run('ID')
+
+  assert [session for session, _ in attack.sessions.checkpoints] == [20, 40]
+  assert recorder.checkpoints == [20, 40]
+  assert recorder.blocks == [(0, 16), (16, 4), (20, 16), (36, 4), (40, 8)]
+
+  session, secrets = load_checkpoint(path)
+  assert session == 40 and secrets == attack.sessions.checkpoints[1][1]
+
+def test_chain_resumes_from_checkpoint_file(tmp_path):
+  path = str(tmp_path / 'checkpoints.jsonl')
+
+  seed_stream(5)
+  chain = Chain(emap.EMAPProtocol(), np.random.default_rng(1), checkpoint = 10, observers = [CheckpointWriter(path)])
+  chain.run(25)
+
+  resumed = Chain(emap.EMAPProtocol(), np.random.default_rng(1))
+  resumed.resume(path)
+
+  assert resumed.session == 20
+  assert resumed.protocol.secrets() == chain.checkpoints[-1][1]
+
+def test_taps_see_chained_sessions():
+  seed_stream(5)
+  tap = Tap()
+  chain = Chain(emap.EMAPProtocol(), np.random.default_rng(1), block_size = 4, observers = [TranscriptObserver(tap)])
+
+  batches = [chain.next(4), chain.next(3)]
+
+  expected = [message.content.to_int() for batch in batches for i in range(batch.size) for message in batch.transcript(i)]
+  assert [message.content.to_int() for message in tap.messages] == expected
+  assert len(tap.messages) == 7 * 4
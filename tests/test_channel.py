@@ -0,0 +1,83 @@
+from base.channel import Channel
+from base.listener import Listener
+from base.message import Message, MessageKind
+from base.reader import Reader
+from base.tag import Tag
+from util.bitvector import vector
+
+
+class Recorder(object):
+
+  def __init__(self):
+    self.received = []
+
+  def handle(self, name: str):
+    return lambda message: self.received.append((name, message.label))
+
+class Tap(Listener):
+
+  def __init__(self, recorder: Recorder, name: str):
+    self.recorder = recorder
+    self.name = name
+
+  def receive(self, message: Message):
+    self.recorder.received.append((self.name, message.label))
+
+class Participant(Listener):
+
+  def __init__(self, recorder: Recorder, name: str, routes: list):
+    self.handlers = {key: recorder.handle(f'{name}:{key[1]}') for key in routes}
+
+  def routes(self) -> dict:
+    return self.handlers
+
+def message(kind: MessageKind, label: str) -> Message:
+  return Message(label, kind, vector(0, 8))
+
+def test_messages_reach_the_handlers_of_their_kind_and_label():
+  recorder = Recorder()
+  channel = Channel('test')
+
+  channel.listen(Participant(recorder, 'reader', [(MessageKind.TAG_TO_READER, 'IDS'), (MessageKind.TAG_TO_READER, 'DE')]))
+  channel.listen(Tap(recorder, 'tap'))
+  channel.listen(Participant(recorder, 'tag', [(MessageKind.READER_TO_TAG, 'hello'), (MessageKind.READER_TO_TAG, 'DE')]))
+  channel.listen(Tap(recorder, 'other tap'))
+
+  channel.send(message(MessageKind.READER_TO_TAG, 'hello'))
+  channel.send(message(MessageKind.TAG_TO_READER, 'DE'))
+  channel.send(message(MessageKind.READER_TO_TAG, 'DE'))
+  channel.send(message(MessageKind.TAG_TO_READER, 'unknown'))
+
+  # Handlers and taps in the order their listeners were added, and taps get everything
+  assert recorder.received == [
+    ('tap', 'hello'), ('tag:hello', 'hello'), ('other tap', 'hello'),
+    ('reader:DE', 'DE'), ('tap', 'DE'), ('other tap', 'DE'),
+    ('tap', 'DE'), ('tag:DE', 'DE'), ('other tap', 'DE'),
+    ('tap', 'unknown'), ('other tap', 'unknown')
+  ]
+
+def test_only_listeners_are_added():
+  channel = Channel('test')
+  channel.listen(object())
+
+  assert channel.listeners == [] and channel.table == {} and channel.taps == ()
+
+def test_participants_route_the_labels_of_the_other_side():
+  class TestReader(Reader):
+    HANDLERS = {'IDS': 'handle_IDS_message'}
+
+    def handle_IDS_message(self, message: Message):
+      pass
+
+  class TestTag(Tag):
+    HANDLERS = {'hello': 'handle_hello_message'}
+
+    def handle_hello_message(self, message: Message):
+      pass
+
+  channel = Channel('test')
+  reader = TestReader('test', channel)
+  tag = TestTag('test', channel)
+
+  assert reader.routes() == {(MessageKind.TAG_TO_READER, 'IDS'): reader.handle_IDS_message}
+  assert tag.routes() == {(MessageKind.READER_TO_TAG, 'hello'): tag.handle_hello_message}
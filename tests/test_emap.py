@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from protocols.emap import MESSAGE_SIZE, parity, parity_int, parity_rows, update, update_int
+from util.bitvector import BitarrayVector, IntVector, NumpyVector, bit_count, use_backend
+from util.rng import random_bits, random_rows, seed_stream
+
+
+def chunk_parities(value: int, length: int, n: int) -> int:
+  """Parities (set if even) of the chunks of n bits, one chunk at a time.
+  """
+  padded = length + (-length) % n
+  value <<= padded - length
+
+  parities = 0
+  for shift in range(padded - n, -1, -n):
+    parities = (parities << 1) | (1 - bit_count((value >> shift) & ((1 << n) - 1)) % 2)
+
+  return parities
+
+@pytest.mark.parametrize('n', [3, 4, 5])
+def test_parity_int_matches_chunks(n):
+  seed_stream(1)
+
+  for length in range(1, 100):
+    for value in [0, (1 << length) - 1] + [random_bits(length).to_int() for _ in range(20)]:
+      assert parity_int(value, length, n) == chunk_parities(value, length, n)
+
+def test_parity_rows_match_parity_int():
+  rng = np.random.default_rng(1)
+
+  for length in range(1, 100):
+    rows = random_rows(8, length, rng)
+    parities = parity_rows(rows)
+
+    assert len(parities) == (length + 3) // 4
+
+    for i in range(8):
+      assert parities.row(i).to_int() == parity_int(rows.row(i).to_int(), length)
+
+@pytest.mark.parametrize('backend', [IntVector, BitarrayVector])
+def test_update_matches_update_int(backend):
+  use_backend(backend)
+  seed_stream(3)
+
+  for _ in range(50):
+    values = [random_bits(MESSAGE_SIZE) for _ in range(8)]
+
+    # The vectors of the simulation, updated with the parities of their nibbles
+    ID, IDS, K1, K2, K3, K4, n1, n2 = values
+    idx = MESSAGE_SIZE // 2
+    expected = (
+      IDS ^ n2 ^ K1,
+      K1 ^ n2 ^ (ID[:idx] + parity(K4) + parity(K3)),
+      K2 ^ n2 ^ (parity(K1) + parity(K4) + ID[idx:]),
+      K3 ^ n1 ^ (ID[:idx] + parity(K4) + parity(K2)),
+      K4 ^ n1 ^ (parity(K3) + parity(K1) + ID[idx:])
+    )
+
+    assert update(*values) == expected
+    assert update_int(*(value.to_int() for value in values)) == tuple(value.to_int() for value in expected)
+
+def test_update_rows_match_update_int():
+  rng = np.random.default_rng(0)
+  rows = [random_rows(64, MESSAGE_SIZE, rng) for _ in range(8)]
+  updated = update(*rows)
+
+  assert all(isinstance(value, NumpyVector) for value in updated)
+
+  for i in range(64):
+    expected = update_int(*(value.row(i).to_int() for value in rows))
+    assert tuple(value.row(i).to_int() for value in updated) == expected
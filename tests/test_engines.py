@@ -0,0 +1,131 @@
+import itertools
+
+import numpy as np
+import pytest
+from attacks.bias import BiasAttack, BiasSummary
+from attacks.engines import NumpyEngine, PythonEngine, combinations, complements, describe
+from attacks.linear import LinearAttack
+from base.operators import OperatorKind
+from protocols.emap import EMAPProtocol
+from util.rng import random_bits, seed_stream
+
+
+@pytest.mark.parametrize('max_combinations', [0, -1])
+def test_no_combinations_below_one_part(max_combinations):
+  assert list(combinations(['a', 'not_a', 'b', 'not_b'], max_combinations)) == []
+
+@pytest.mark.parametrize('max_combinations', [1, 2, 3])
+def test_combinations_have_at_most_max_parts(max_combinations):
+  keys = ['a', 'b', 'c', 'd', 'not_a', 'not_b', 'not_c', 'not_d']
+  assert max(len(elements) for elements, operators in combinations(keys, max_combinations)) == max_combinations
+
+@pytest.mark.parametrize('engine_class', [PythonEngine, NumpyEngine])
+def test_attack_without_combinations_has_no_results(engine_class):
+  assert len(LinearAttack(EMAPProtocol(), 4, 0, engine = engine_class(), seed = 1).run('ID')) == 0
+
+def test_bias_attack_without_combinations_has_no_results():
+  assert len(BiasAttack(EMAPProtocol(), 4, 0, seed = 1).run('ID')) == 0
+
+def truth_tables(n: int) -> dict:
+  """Returns the truth tables of n parts and their negations, as bit masks over every assignment of the parts.
+  """
+  full = (1 << (1 << n)) - 1
+  tables = {}
+
+  for i in range(n):
+    key = chr(ord('a') + i)
+    tables[key] = sum(1 << x for x in range(1 << n) if (x >> i) & 1)
+    tables[f'not_{key}'] = full ^ tables[key]
+
+  return tables
+
+def truth_table(elements: tuple, operators: tuple, tables: dict) -> int:
+  value = tables[elements[0]]
+
+  for operator, element in zip(operators, elements[1:]):
+    value = OperatorKind(operator).operator.apply(value, tables[element])
+
+  return value
+
+@pytest.mark.parametrize('n', [3, 4, 5])
+def test_combinations_are_every_distinct_expression_once(n):
+  tables = truth_tables(n)
+  keys = [key for key in tables if not key.startswith('not_')]
+  keys += [f'not_{key}' for key in keys]
+
+  generated = {}
+  for elements, operators in combinations(keys, n):
+    generated.setdefault(len(elements), []).append(truth_table(elements, operators, tables))
+
+  # Every ordering of distinct parts, negation and sequence of operators, by brute force
+  operator_values = [operator.value for operator in OperatorKind.all()]
+
+  for length in range(1, n + 1):
+    expected = set()
+
+    for parts in itertools.permutations(keys[:n], length):
+      for negations in itertools.product([False, True], repeat = length):
+        elements = tuple(f'not_{part}' if negated else part for part, negated in zip(parts, negations))
+
+        for operators in itertools.product(operator_values, repeat = length - 1):
+          expected.add(truth_table(elements, operators, tables))
+
+    assert len(generated[length]) == len(set(generated[length]))
+    assert set(generated[length]) == expected
+
+@pytest.mark.parametrize('max_combinations', [1, 2, 3])
+def test_engines_agree(max_combinations):
+  seed_stream(2)
+  parts = {name: random_bits(24) for name in ['a', 'b', 'c', 'd', 'e']}
+  target = random_bits(24)
+
+  def evaluate(engine) -> dict:
+    similarities = {}
+
+    for descriptions, chunk in engine.chunks(parts, target, max_combinations):
+      similarities.update(zip(descriptions, chunk.tolist()))
+
+    return similarities
+
+  assert evaluate(PythonEngine(chunk_size = 100)) == evaluate(NumpyEngine(chunk_size = 100))
+
+@pytest.mark.parametrize('n', [3, 4])
+def test_complements_are_negations_of_the_rest(n):
+  tables = truth_tables(n)
+  keys = [key for key in tables if not key.startswith('not_')]
+  keys += [f'not_{key}' for key in keys]
+  full = (1 << (1 << n)) - 1
+
+  excluded = complements(keys, n)
+  values = {}
+
+  for elements, operators in combinations(keys, n):
+    values[describe(elements, operators)] = truth_table(elements, operators, tables)
+
+  kept = {values[description] for description in values if description not in excluded}
+
+  assert len(excluded) * 2 == len(values)
+  assert {full ^ values[description] for description in excluded} == kept
+
+def test_bias_attack_counts_each_combination_once():
+  attack = BiasAttack(EMAPProtocol(), 4, 2, seed = 1)
+  df = attack.run('ID')
+
+  excluded = set().union(*attack.complements.values())
+  assert len(excluded) > 0 and excluded.isdisjoint(df['combination'])
+
+@pytest.mark.parametrize('top', [1, 7, 50, 240, None])
+def test_bias_summary_selects_most_biased_bits(top):
+  rng = np.random.default_rng(0)
+  summary = BiasSummary()
+
+  for _ in range(5):
+    summary.add([(tuple(f'c{i}' for i in range(30)), rng.integers(0, 2, (30, 8)).astype(np.uint32))])
+
+  # Ties are broken by combination (as first seen) and bit
+  matches = summary.matches[:30].ravel().tolist()
+  pairs = sorted(range(len(matches)), key = lambda i: (-max(matches[i], 5 - matches[i]), i))[:top]
+
+  df = summary.to_frame(top)
+  assert list(df['combination']) == [f'c{i // 8}' for i in pairs]
+  assert list(df['bit']) == [i % 8 for i in pairs]
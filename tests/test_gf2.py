@@ -0,0 +1,38 @@
+import numpy as np
+from attacks.gf2 import GF2Summary
+
+
+def test_relations_are_exact_near_exact_or_left_out():
+  rng = np.random.default_rng(1)
+  sessions, length = 400, 8
+
+  parts = rng.integers(0, 2, (sessions, length), dtype = np.uint8)
+  targets = rng.integers(0, 2, (sessions, length), dtype = np.uint8)
+
+  # Bit 0 always is a[0] ^ a[1], bit 1 is a[2] but in a few sessions, the rest are random
+  targets[:, 0] = parts[:, 0] ^ parts[:, 1]
+  targets[:, 1] = parts[:, 2] ^ (rng.random(sessions) < 0.02)
+
+  summary = GF2Summary()
+  summary.keys = ['a']
+  summary.length = length
+  summary.rows = list(np.packbits(np.hstack([parts, np.ones((sessions, 1), dtype = np.uint8), targets]), axis = 1))
+  summary.iterations = sessions
+
+  df = summary.to_frame(16, np.random.default_rng(2)).set_index('bit')
+
+  assert list(df.index) == [0, 1]
+  assert df.loc[0, 'relation'] == 'a[0] ^ a[1]' and df.loc[0, 'exact']
+  assert df.loc[1, 'relation'] == 'a[2]' and not df.loc[1, 'exact'] and df.loc[1, 'agreement'] > 0.9
+
+def test_no_trials_without_enough_sessions():
+  rng = np.random.default_rng(1)
+  bits = rng.integers(0, 2, (30, 17), dtype = np.uint8)
+  bits[:, 8] = 1
+
+  summary = GF2Summary()
+  summary.keys = ['a']
+  summary.length = 8
+  summary.rows = list(np.packbits(bits, axis = 1))
+
+  assert len(summary.to_frame(16, np.random.default_rng(2))) == 0
@@ -0,0 +1,41 @@
+import pytest
+from attacks.linear import LinearAttack
+from pandas.testing import assert_frame_equal
+from protocols.emap import EMAPProtocol
+
+
+def sizes(attack: LinearAttack, iterations: int, block_size: int) -> list:
+  blocks = [('ID', first, min(block_size, iterations + 1 - first)) for first in range(1, iterations + 1, block_size)]
+  return [len(round_blocks) for round_blocks in attack.rounds(blocks)]
+
+def test_rounds_without_pruning():
+  assert sizes(LinearAttack(EMAPProtocol()), 160, 16) == [10]
+
+@pytest.mark.parametrize('prune, jobs, prune_round, expected', [
+  (16, 1, None, [1, 4, 4, 1]),
+  (20, 1, None, [2, 4, 4]),
+  (16, 8, None, [1, 8, 1]),
+  (16, 8, 2, [1, 2, 2, 2, 2, 1]),
+  (1000, 1, None, [10])
+])
+def test_first_round_ends_after_warmup(prune, jobs, prune_round, expected):
+  attack = LinearAttack(EMAPProtocol(), prune = prune, jobs = jobs, prune_round = prune_round)
+  assert sizes(attack, 160, 16) == expected
+
+def test_pruned_results_do_not_depend_on_jobs():
+  def run(jobs: int):
+    return LinearAttack(EMAPProtocol(), 96, 2, seed = 9, prune = 16, prune_round = 2, jobs = jobs).run('ID')
+
+  assert_frame_equal(run(1), run(2))
+
+def test_pruning_keeps_biased_combinations():
+  attack = LinearAttack(EMAPProtocol(), 64, 2, seed = 3, prune = 16, prune_round = 2)
+  results = attack.run('IDS').set_index('combination')
+
+  # IDS is sent in clear, while D hides it behind the nonce n2
+  assert 'IDS_0' not in attack.exclude
+  assert results.loc['IDS_0', 'mean'] == 96
+  assert results.loc['IDS_0', 'pruned'] == 0
+
+  assert 'DE_0 ^ IDS_0' in attack.exclude
+  assert results.loc['DE_0 ^ IDS_0', 'pruned'] > 0
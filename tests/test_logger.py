@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from attacks.bias import BiasAttack
+from attacks.engines import NumpyEngine
+from base.corpus import Corpus
+from protocols.emap import EMAPProtocol
+from util.logger import JsonSink, Logger, LogLevel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = '''
+from util.logger import ForceLogger, Logger, LogLevel
+Logger(LogLevel.ATTACK, 'Test', 'logger').warn('dropped')
+ForceLogger('Test', 'forced').warn('forced {}', 1)
+ForceLogger('Test', 'forced').log('forced {}', 2)
+Logger(LogLevel.ATTACK, 'Test', 'logger').error('error')
+'''
+
+def test_forced_messages_are_printed_when_optimized():
+  output = subprocess.run([sys.executable, '-O', '-c', SCRIPT], cwd = ROOT, capture_output = True, text = True, check = True).stdout
+
+  assert 'dropped' not in output
+  assert 'forced 1' in output and 'forced 2' in output
+  assert 'error' in output
+
+def read_lines(path: str) -> list:
+  with open(path) as f:
+    return [json.loads(line) for line in f]
+
+def test_json_sink_with_jobs(tmp_path):
+  path = str(tmp_path / 'attack.jsonl')
+  subprocess.run([sys.executable, '-W', 'ignore', 'rfid.py', '-a', 'LINEAR', '-t', 'ID', '-l', 'attack', '-i', '64', '-b', '8', '-j', '2', '-s', '1', '--log-file', path, 'EMAP'], cwd = ROOT, capture_output = True, check = True)
+
+  # Every line is a whole object, whichever process wrote it
+  lines = read_lines(path)
+  messages = [line['message'] for line in lines]
+
+  assert all(set(line) == {'time', 'pid', 'source', 'id', 'level', 'severity', 'message'} for line in lines)
+  assert len({line['pid'] for line in lines}) > 1
+  assert messages[-1] == 'Finished running'
+
+  # Workers logged every iteration once
+  counted = [message for message in messages if message.startswith('(iter') and 'Evaluated' in message]
+  assert len(counted) == 64
+
+def test_errors_are_written_and_raised(tmp_path):
+  path = str(tmp_path / 'errors.jsonl')
+  sink = Logger._sink
+
+  Logger.set_sink(JsonSink(path))
+  Logger.set_level(LogLevel.ATTACK)
+
+  logger = Logger(LogLevel.ATTACK, 'Test', 'logger')
+  logger.error('error {} of {}', 1, 2)
+
+  with pytest.raises(KeyError):
+    logger.error('error {}', 3, exception = KeyError(3))
+
+  # Disabled errors still raise
+  with pytest.raises(KeyError):
+    Logger(LogLevel.TAG, 'Test', 'tag').error('error {}', 4, exception = KeyError(4))
+
+  Logger.set_sink(sink)
+
+  assert [(line['severity'], line['message']) for line in read_lines(path)] == [('error', 'error 1 of 2'), ('error', 'error 3')]
+
+def test_invalid_options_raise(tmp_path):
+  with pytest.raises(ValueError):
+    BiasAttack(EMAPProtocol(), engine = NumpyEngine())
+
+  path = tmp_path / 'invalid.corpus'
+  path.write_bytes(b'not a corpus')
+
+  with pytest.raises(ValueError):
+    Corpus(str(path))
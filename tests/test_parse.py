@@ -0,0 +1,31 @@
+import sys
+
+import pytest
+from util.parse import parse_args, parse_bench_args
+
+
+def parse(monkeypatch, parser, *argv):
+  monkeypatch.setattr(sys, 'argv', ['rfid.py'] + list(argv))
+  return parser()
+
+@pytest.mark.parametrize('argv', [
+  ['-i', '0'], ['-s', '-1'], ['-c', '0'], ['-b', '-1'], ['-j', '0'], ['--top', '0'],
+  ['--checkpoint', '5'], ['-a', 'LINEAR', '--checkpoint', '5'], ['--chain', '--checkpoint-file', '/tmp/checkpoints.jsonl'],
+  ['--prune', '0'], ['--prune-band', '-1'],
+  ['--population', '-5'], ['--loss', '1.5'], ['--loss', '-0.1'],
+  ['--concurrency', '0'], ['--latency', '-1'], ['--jitter', '-0.5'],
+  ['-a', 'BIAS', '-e', 'NUMPY'], ['-a', 'GF2', '--prune', '4'], ['-a', 'BIAS', '--prune-band', '1'], ['-a', 'GF2', '--prune-round', '2']
+])
+def test_invalid_options_are_rejected(monkeypatch, argv):
+  with pytest.raises(SystemExit):
+    parse(monkeypatch, parse_args, *argv, 'EMAP')
+
+def test_defaults_of_attack_options(monkeypatch):
+  args = parse(monkeypatch, parse_args, '-a', 'BIAS', 'EMAP')
+
+  assert args.engine == 'PYTHON' and args.prune_band == 2.0
+
+def test_bench_options(monkeypatch):
+  args = parse(monkeypatch, parse_bench_args, '-r', '2', '-f', 'population/*')
+
+  assert args.repeat == 2 and args.filter == ['population/*']
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from base.population import BackEnd, Population
+from protocols.dp import DPProtocol
+from protocols.emap import EMAPProtocol
+from util.bits import pack_ints
+from util.bitvector import vector
+
+LENGTH = 16
+NAMES = ('ID', 'IDS', 'K')
+
+
+def backend(*tags: tuple) -> BackEnd:
+  table = np.stack([pack_ints(secrets, LENGTH) for secrets in tags])
+  return BackEnd(table, LENGTH, NAMES, 'IDS')
+
+def test_identify():
+  reader = backend((1, 10, 100), (2, 20, 200))
+
+  assert reader.identify(20) == (1, (2, 20, 200))
+  assert reader.identify(10) == (0, (1, 10, 100))
+  assert reader.identify(2) == (None, None)
+  assert reader.linear_search(20) == 1
+  assert reader.linear_search(2) is None
+
+def test_commit():
+  reader = backend((1, 10, 100), (2, 20, 200))
+  reader.commit(0, (1, 11, 101))
+
+  assert reader.identify(11) == (0, (1, 11, 101))
+  assert reader.identify(10) == (None, None)
+  assert reader.table_pseudonym(0) == 11
+
+def test_recover_updated_tag():
+  reader = backend((1, 10, 100), (2, 20, 200))
+  reader.propose(0, (1, 11, 101))
+
+  # The tag updated: the proposed secrets replace the old ones
+  assert reader.identify(11) == (0, (1, 11, 101))
+  assert reader.recovered == 1
+  assert reader.identify(10) == (None, None)
+  assert reader.secrets(0) == (1, 11, 101)
+
+def test_recover_old_tag():
+  reader = backend((1, 10, 100), (2, 20, 200))
+  reader.propose(0, (1, 11, 101))
+
+  # The tag did not update: the proposed secrets are forgotten
+  assert reader.identify(10) == (0, (1, 10, 100))
+  assert reader.recovered == 0
+  assert reader.identify(11) == (None, None)
+  assert reader.pending == {}
+
+@pytest.mark.parametrize('protocol_class', [EMAPProtocol, DPProtocol])
+@pytest.mark.parametrize('loss', [0.0, 0.5])
+def test_population(protocol_class, loss):
+  population = Population(protocol_class(), 50, np.random.default_rng(1), loss)
+  population.run(400)
+
+  assert population.verify()
+  assert (population.backend.recovered > 0) == (loss > 0)
+
+def test_population_unknown_tag():
+  population = Population(EMAPProtocol(), 10, np.random.default_rng(1))
+  reader = population.protocol.reader
+
+  assert not reader.identify(vector(population.backend.table_pseudonym(0) ^ 1, population.length))
+  assert reader.identify(vector(population.backend.table_pseudonym(0), population.length))
+  assert reader.identified == 0
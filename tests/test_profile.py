@@ -0,0 +1,104 @@
+import pickle
+
+import pytest
+import util.profile
+from util.profile import Profile
+
+
+class Clock(object):
+  """Wall and CPU time that only advance when told to (CPU at half the pace).
+  """
+
+  def __init__(self):
+    self.now = 0.0
+
+  def advance(self, seconds: float):
+    self.now += seconds
+
+  def perf_counter(self) -> float:
+    return self.now
+
+  def process_time(self) -> float:
+    return self.now / 2
+
+@pytest.fixture
+def clock(monkeypatch):
+  clock = Clock()
+  monkeypatch.setattr(util.profile, 'time', clock)
+
+  return clock
+
+def test_nested_phases_only_keep_their_own_time(clock):
+  profile = Profile()
+
+  with profile.phase('outer', 1):
+    clock.advance(1)
+
+    with profile.phase('inner', 1):
+      clock.advance(2)
+
+      with profile.phase('innermost', 1):
+        clock.advance(4)
+
+    clock.advance(8)
+
+  # Phases are listed as they end
+  assert profile.phases == ['innermost', 'inner', 'outer']
+  assert profile.records[1] == {
+    'innermost_wall': 4, 'innermost_cpu': 2,
+    'inner_wall': 2, 'inner_cpu': 1,
+    'outer_wall': 9, 'outer_cpu': 4.5
+  }
+
+def test_timed_items_are_subtracted_from_the_enclosing_phase(clock):
+  profile = Profile()
+
+  def items():
+    for _ in range(3):
+      clock.advance(1)
+      yield
+
+  with profile.phase('fold', 2):
+    for _ in profile.timed('evaluation', 2, items()):
+      clock.advance(10)
+
+  # Finishing the generator is timed too
+  assert profile.records[2]['evaluation_wall'] == 3
+  assert profile.records[2]['fold_wall'] == 30
+
+def test_merge_adds_times_and_counters(clock):
+  profiles = [Profile(), Profile()]
+
+  for seconds, profile in enumerate(profiles, 1):
+    with profile.phase('simulation', 1):
+      clock.advance(seconds)
+
+    profile.count(1, sessions = 16)
+
+  with profiles[1].phase('prune', 2):
+    clock.advance(5)
+
+  profiles[0].merge(profiles[1])
+
+  assert profiles[0].phases == ['simulation', 'prune']
+  assert profiles[0].records == {
+    1: {'simulation_wall': 3, 'simulation_cpu': 1.5, 'sessions': 32},
+    2: {'prune_wall': 5, 'prune_cpu': 2.5}
+  }
+
+def test_disabled_profile_records_nothing(clock):
+  profile = Profile(enabled = False)
+
+  with profile.phase('simulation', 1):
+    clock.advance(1)
+
+  assert list(profile.timed('evaluation', 1, range(3))) == [0, 1, 2]
+  profile.count(1, sessions = 1)
+
+  assert profile.records == {} and profile.phases == []
+
+def test_pickled_profile_has_no_open_phases(clock):
+  profile = Profile()
+  profile.start()
+
+  assert pickle.loads(pickle.dumps(profile))._stack == []
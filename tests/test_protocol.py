@@ -0,0 +1,54 @@
+import pytest
+from base.listener import Listener
+from base.message import Message
+from protocols.dp import DPProtocol
+from protocols.emap import EMAPProtocol
+from util.rng import seed_stream
+
+PROTOCOLS = [EMAPProtocol, DPProtocol]
+
+
+class Tap(Listener):
+
+  def __init__(self):
+    self.messages = []
+
+  def receive(self, message: Message):
+    self.messages.append(message)
+
+def state(participant, names: tuple) -> dict:
+  return {name: getattr(participant, name) for name in names}
+
+@pytest.mark.parametrize('protocol_class', PROTOCOLS)
+def test_reset_draws_secrets_as_a_new_protocol(protocol_class):
+  seed_stream(3, 1)
+  expected = protocol_class()
+
+  seed_stream(3, 0)
+  protocol = protocol_class()
+  protocol.run()
+
+  seed_stream(3, 1)
+  protocol.reset()
+
+  # The tag starts over, and the reader only shares the keys given through the secure channel
+  assert state(protocol.tag, protocol.SECRETS + ('n1', 'n2')) == state(expected.tag, expected.SECRETS + ('n1', 'n2'))
+  assert state(protocol.reader, protocol.SECRETS + ('n1', 'n2')) == state(expected.reader, expected.SECRETS + ('n1', 'n2'))
+
+@pytest.mark.parametrize('protocol_class', PROTOCOLS)
+def test_reset_keeps_participants_and_listeners(protocol_class):
+  protocol = protocol_class()
+  channel, reader, tag = protocol.channel, protocol.reader, protocol.tag
+
+  tap = Tap()
+  channel.listen(tap)
+
+  for _ in range(3):
+    protocol.reset()
+    protocol.run()
+
+    assert protocol.verify()
+
+  assert (protocol.channel, protocol.reader, protocol.tag) == (channel, reader, tag)
+  assert channel.listeners == [reader, tag, tap]
+  assert len(tap.messages) == 3 * 4
@@ -0,0 +1,40 @@
+import numpy as np
+from attacks.summary import Summary
+from pandas.testing import assert_frame_equal
+
+
+def iterations(n: int) -> list:
+  rng = np.random.default_rng(4)
+
+  # Later iterations find combinations the earlier ones did not
+  return [[(tuple(f'c{j}' for j in range(10 + i)), rng.integers(0, 97, 10 + i))] for i in range(n)]
+
+def summarize(results: list) -> Summary:
+  summary = Summary()
+
+  for chunks in results:
+    summary.add(chunks)
+
+  summary.length = 96
+  return summary
+
+def test_merged_summaries_match_sequential_summary():
+  results = iterations(12)
+  expected = summarize(results)
+
+  merged = Summary()
+  for first in range(0, 12, 5):
+    merged.merge(summarize(results[first:first + 5]))
+
+  assert merged.iterations == expected.iterations
+  assert merged.descriptions == expected.descriptions
+  assert_frame_equal(merged.to_frame(), expected.to_frame())
+
+def test_rows_of_equal_chunks():
+  summary = Summary()
+  rows = summary.rows(('a', 'b', 'c'))
+
+  # An equal tuple built anew (which may even take the id of a collected one)
+  assert np.array_equal(summary.rows(tuple('abc')), rows)
+  assert np.array_equal(summary.rows(('c', 'd')), [2, 3])
+  assert summary.descriptions == ['a', 'b', 'c', 'd']
@@ -0,0 +1,52 @@
+import numpy as np
+from bitarray import bitarray
+
+# Number of set bits for every possible byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def pack(b: bitarray) -> np.ndarray:
+  """Packs a bitarray into a row of bytes (big endian, zero padded).
+
+  Args:
+      b (bitarray): The bits to pack
+
+  Returns:
+      np.ndarray: A uint8 array of ceil(len(b) / 8) elements
+  """
+  return np.frombuffer(b.tobytes(), dtype=np.uint8)
+
+def popcount(rows: np.ndarray) -> np.ndarray:
+  """Counts the set bits of each packed row.
+
+  Args:
+      rows (np.ndarray): A uint8 array of shape (..., bytes)
+
+  Returns:
+      np.ndarray: The number of set bits for each row
+  """
+  return POPCOUNT[rows].sum(axis=-1, dtype=np.int64)
+
+def pack_ints(values: list, size: int) -> np.ndarray:
+  """Packs integers of `size` bits into rows of bytes (as `pack` would pack their bits).
+
+  Args:
+      values (list): The integers (the first bit is the most significant)
+      size (int): Number of bits of each integer
+
+  Returns:
+      np.ndarray: A uint8 array of shape (len(values), ceil(size / 8))
+  """
+  n_bytes = (size + 7) // 8
+  shift = 8 * n_bytes - size
+
+  data = b''.join((value << shift).to_bytes(n_bytes, 'big') for value in values)
+  return np.frombuffer(data, dtype=np.uint8).reshape(len(values), n_bytes)
+
+def unpack_ints(rows: np.ndarray, size: int) -> list:
+  """Unpacks rows of bytes into integers of `size` bits (the inverse of `pack_ints`).
+  """
+  n_bytes = rows.shape[-1]
+  shift = 8 * n_bytes - size
+
+  data = np.ascontiguousarray(rows, dtype=np.uint8).tobytes()
+  return [int.from_bytes(data[i:i + n_bytes], 'big') >> shift for i in range(0, len(data), n_bytes)]
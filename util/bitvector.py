@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+from bitarray import bitarray
+
+from util.bits import pack, popcount
+
+
+def bit_count(value: int) -> int:
+  """Returns the number of set bits of a non-negative integer.
+  """
+  return bin(value).count('1')
+
+# Native popcount for Python 3.10+
+if hasattr(int, 'bit_count'):
+  bit_count = int.bit_count
+
+class BitVector(ABC):
+  """A fixed length vector of bits, with bitwise operators.
+
+  Bits are indexed from the first (most significant) one, as in a bitarray:
+  slicing returns a new vector, `+` concatenates and `count` returns the
+  number of set bits. Operands of bitwise operators must share the backend.
+
+  New vectors (e.g. random nonces) are created with the backend selected with
+  `use_backend`.
+  """
+
+  __slots__ = ()
+
+  @classmethod
+  @abstractmethod
+  def from_int(cls, value: int, length: int) -> 'BitVector':
+    """Creates a vector from the bits of an integer (the first bit is the most significant).
+    """
+    raise NotImplementedError
+
+  @abstractmethod
+  def to_int(self) -> int:
+    raise NotImplementedError
+
+  @abstractmethod
+  def __len__(self) -> int:
+    raise NotImplementedError
+
+  @abstractmethod
+  def __and__(self, other: 'BitVector') -> 'BitVector':
+    raise NotImplementedError
+
+  @abstractmethod
+  def __or__(self, other: 'BitVector') -> 'BitVector':
+    raise NotImplementedError
+
+  @abstractmethod
+  def __xor__(self, other: 'BitVector') -> 'BitVector':
+    raise NotImplementedError
+
+  @abstractmethod
+  def __invert__(self) -> 'BitVector':
+    raise NotImplementedError
+
+  def __eq__(self, other) -> bool:
+    if not isinstance(other, BitVector):
+      return NotImplemented
+
+    return len(self) == len(other) and self.to_int() == other.to_int()
+
+  __hash__ = None
+
+  def __getitem__(self, key: slice) -> 'BitVector':
+    start, stop, step = key.indices(len(self))
+    if step != 1:
+      raise IndexError('Only contiguous slices of bit vectors are supported')
+
+    length = max(0, stop - start)
+    return type(self).from_int((self.to_int() >> (len(self) - start - length)) & ((1 << length) - 1), length)
+
+  def __add__(self, other: 'BitVector') -> 'BitVector':
+    return type(self).from_int((self.to_int() << len(other)) | other.to_int(), len(self) + len(other))
+
+  def count(self) -> int:
+    """Returns the number of set bits.
+    """
+    return bit_count(self.to_int())
+
+  def pack(self) -> np.ndarray:
+    """Packs the vector into a row of bytes (see `util.bits.pack`).
+    """
+    length = len(self)
+    n_bytes = (length + 7) // 8
+
+    return np.frombuffer((self.to_int() << (8 * n_bytes - length)).to_bytes(n_bytes, 'big'), dtype = np.uint8)
+
+  def __str__(self) -> str:
+    return format(self.to_int(), f'0{len(self)}b') if len(self) > 0 else ''
+
+class BitarrayVector(BitVector):
+  """Bit vector backed by a bitarray.
+  """
+
+  __slots__ = ('bits',)
+
+  def __init__(self, bits: bitarray):
+    self.bits = bits
+
+  @classmethod
+  def from_int(cls, value: int, length: int) -> 'BitarrayVector':
+    n_bytes = (length + 7) // 8
+
+    bits = bitarray(0)
+    bits.frombytes((value << (8 * n_bytes - length)).to_bytes(n_bytes, 'big'))
+    return cls(bits[:length])
+
+  def to_int(self) -> int:
+    length = len(self.bits)
+    return int.from_bytes(self.bits.tobytes(), 'big') >> ((-length) % 8)
+
+  def __len__(self) -> int:
+    return len(self.bits)
+
+  def __and__(self, other: 'BitarrayVector') -> 'BitarrayVector':
+    return BitarrayVector(self.bits & other.bits)
+
+  def __or__(self, other: 'BitarrayVector') -> 'BitarrayVector':
+    return BitarrayVector(self.bits | other.bits)
+
+  def __xor__(self, other: 'BitarrayVector') -> 'BitarrayVector':
+    return BitarrayVector(self.bits ^ other.bits)
+
+  def __invert__(self) -> 'BitarrayVector':
+    return BitarrayVector(~ self.bits)
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, BitarrayVector):
+      return self.bits == other.bits
+
+    return BitVector.__eq__(self, other)
+
+  def __getitem__(self, key: slice) -> 'BitarrayVector':
+    return BitarrayVector(self.bits[key])
+
+  def __add__(self, other: BitVector) -> BitVector:
+    if isinstance(other, BitarrayVector):
+      return BitarrayVector(self.bits + other.bits)
+
+    return BitVector.__add__(self, other)
+
+  def count(self) -> int:
+    return self.bits.count(True)
+
+  def pack(self) -> np.ndarray:
+    return pack(self.bits)
+
+class IntVector(BitVector):
+  """Bit vector backed by a Python integer, using native big integer operations.
+  """
+
+  __slots__ = ('value', 'length')
+
+  def __init__(self, value: int, length: int):
+    self.value = value
+    self.length = length
+
+  @classmethod
+  def from_int(cls, value: int, length: int) -> 'IntVector':
+    return cls(value, length)
+
+  def to_int(self) -> int:
+    return self.value
+
+  def __len__(self) -> int:
+    return self.length
+
+  def __and__(self, other: 'IntVector') -> 'IntVector':
+    return IntVector(self.value & other.value, self.length)
+
+  def __or__(self, other: 'IntVector') -> 'IntVector':
+    return IntVector(self.value | other.value, self.length)
+
+  def __xor__(self, other: 'IntVector') -> 'IntVector':
+    return IntVector(self.value ^ other.value, self.length)
+
+  def __invert__(self) -> 'IntVector':
+    return IntVector(self.value ^ ((1 << self.length) - 1), self.length)
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, IntVector):
+      return self.length == other.length and self.value == other.value
+
+    return BitVector.__eq__(self, other)
+
+  def __getitem__(self, key: slice) -> 'IntVector':
+    start, stop, step = key.indices(self.length)
+    if step != 1:
+      raise IndexError('Only contiguous slices of bit vectors are supported')
+
+    length = max(0, stop - start)
+    return IntVector((self.value >> (self.length - start - length)) & ((1 << length) - 1), length)
+
+  def __add__(self, other: BitVector) -> 'IntVector':
+    if isinstance(other, IntVector):
+      return IntVector((self.value << other.length) | other.value, self.length + other.length)
+
+    return BitVector.__add__(self, other)
+
+  def count(self) -> int:
+    return bit_count(self.value)
+
+class NumpyVector(BitVector):
+  """Bit vector backed by packed rows (see `util.bits.pack`).
+
+  The rows may have leading dimensions, holding the same variable for many
+  sessions at once (e.g. in a batch), and operators apply to all of them.
+  Slices at byte boundaries are views of the rows.
+  """
+
+  __slots__ = ('bits', 'length')
+
+  def __init__(self, bits: np.ndarray, length: int):
+    self.bits = bits
+    self.length = length
+
+  @classmethod
+  def from_int(cls, value: int, length: int) -> 'NumpyVector':
+    return cls(IntVector(value, length).pack(), length)
+
+  def to_int(self) -> int:
+    return int.from_bytes(self.bits.tobytes(), 'big') >> ((-self.length) % 8)
+
+  def row(self, index: int) -> 'NumpyVector':
+    """Returns the vector of a single session (a view of its row).
+    """
+    return NumpyVector(self.bits[index], self.length)
+
+  def __len__(self) -> int:
+    return self.length
+
+  def __and__(self, other: 'NumpyVector') -> 'NumpyVector':
+    return NumpyVector(self.bits & other.bits, self.length)
+
+  def __or__(self, other: 'NumpyVector') -> 'NumpyVector':
+    return NumpyVector(self.bits | other.bits, self.length)
+
+  def __xor__(self, other: 'NumpyVector') -> 'NumpyVector':
+    return NumpyVector(self.bits ^ other.bits, self.length)
+
+  def __invert__(self) -> 'NumpyVector':
+    bits = ~ self.bits
+
+    # Padding bits stay clear
+    if self.length % 8 != 0:
+      bits[..., -1] &= np.uint8((0xff << (8 - self.length % 8)) & 0xff)
+
+    return NumpyVector(bits, self.length)
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, NumpyVector):
+      return self.length == other.length and np.array_equal(self.bits, other.bits)
+
+    return BitVector.__eq__(self, other)
+
+  def __getitem__(self, key: slice) -> BitVector:
+    start, stop, step = key.indices(self.length)
+
+    if step == 1 and start % 8 == 0 and (stop % 8 == 0 or stop == self.length) and stop >= start:
+      return NumpyVector(self.bits[..., start // 8:(stop + 7) // 8], stop - start)
+
+    return BitVector.__getitem__(self, key)
+
+  def __add__(self, other: BitVector) -> BitVector:
+    if isinstance(other, NumpyVector) and self.length % 8 == 0:
+      return NumpyVector(np.concatenate([self.bits, other.bits], axis = -1), self.length + other.length)
+
+    return BitVector.__add__(self, other)
+
+  def count(self) -> int:
+    return int(popcount(self.bits).sum())
+
+  def pack(self) -> np.ndarray:
+    return self.bits
+
+# Backend of the new vectors
+_backend = IntVector
+
+def use_backend(backend: type):
+  """Selects the backend (a subclass of BitVector) new vectors are created with.
+  """
+  global _backend
+  _backend = backend
+
+def get_backend() -> type:
+  return _backend
+
+def vector(value: int, length: int) -> BitVector:
+  """Creates a vector with the selected backend, from the bits of an integer.
+  """
+  return _backend.from_int(value, length)
+
+def cast(b: BitVector) -> BitVector:
+  """Returns a vector with the selected backend (the same one if it already is).
+  """
+  if isinstance(b, _backend):
+    return b
+
+  return _backend.from_int(b.to_int(), len(b))
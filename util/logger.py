@@ -1,3 +1,9 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
 from enum import Enum, Flag, auto
 
 __SPACE__ = 25
@@ -15,7 +21,8 @@ class LogLevel(Flag):
 
   @staticmethod
   def all():
-    return list(map(lambda element: element.name, LogLevel))
+    # Aliases (NONE, ALL, SIMPLE) are not iterated over since Python 3.11
+    return list(LogLevel.__members__.keys())
 
   @staticmethod
   def help_list() -> str:
@@ -32,65 +39,231 @@ class LogModifier(Enum):
   UNDERLINE = "\033[4m"
   END       = "\033[0m"
 
+class LogSink(object):
+  """Destination of the messages printed by loggers.
+  """
+
+  def write(self, logger: 'Logger', message: str, modifiers: list):
+    raise NotImplementedError
+
+  def flush(self):
+    pass
+
+  def close(self):
+    self.flush()
+
+  def after_fork(self):
+    pass
+
+class ConsoleSink(LogSink):
+  """Prints numbered messages to the console, with colors.
+  """
+
+  def __init__(self):
+    self.n = 1
+
+  def write(self, logger: 'Logger', message: str, modifiers: list):
+    l = len(logger.prefix + logger.id)
+    space = ' ' * (__SPACE__ - l)
+
+    mod = ''.join([mod.value for mod in modifiers])
+    end = LogModifier.END.value * len(modifiers)
+
+    print(f'{self.n:4d} [{logger.prefix}{space}{logger.id}] {mod}{message}{end}')
+
+    self.n = self.n + 1
+
+class JsonSink(LogSink):
+  """Appends messages to a file as JSON lines, written in batches from a background thread.
+
+  Each line holds the time, the process, the source (prefix and id), the
+  level, the severity (log, warn, success or error) and the message. Worker
+  processes get a copy of the sink that appends to the same file, and whole
+  batches are written at once, so lines of different processes never mix.
+  """
+
+  _SEVERITIES = {
+    LogModifier.YELLOW: 'warn',
+    LogModifier.GREEN: 'success',
+    LogModifier.RED: 'error'
+  }
+
+  def __init__(self, path: str, batch_size: int = 4096, truncate: bool = True):
+    self.path = path
+    self.batch_size = batch_size
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if truncate else 0)
+    self.fd = os.open(path, flags, 0o644)
+
+    self.start()
+    atexit.register(self.close)
+
+  def __getstate__(self) -> dict:
+    return {'path': self.path, 'batch_size': self.batch_size}
+
+  def __setstate__(self, state: dict):
+    JsonSink.__init__(self, state['path'], state['batch_size'], truncate = False)
+
+  def start(self):
+    self.lines = []
+    self.batches = queue.Queue()
+    self.writer = threading.Thread(target = self.write_batches, daemon = True)
+    self.writer.start()
+
+  def write(self, logger: 'Logger', message: str, modifiers: list):
+    severity = next((JsonSink._SEVERITIES[mod] for mod in modifiers if mod in JsonSink._SEVERITIES), 'log')
+
+    self.lines.append(json.dumps({
+      'time': time.time(),
+      'pid': os.getpid(),
+      'source': logger.prefix,
+      'id': logger.id,
+      'level': logger.level.name,
+      'severity': severity,
+      'message': str(message)
+    }) + '\n')
+
+    if len(self.lines) >= self.batch_size:
+      self.batches.put(self.lines)
+      self.lines = []
+
+  def write_batches(self):
+    while True:
+      lines = self.batches.get()
+
+      if lines is not None:
+        os.write(self.fd, ''.join(lines).encode())
+
+      self.batches.task_done()
+
+      if lines is None:
+        break
+
+  def flush(self):
+    """Hands the buffered lines to the writer thread and waits until everything is written.
+    """
+    if len(self.lines) > 0:
+      self.batches.put(self.lines)
+      self.lines = []
+
+    self.batches.join()
+
+  def close(self):
+    if self.fd is None:
+      return
+
+    self.flush()
+    self.batches.put(None)
+    self.writer.join()
+
+    os.close(self.fd)
+    self.fd = None
+    atexit.unregister(self.close)
+
+  def after_fork(self):
+    # The writer thread is not copied, and the parent writes its own lines
+    self.start()
+
 class Logger(object):
-  n = 1
+  """Prints messages of a level, if it is enabled.
+
+  Messages are only formatted once the level is known to be enabled: they
+  can be given as a format string and its arguments (`str.format`) or as a
+  callable returning the message, so disabled logs cost a single check.
+  Running with `python -O` compiles out everything but errors and the
+  messages of `ForceLogger`.
+  """
+
   _level = LogLevel.ALL
+  _sink = ConsoleSink()
+
+  # Replaced whenever the level changes, so loggers know to recompute `enabled`
+  _generation = object()
 
   def __init__(self, level: LogLevel, prefix: str, id: str):
     self.level = level
     self.prefix = prefix
     self.id = id
 
-  def log(self, message: str, modifiers = []):
-    if (self.level & Logger._level) != self.level:
-      return
+    self._enabled = False
+    self._checked = None
 
-    l = len(self.prefix + self.id)
-    space = ' ' * (__SPACE__ - l)
+  @staticmethod
+  def set_level(level: LogLevel):
+    Logger._level = level
+    Logger._generation = object()
 
-    mod = ''.join([mod.value for mod in modifiers])
-    end = LogModifier.END.value * len(modifiers)
+  @staticmethod
+  def set_sink(sink: LogSink):
+    """Replaces the sink messages are written to, closing the previous one.
+    """
+    if sink is not Logger._sink:
+      Logger._sink.close()
+
+    Logger._sink = sink
+
+  @staticmethod
+  def flush():
+    Logger._sink.flush()
+
+  def is_enabled(self) -> bool:
+    return (self.level & Logger._level) == self.level
+
+  @property
+  def enabled(self) -> bool:
+    """Whether the messages of this logger are printed, only recomputed when the level changes.
+    """
+    if self._checked is not Logger._generation:
+      self._enabled = self.is_enabled()
+      self._checked = Logger._generation
 
-    print(f'{Logger.n:4d} [{self.prefix}{space}{self.id}] {mod}{message}{end}')
+    return self._enabled
 
-    Logger.n = Logger.n + 1
+  def log(self, message, *args, modifiers = []):
+    if self.enabled:
+      self._print(message, args, modifiers)
 
-  def warn(self, message: str):
-    self.log(message, modifiers = [LogModifier.YELLOW])
+  def _print(self, message, args: tuple, modifiers: list):
+    if callable(message):
+      message = message()
+    elif len(args) > 0:
+      message = message.format(*args)
 
-  def success(self, message: str):
-    self.log(message, modifiers = [LogModifier.GREEN])
+    Logger._sink.write(self, message, modifiers)
+
+  def warn(self, message, *args):
+    self.log(message, *args, modifiers = [LogModifier.YELLOW])
+
+  def success(self, message, *args):
+    self.log(message, *args, modifiers = [LogModifier.GREEN])
+
+  def error(self, message, *args, exception: Exception = None):
+    if self.enabled:
+      self._print(message, args, [LogModifier.RED, LogModifier.BOLD])
 
-  def error(self, message: str, exception: Exception = None):
-    self.log(message, modifiers = [LogModifier.RED, LogModifier.BOLD])
     if exception is not None:
       raise exception
 
 class ForceLogger(Logger):
+  """Logger whose messages are printed at every level but NONE.
+  """
 
   def __init__(self, prefix: str, id: str):
     Logger.__init__(self, LogLevel.ALL, prefix, id)
 
-  def log(self, message: str, modifiers = []):
-    prev_level = Logger._level
-    Logger._level = LogLevel.ALL if prev_level != LogLevel.NONE else prev_level
-    super().log(message, modifiers)
-    Logger._level = prev_level
-
-  def warn(self, message: str):
-    prev_level = Logger._level
-    Logger._level = LogLevel.ALL if prev_level != LogLevel.NONE else prev_level
-    super().warn(message)
-    Logger._level = prev_level
-
-  def success(self, message: str):
-    prev_level = Logger._level
-    Logger._level = LogLevel.ALL if prev_level != LogLevel.NONE else prev_level
-    super().success(message)
-    Logger._level = prev_level
-
-  def error(self, message: str, exception: Exception = None):
-    prev_level = Logger._level
-    Logger._level = LogLevel.ALL if prev_level != LogLevel.NONE else prev_level
-    super().error(message, exception)
-    Logger._level = prev_level
+  def is_enabled(self) -> bool:
+    return Logger._level != LogLevel.NONE
+
+def _after_fork():
+  Logger._sink.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child = _after_fork)
+
+if not __debug__:
+  # Logging is compiled out, but errors and forced messages are still printed
+  def _log(self, message, *args, modifiers = []):
+    pass
+
+  ForceLogger.log = Logger.log
+  Logger.log = _log
@@ -20,6 +20,8 @@ class ProtocolKind(Enum):
 
 class AttackKind(Enum):
   LINEAR = 0
+  BIAS = 1
+  GF2 = 2
 
   @staticmethod
   def all():
@@ -29,6 +31,63 @@ class AttackKind(Enum):
   def help_list() -> str:
     return f'{{{", ".join(AttackKind.all())}}}'
 
+class EngineKind(Enum):
+  PYTHON = 0
+  NUMPY = 1
+
+  @staticmethod
+  def all():
+    return list(map(lambda element: element.name, EngineKind))
+
+  @staticmethod
+  def help_list() -> str:
+    return f'{{{", ".join(EngineKind.all())}}}'
+
+class BitsKind(Enum):
+  BITARRAY = 0
+  INT = 1
+  NUMPY = 2
+
+  @staticmethod
+  def all():
+    return list(map(lambda element: element.name, BitsKind))
+
+  @staticmethod
+  def help_list() -> str:
+    return f'{{{", ".join(BitsKind.all())}}}'
+
+def int_at_least(minimum: int):
+  """Returns an argument type for integers not below `minimum`.
+  """
+  def parse(value: str) -> int:
+    number = int(value)
+
+    if number < minimum:
+      raise argparse.ArgumentTypeError(f'{value} is below the minimum of {minimum}')
+
+    return number
+
+  # Named as int, for the messages of invalid values
+  parse.__name__ = 'int'
+  return parse
+
+def float_between(minimum: float, maximum: float = None):
+  """Returns an argument type for numbers from `minimum` to `maximum` (if given).
+  """
+  def parse(value: str) -> float:
+    number = float(value)
+
+    if number < minimum:
+      raise argparse.ArgumentTypeError(f'{value} is below the minimum of {minimum}')
+    if maximum is not None and number > maximum:
+      raise argparse.ArgumentTypeError(f'{value} is above the maximum of {maximum}')
+
+    return number
+
+  # Named as float, for the messages of invalid values
+  parse.__name__ = 'float'
+  return parse
+
 def get_path(path: str) -> str:
   if os.path.isdir(path):
     raise argparse.ArgumentTypeError(f'{path} is not a valid file')
@@ -96,9 +155,18 @@ def parse_args():
     required = False
   )
 
+  # Log file
+  parser.add_argument('--log-file',
+    type     = get_path,
+    default  = None,
+    help     = 'Write log messages to this file as JSON lines, in batches, instead of the console. Default = console',
+    metavar  = 'log_file',
+    required = False
+  )
+
   # Iterations
   parser.add_argument('-i', '--iterations',
-    type     = int,
+    type     = int_at_least(1),
     default  = 1,
     help     = 'Number of iterations to be run when doing an attack',
     metavar  = 'iterations',
@@ -107,11 +175,285 @@ def parse_args():
 
   # Log level
   parser.add_argument('-c', '--combinations',
-    type     = int,
+    type     = int_at_least(1),
     default  = 2,
     help     = 'Maximum umber of combinations to be created when running the attack',
     metavar  = 'combinations',
     required = False
   )
 
+  # Evaluation engine
+  parser.add_argument('-e', '--engine',
+    type     = str.upper,
+    choices  = EngineKind.all(),
+    default  = None,
+    help     = f'One of {EngineKind.help_list()}. Engine used to evaluate combinations. Default = PYTHON',
+    metavar  = 'engine',
+    required = False
+  )
+
+  # Batch size
+  parser.add_argument('-b', '--batch',
+    type     = int_at_least(0),
+    default  = 0,
+    help     = 'Number of sessions simulated at once when doing an attack. Default = 0 (one protocol run per iteration)',
+    metavar  = 'batch',
+    required = False
+  )
+
+  # Jobs
+  parser.add_argument('-j', '--jobs',
+    type     = int_at_least(1),
+    default  = 1,
+    help     = 'Number of processes running attack iterations in parallel. Default = 1',
+    metavar  = 'jobs',
+    required = False
+  )
+
+  # Seed
+  parser.add_argument('-s', '--seed',
+    type     = int_at_least(0),
+    default  = None,
+    help     = 'Seed for the keys and nonces of the protocol (or of every attack iteration), to reproduce a run. Default = random',
+    metavar  = 'seed',
+    required = False
+  )
+
+  # Top results
+  parser.add_argument('--top',
+    type     = int_at_least(1),
+    default  = None,
+    help     = 'Only keep the best top combinations in the results. Default = all',
+    metavar  = 'top',
+    required = False
+  )
+
+  # Pruning
+  parser.add_argument('--prune',
+    type     = int_at_least(1),
+    default  = None,
+    help     = 'Stop evaluating combinations that behave as random after this number of warm-up iterations. Default = never',
+    metavar  = 'warmup',
+    required = False
+  )
+
+  parser.add_argument('--prune-band',
+    type     = float_between(0),
+    default  = None,
+    help     = 'Distance in bits from random similarity (half the target) considered random when pruning. Default = 2',
+    metavar  = 'bits',
+    required = False
+  )
+
+  parser.add_argument('--prune-round',
+    type     = int_at_least(1),
+    default  = None,
+    help     = 'Blocks of iterations run between pruning decisions. Default = one per job, at least 4',
+    metavar  = 'blocks',
+    required = False
+  )
+
+  # Corpus
+  parser.add_argument('--record',
+    type     = get_path,
+    default  = None,
+    help     = 'Record the given iterations of the protocol (simulated in batches of -b sessions, 1024 by default) to this corpus file, instead of running it',
+    metavar  = 'corpus',
+    required = False
+  )
+
+  parser.add_argument('--corpus',
+    type     = get_path,
+    default  = None,
+    help     = 'Run the attack over the sessions recorded in this corpus file, instead of simulating the protocol',
+    metavar  = 'corpus',
+    required = False
+  )
+
+  # Chained sessions
+  parser.add_argument('--chain',
+    action   = 'store_true',
+    help     = 'Run the iterations as consecutive sessions of the same tag, whose secrets evolve, instead of independent ones',
+    required = False
+  )
+
+  parser.add_argument('--checkpoint',
+    type     = int_at_least(0),
+    default  = 0,
+    help     = 'Keep the secrets of chained sessions every this number of sessions. Default = 0 (never)',
+    metavar  = 'sessions',
+    required = False
+  )
+
+  parser.add_argument('--checkpoint-file',
+    type     = get_path,
+    default  = None,
+    help     = 'Write the checkpoints of chained sessions to this file, as JSON lines',
+    metavar  = 'checkpoint_file',
+    required = False
+  )
+
+  parser.add_argument('--resume',
+    type     = get_path,
+    default  = None,
+    help     = 'Continue chained sessions from the last checkpoint written to this file',
+    metavar  = 'checkpoint_file',
+    required = False
+  )
+
+  # Population
+  parser.add_argument('--population',
+    type     = int_at_least(1),
+    default  = 0,
+    help     = 'Run the iterations as sessions of random tags of a population of this size, served by one reader. Default = 0 (a single tag)',
+    metavar  = 'tags',
+    required = False
+  )
+
+  parser.add_argument('--loss',
+    type     = float_between(0, 1),
+    default  = 0.0,
+    help     = 'Probability that the last message of a session of the population is lost, desynchronizing the reader. Default = 0',
+    metavar  = 'probability',
+    required = False
+  )
+
+  # Concurrent sessions
+  parser.add_argument('--concurrency',
+    type     = int_at_least(1),
+    default  = 0,
+    help     = 'Run the iterations as sessions of different tags, with up to this number of them in flight on an event loop. Default = 0 (one after the other)',
+    metavar  = 'sessions',
+    required = False
+  )
+
+  parser.add_argument('--latency',
+    type     = float_between(0),
+    default  = 0.0,
+    help     = 'Latency of every hop of concurrent sessions, in milliseconds. Default = 0',
+    metavar  = 'ms',
+    required = False
+  )
+
+  parser.add_argument('--jitter',
+    type     = float_between(0),
+    default  = 0.0,
+    help     = 'Mean of the exponential jitter added to the latency of every hop, in milliseconds. Default = 0',
+    metavar  = 'ms',
+    required = False
+  )
+
+  # Profiling
+  parser.add_argument('--profile',
+    action   = 'store_true',
+    help     = 'Time the phases of the attack (simulation, parts, evaluation, ...) and count its work by iteration, and print them when it finishes',
+    required = False
+  )
+
+  parser.add_argument('--profile-file',
+    type     = get_path,
+    default  = None,
+    help     = 'Also run the attack under cProfile and dump its statistics to this file (implies --profile)',
+    metavar  = 'profile_file',
+    required = False
+  )
+
+  # Bit vector backend
+  parser.add_argument('--bits',
+    type     = str.upper,
+    choices  = BitsKind.all(),
+    default  = 'INT',
+    help     = f'One of {BitsKind.help_list()}. Backend of the bit vectors of protocols and attacks. Default = INT',
+    metavar  = 'backend',
+    required = False
+  )
+
+  args = parser.parse_args()
+
+  # The bias and GF2 attacks have their own way to evaluate combinations, and do not prune them
+  if args.attack in (AttackKind.BIAS.name, AttackKind.GF2.name):
+    options = {'-e': args.engine, '--prune': args.prune, '--prune-band': args.prune_band, '--prune-round': args.prune_round}
+    given = [option for option, value in options.items() if value is not None]
+
+    if len(given) > 0:
+      parser.error(f'{", ".join(given)} cannot be used with the {args.attack} attack')
+
+  # Checkpoints are only taken of chained sessions
+  if not args.chain:
+    options = {'--checkpoint': args.checkpoint > 0, '--checkpoint-file': args.checkpoint_file is not None, '--resume': args.resume is not None}
+    given = [option for option, value in options.items() if value]
+
+    if len(given) > 0:
+      parser.error(f'{", ".join(given)} can only be used with --chain')
+
+  if args.checkpoint_file is not None and args.checkpoint == 0:
+    parser.error('--checkpoint-file needs --checkpoint')
+
+  # Defaults of the options that are only given to some attacks
+  if args.engine is None:
+    args.engine = EngineKind.PYTHON.name
+  if args.prune_band is None:
+    args.prune_band = 2.0
+
+  return args
+
+def parse_bench_args():
+  parser = argparse.ArgumentParser(
+
+  )
+
+  # Output file
+  parser.add_argument('-o', '--output',
+    type     = get_path,
+    default  = None,
+    help     = 'Write the results of the benchmarks to this file as JSON',
+    metavar  = 'output',
+    required = False
+  )
+
+  # Baseline
+  parser.add_argument('--baseline',
+    type     = str,
+    default  = None,
+    help     = 'Compare the results with those in this JSON file (written with -o), failing if any regressed',
+    metavar  = 'baseline',
+    required = False
+  )
+
+  parser.add_argument('--threshold',
+    type     = float,
+    default  = 0.2,
+    help     = 'Fraction a result can be worse than the baseline before it is a regression. Default = 0.2',
+    metavar  = 'fraction',
+    required = False
+  )
+
+  # Benchmarks to run
+  parser.add_argument('-f', '--filter',
+    type     = str,
+    nargs    = '*',
+    default  = None,
+    help     = 'Only run the benchmarks whose names match one of these patterns (e.g. `analysis/*/NUMPY/*`). Default = all',
+    metavar  = 'pattern',
+    required = False
+  )
+
+  parser.add_argument('-r', '--repeat',
+    type     = int_at_least(1),
+    default  = 5,
+    help     = 'Number of times each benchmark is timed, keeping the best. Default = 5',
+    metavar  = 'repeat',
+    required = False
+  )
+
+  # Bit vector backend
+  parser.add_argument('--bits',
+    type     = str.upper,
+    choices  = BitsKind.all(),
+    default  = 'INT',
+    help     = f'One of {BitsKind.help_list()}. Backend of the bit vectors of protocols and attacks. Default = INT',
+    metavar  = 'backend',
+    required = False
+  )
+
   return parser.parse_args()
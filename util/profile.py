@@ -0,0 +1,186 @@
+import time
+
+from pandas import DataFrame
+
+
+class _Phase(object):
+  """Times a phase of an iteration while it is entered (see `Profile.phase`).
+  """
+
+  def __init__(self, profile: 'Profile', name: str, iteration: int):
+    self.profile = profile
+    self.name = name
+    self.iteration = iteration
+
+  def __enter__(self):
+    self.profile.start()
+
+  def __exit__(self, *exc):
+    self.profile.stop(self.name, self.iteration)
+
+class _Disabled(object):
+
+  def __enter__(self):
+    pass
+
+  def __exit__(self, *exc):
+    pass
+
+_DISABLED = _Disabled()
+
+class Profile(object):
+  """Wall and CPU time of the phases of a run, and counters of its work, by iteration.
+
+  Phases nest, and each one only keeps the time not spent in the phases
+  within it, so the times of all the phases add up to that of the run.
+  Work done lazily, by a generator, is timed as its items are consumed
+  (`timed`). Work that is not part of an iteration is kept as iteration 0.
+
+  A disabled profile records nothing, at the cost of a call per phase.
+  """
+
+  def __init__(self, enabled: bool = True):
+    self.enabled = enabled
+
+    # Counters and times (`<phase>_wall`, `<phase>_cpu`) of every iteration
+    self.records = {}
+    self.phases = []
+
+    # Start times of the phases entered, and the time spent in their inner phases
+    self._stack = []
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    state['_stack'] = []
+
+    return state
+
+  def record(self, iteration: int) -> dict:
+    record = self.records.get(iteration)
+
+    if record is None:
+      record = self.records[iteration] = {}
+
+    return record
+
+  def start(self):
+    self._stack.append([time.perf_counter(), time.process_time(), 0.0, 0.0])
+
+  def stop(self, name: str, iteration: int):
+    wall, cpu, inner_wall, inner_cpu = self._stack.pop()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    if name not in self.phases:
+      self.phases.append(name)
+
+    record = self.record(iteration)
+    record[f'{name}_wall'] = record.get(f'{name}_wall', 0.0) + wall - inner_wall
+    record[f'{name}_cpu'] = record.get(f'{name}_cpu', 0.0) + cpu - inner_cpu
+
+    if len(self._stack) > 0:
+      self._stack[-1][2] += wall
+      self._stack[-1][3] += cpu
+
+  def phase(self, name: str, iteration: int = 0):
+    """Returns a context manager timing the phase of the iteration.
+    """
+    if not self.enabled:
+      return _DISABLED
+
+    return _Phase(self, name, iteration)
+
+  def timed(self, name: str, iteration: int, items):
+    """Times the phase of the iteration while the items are generated.
+    """
+    if not self.enabled:
+      return items
+
+    return self._timed(name, iteration, iter(items))
+
+  def _timed(self, name: str, iteration: int, items):
+    while True:
+      self.start()
+
+      try:
+        item = next(items)
+      except StopIteration:
+        return
+      finally:
+        self.stop(name, iteration)
+
+      yield item
+
+  def count(self, iteration: int, **counters):
+    """Adds to the counters of the iteration.
+    """
+    if not self.enabled:
+      return
+
+    record = self.record(iteration)
+
+    for name, value in counters.items():
+      record[name] = record.get(name, 0) + value
+
+  def merge(self, other: 'Profile'):
+    for name in other.phases:
+      if name not in self.phases:
+        self.phases.append(name)
+
+    for iteration, other_record in other.records.items():
+      record = self.record(iteration)
+
+      for name, value in other_record.items():
+        record[name] = record.get(name, 0) + value
+
+  def take(self) -> 'Profile':
+    """Returns the records so far, and starts over.
+    """
+    profile = Profile(self.enabled)
+    profile.records, self.records = self.records, {}
+    profile.phases = list(self.phases)
+
+    return profile
+
+  def to_frame(self) -> DataFrame:
+    """Returns the counters and times of every iteration, one per row.
+    """
+    df = DataFrame.from_dict(self.records, orient = 'index').fillna(0).sort_index()
+    df.index.name = 'iteration'
+
+    return df
+
+  def table(self) -> list:
+    """Returns the lines of a table with the total and per iteration times of
+    every phase, and the counters.
+    """
+    df = self.to_frame()
+    iterations = df.drop(index = 0, errors = 'ignore')
+    n = max(len(iterations), 1)
+
+    total_wall = sum(df[f'{name}_wall'].sum() for name in self.phases)
+
+    lines = [f'{"Phase":<12} {"Wall (s)":>10} {"CPU (s)":>10} {"Wall":>7} {"Per iter (ms)":>14} {"Max iter (ms)":>14}']
+
+    for name in self.phases:
+      wall = df[f'{name}_wall']
+      line = f'{name:<12} {wall.sum():10.3f} {df[f"{name}_cpu"].sum():10.3f} {wall.sum() / max(total_wall, 1e-12):7.1%}'
+
+      # Phases of the whole run are not split by iteration
+      per_iteration = iterations[f'{name}_wall']
+      if per_iteration.sum() > 0:
+        line += f' {per_iteration.sum() / n * 1000:14.3f} {per_iteration.max() * 1000:14.3f}'
+      else:
+        line += f' {"-":>14} {"-":>14}'
+
+      lines.append(line)
+
+    lines.append(f'{"Counter":<12} {"Total":>10} {"Per iter":>10}')
+
+    for name in df.columns:
+      if name.endswith('_wall') or name.endswith('_cpu'):
+        continue
+
+      lines.append(f'{name:<12} {int(df[name].sum()):10d} {df[name].sum() / n:10.1f}')
+
+    return lines
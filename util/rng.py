@@ -0,0 +1,76 @@
+import random
+import secrets
+
+import numpy as np
+
+from util.bits import pack_ints
+from util.bitvector import BitVector, NumpyVector, vector
+
+_random = random.Random()
+
+def new_seed() -> int:
+  """Returns a fresh base seed from the system entropy source.
+  """
+  return secrets.randbits(32)
+
+def seed_stream(seed: int, stream: int = 0):
+  """Seeds the generator used by `random_bits` for a stream (e.g. an iteration) of a base seed.
+
+  Each (seed, stream) pair gives an independent, reproducible sequence,
+  regardless of the process it is used in.
+  """
+  _random.seed((seed << 64) | stream)
+
+def stream_generator(seed: int, stream: int = 0) -> np.random.Generator:
+  """Returns a NumPy generator for a stream of a base seed.
+  """
+  return np.random.default_rng([seed, stream])
+
+class SessionStreams(object):
+  """Sources of the sessions of consecutive iterations of a base seed, one per session.
+
+  Row k of every draw holds the bits `random_bits` would return in iteration
+  `first + k` (once seeded with `seed_stream`), so a session of the simulation
+  can be replayed by a batch kernel. Every session has its own generator, so
+  batches of the attacks are drawn from `stream_generator` instead.
+  """
+
+  def __init__(self, seed: int, first: int, n: int):
+    self.randoms = [random.Random((seed << 64) | stream) for stream in range(first, first + n)]
+
+  def rows(self, size: int) -> NumpyVector:
+    n_bytes = (size + 7) // 8
+
+    # The first `size` bits of the random bytes of every session, as in `random_bits`
+    values = [source.getrandbits(8 * n_bytes) >> (8 * n_bytes - size) for source in self.randoms]
+    return NumpyVector(pack_ints(values, size), size)
+
+def random_rows(n: int, size: int, rng: np.random.Generator = None) -> NumpyVector:
+  """Returns `n` random vectors of `size` bits at once, as the rows of a NumpyVector.
+
+  Args:
+      n (int): Number of vectors (e.g. one per session of a batch)
+      size (int): Length in bits of each vector
+      rng (np.random.Generator, optional): Source of the bits (e.g. from
+        `stream_generator`), or the `SessionStreams` of the n sessions
+  """
+  if isinstance(rng, SessionStreams):
+    return rng.rows(size)
+
+  rng = rng if rng is not None else np.random.default_rng()
+
+  bits = rng.integers(0, 256, (n, (size + 7) // 8), dtype = np.uint8)
+
+  # Padding bits stay clear
+  if size % 8 != 0:
+    bits[:, -1] &= np.uint8((0xff << (8 - size % 8)) & 0xff)
+
+  return NumpyVector(bits, size)
+
+def random_bits(size: int) -> BitVector:
+  """Returns `size` random bits, as a vector of the selected backend.
+  """
+  n_bytes = (size + 7) // 8
+
+  # The first `size` bits of the random bytes
+  return vector(_random.getrandbits(8 * n_bytes) >> (8 * n_bytes - size), size)